@@ -0,0 +1,139 @@
+# Admission control for image processing: per-user rate and concurrency limits, and an estimate of
+# each request's output size and memory checked against hard limits and a global memory budget.
+# Rejected requests get 413 (too large to ever run) or 429 with Retry-After (try again later).
+#
+# Budgets are per worker process.
+import math
+import os
+import threading
+import time
+
+from fastapi import Depends, HTTPException
+
+from auth_routes import get_current_user
+from image_metadata import read_file_metadata
+
+MAX_OUTPUT_PIXELS = int(os.getenv("MAX_OUTPUT_PIXELS", str(100_000_000)))
+# OpenCV's remapping functions (warpAffine, resize with some flags) are limited to 32767 per side
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "32767"))
+PROCESSING_MEMORY_BUDGET = int(os.getenv("PROCESSING_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024
+USER_MAX_CONCURRENT = int(os.getenv("USER_MAX_CONCURRENT_PROCESSING", "2"))
+USER_RATE_PER_SECOND = float(os.getenv("USER_PROCESSING_RATE", "5"))
+USER_RATE_BURST = int(os.getenv("USER_PROCESSING_BURST", "20"))
+
+# Full-frame buffers a kernel allocates per output pixel beyond the uint8 output itself,
+# e.g. the float32 HSV copy of the color adjustments
+WORK_COPIES = 1
+WORK_COPIES_FLOAT = 5
+
+_lock = threading.Lock()
+_memory_in_use = 0
+_user_active = {}
+# user_id -> (tokens, last refill time)
+_user_buckets = {}
+
+def _too_many(detail: str, retry_after: float):
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def estimate_cost(width: int, height: int, output_width: int = None, output_height: int = None,
+                  channels: int = 3, work_copies: int = WORK_COPIES):
+    """Estimate (output pixels, peak memory bytes) of processing a decoded image of the given size."""
+    output_width = width if output_width is None else output_width
+    output_height = height if output_height is None else output_height
+    output_pixels = max(0, output_width) * max(0, output_height)
+    # Decoded input, the output, the kernel's working buffers and the encoded copy of the output
+    memory = width * height * channels + output_pixels * channels * (2 + work_copies)
+    return output_pixels, memory
+
+def stored_size(image_info):
+    """The image's (width, height) without decoding it: stored metadata, or the file header."""
+    if image_info["width"] is not None:
+        return image_info["width"], image_info["height"]
+    metadata = read_file_metadata(os.path.join("uploads", image_info["filename"]), include_hash=False)
+    if metadata is None:
+        raise HTTPException(status_code=400, detail="Unable to read image")
+    return metadata["width"], metadata["height"]
+
+class Ticket:
+    """Admission of one processing request; memory reservations are released with it."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.reserved = 0
+
+    def reserve(self, cost, output_size=None):
+        """Reserve the estimated memory of a (output pixels, memory bytes) cost, or raise 413/429."""
+        global _memory_in_use
+        output_pixels, memory = cost
+        if output_size is not None and max(output_size) > MAX_IMAGE_DIMENSION:
+            raise HTTPException(status_code=413, detail=f"Output sides are limited to {MAX_IMAGE_DIMENSION} pixels")
+        if output_pixels > MAX_OUTPUT_PIXELS:
+            raise HTTPException(status_code=413, detail=f"Output is limited to {MAX_OUTPUT_PIXELS} pixels")
+        if memory > PROCESSING_MEMORY_BUDGET:
+            raise HTTPException(status_code=413, detail="Request needs more memory than the processing budget")
+        with _lock:
+            if _memory_in_use + memory > PROCESSING_MEMORY_BUDGET:
+                raise _too_many("Server is busy processing other images", 1)
+            _memory_in_use += memory
+        self.reserved += memory
+
+    def release_memory(self):
+        """Return the memory reserved so far, e.g. between the images of a batch."""
+        global _memory_in_use
+        with _lock:
+            _memory_in_use -= self.reserved
+        self.reserved = 0
+
+    def take_over(self, other: "Ticket"):
+        """Hold the memory reserved by other instead of the memory reserved so far."""
+        self.release_memory()
+        self.reserved, other.reserved = other.reserved, 0
+
+    def release(self):
+        global _memory_in_use
+        with _lock:
+            _memory_in_use -= self.reserved
+            active = _user_active.get(self.user_id, 0) - 1
+            if active > 0:
+                _user_active[self.user_id] = active
+            else:
+                _user_active.pop(self.user_id, None)
+        self.reserved = 0
+
+def processing_load() -> float:
+    """Share of the processing memory budget reserved by requests in progress (0.0 - 1.0)."""
+    with _lock:
+        return _memory_in_use / PROCESSING_MEMORY_BUDGET
+
+def _take_token(user_id: int, now: float):
+    """Token bucket refill and take; returns seconds until a token is available (0 when taken)."""
+    tokens, updated = _user_buckets.get(user_id, (USER_RATE_BURST, now))
+    tokens = min(USER_RATE_BURST, tokens + (now - updated) * USER_RATE_PER_SECOND)
+    if tokens < 1:
+        _user_buckets[user_id] = (tokens, now)
+        return (1 - tokens) / USER_RATE_PER_SECOND
+    _user_buckets[user_id] = (tokens - 1, now)
+    return 0
+
+def admit(user_id: int, rate_limited: bool = True) -> Ticket:
+    """Admit a processing request of the user, or raise 429; the caller releases the ticket.
+
+    rate_limited=False only takes one of the user's concurrent slots, e.g. for the coalesced previews
+    of an edit session, which would otherwise spend the rate limit while a slider is dragged.
+    """
+    with _lock:
+        if _user_active.get(user_id, 0) >= USER_MAX_CONCURRENT:
+            raise _too_many("Too many images being processed at once", 1)
+        wait = _take_token(user_id, time.monotonic()) if rate_limited else 0
+        if wait > 0:
+            raise _too_many("Processing rate limit exceeded", wait)
+        _user_active[user_id] = _user_active.get(user_id, 0) + 1
+    return Ticket(user_id)
+
+async def processing_ticket(current_user = Depends(get_current_user)):
+    """Dependency admitting a processing request for the current user; yields a Ticket."""
+    ticket = admit(current_user["id"])
+    try:
+        yield ticket
+    finally:
+        ticket.release()
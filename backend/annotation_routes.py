@@ -0,0 +1,154 @@
+# Annotation endpoints: batch shape editing, preview and export of the rasterized result
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+import os
+import uuid
+import codec
+from auth_routes import get_current_user
+from async_database import get_user_image, create_image
+from models import AnnotationBatchRequest, AnnotationsResponse
+from image_ops import OperationError, validate_shape, rasterize_shapes
+from image_metadata import read_file_metadata
+from image_features import compute_descriptors
+from edit_history import render_edits, rendered_size
+from admission import processing_ticket, Ticket, estimate_cost
+from signed_urls import upload_url
+from annotations import get_annotations, add_annotations, remove_annotation, clear_annotations
+from profiling import run_in_threadpool
+
+router = APIRouter()
+
+MAX_SHAPES_PER_BATCH = 500
+
+async def _get_image_or_404(image_id: int, current_user):
+	image_info = await get_user_image(image_id, current_user["id"])
+	if not image_info:
+		raise HTTPException(status_code=404, detail="Image not found")
+	return image_info
+
+def _render_base(image_info, ticket: Ticket):
+	"""Path of the image with its applied edits, which annotations are drawn over.
+
+	A replay's working memory is only held while it runs, before the result is decoded; the decode is
+	reserved at the rendered size, since edits can resize or expand the image.
+	"""
+	replay_ticket = Ticket(ticket.user_id)
+	try:
+		base_path = render_edits(image_info, replay_ticket)
+	finally:
+		replay_ticket.release_memory()
+	ticket.reserve(estimate_cost(*rendered_size(image_info)))
+	return base_path
+
+def _render_preview(image_info, max_size: int, ticket: Ticket):
+	base_path = _render_base(image_info, ticket)
+	# Let the decoder downsize the base image instead of decoding it at full size
+	metadata = read_file_metadata(base_path, include_hash=False)
+	image = codec.decode_fit(base_path, max_size, metadata["width"], metadata["height"]) if metadata else None
+	if image is None:
+		raise HTTPException(status_code=400, detail="Unable to read image")
+	preview = rasterize_shapes(image, get_annotations(image_info["id"]), image.shape[1] / metadata["width"])
+	return codec.encode(preview, ".jpg", 85)
+
+def _render_export(image_info, shapes, ticket: Ticket):
+	"""Rasterize the shapes at full resolution into a new file; returns (filename, path, metadata)."""
+	image = codec.decode(_render_base(image_info, ticket))
+	if image is None:
+		raise HTTPException(status_code=400, detail="Unable to read image")
+	annotated_image = rasterize_shapes(image, shapes)
+	processed_filename = f"{uuid.uuid4()}.jpg"
+	processed_path = os.path.join("uploads", processed_filename)
+	codec.write(processed_path, annotated_image)
+	return processed_filename, processed_path, {**read_file_metadata(processed_path), **compute_descriptors(annotated_image)}
+
+@router.get("/image/{image_id}/annotations", response_model=AnnotationsResponse)
+async def list_annotations(image_id: int, current_user = Depends(get_current_user)):
+	await _get_image_or_404(image_id, current_user)
+	return {"image_id": image_id, "shapes": await run_in_threadpool(get_annotations, image_id)}
+
+@router.post("/image/{image_id}/annotations")
+async def add_annotation_shapes(image_id: int, request: AnnotationBatchRequest, current_user = Depends(get_current_user)):
+	"""Add many shapes in one call; nothing is rasterized until preview or export."""
+	await _get_image_or_404(image_id, current_user)
+	if not request.shapes:
+		raise HTTPException(status_code=400, detail="No shapes provided")
+	if len(request.shapes) > MAX_SHAPES_PER_BATCH:
+		raise HTTPException(status_code=400, detail=f"At most {MAX_SHAPES_PER_BATCH} shapes per batch")
+	try:
+		for shape in request.shapes:
+			validate_shape(shape)
+	except OperationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	count = await run_in_threadpool(add_annotations, image_id, request.shapes)
+	return {
+		"success": True,
+		"image_id": image_id,
+		"added": len(request.shapes),
+		"shape_count": count
+	}
+
+@router.delete("/image/{image_id}/annotations/{index}")
+async def delete_annotation_shape(image_id: int, index: int, current_user = Depends(get_current_user)):
+	await _get_image_or_404(image_id, current_user)
+	if index < 0 or not await run_in_threadpool(remove_annotation, image_id, index):
+		raise HTTPException(status_code=404, detail="Annotation not found")
+	return {"success": True, "message": f"Annotation {index} removed"}
+
+@router.delete("/image/{image_id}/annotations")
+async def delete_all_annotations(image_id: int, current_user = Depends(get_current_user)):
+	await _get_image_or_404(image_id, current_user)
+	await run_in_threadpool(clear_annotations, image_id)
+	return {"success": True, "message": "All annotations removed"}
+
+@router.get("/image/{image_id}/annotations/preview")
+async def preview_annotations(
+	image_id: int,
+	max_size: int = Query(1024, ge=64, le=4096, description="Longest side of the preview in pixels"),
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Rasterize all shapes in one pass over a downsized copy of the image."""
+	image_info = await _get_image_or_404(image_id, current_user)
+	try:
+		content = await run_in_threadpool(_render_preview, image_info, max_size, ticket)
+		return Response(content=content, media_type="image/jpeg")
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error rendering preview: {str(e)}")
+
+@router.post("/image/{image_id}/annotations/export")
+async def export_annotations(
+	image_id: int,
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Rasterize all shapes at full resolution into a single new gallery image."""
+	image_info = await _get_image_or_404(image_id, current_user)
+	shapes = await run_in_threadpool(get_annotations, image_id)
+	if not shapes:
+		raise HTTPException(status_code=400, detail="Image has no annotations")
+	try:
+		processed_filename, processed_path, metadata = await run_in_threadpool(_render_export, image_info, shapes, ticket)
+		new_image_id = await create_image(
+			user_id=current_user["id"],
+			filename=processed_filename,
+			original_filename=f"{image_info['original_filename']} (annotated)",
+			file_path=processed_path,
+			file_size=os.path.getsize(processed_path),
+			mime_type="image/jpeg",
+			metadata=metadata
+		)
+		return {
+			"success": True,
+			"processed_filename": processed_filename,
+			"processed_url": upload_url(processed_filename, current_user["id"]),
+			"new_image_id": new_image_id,
+			"message": f"{len(shapes)} annotations exported",
+			"operation": "annotations_export",
+			"parameters": {"shape_count": len(shapes)}
+		}
+	except Exception as e:
+		if isinstance(e, HTTPException):
+			raise e
+		raise HTTPException(status_code=500, detail=f"Error exporting annotations: {str(e)}")
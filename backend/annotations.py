@@ -0,0 +1,48 @@
+# Vector annotation layer: shapes are stored as JSON on the image and rasterized only on demand
+from psycopg2.extras import Json
+
+from database import get_db_connection
+from models import DrawingParams
+
+def get_annotations(image_id: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT annotations FROM images WHERE id = %s", (image_id,))
+        row = cur.fetchone()
+        cur.close()
+        return [DrawingParams(**shape) for shape in row["annotations"]] if row else []
+
+def add_annotations(image_id: int, shapes):
+    """Append shapes to the layer in one statement; returns the new shape count."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE images SET annotations = annotations || %s::jsonb WHERE id = %s
+               RETURNING jsonb_array_length(annotations) AS count""",
+            (Json([shape.dict() for shape in shapes]), image_id)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+        return row["count"]
+
+def remove_annotation(image_id: int, index: int):
+    """Remove one shape by position; returns False if there is no shape at that index."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE images SET annotations = annotations - %s
+               WHERE id = %s AND %s < jsonb_array_length(annotations) RETURNING id""",
+            (index, image_id, index)
+        )
+        removed = cur.fetchone() is not None
+        conn.commit()
+        cur.close()
+        return removed
+
+def clear_annotations(image_id: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE images SET annotations = '[]' WHERE id = %s", (image_id,))
+        conn.commit()
+        cur.close()
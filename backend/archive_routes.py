@@ -0,0 +1,76 @@
+# Gallery archive endpoints: streaming ZIP export/import and progress polling
+import zipfile
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
+from auth_routes import get_current_user
+from models import ExportImagesRequest, ArchiveImportResponse, JobStatusResponse
+from gallery_archive import get_export_images, stream_archive, import_archive
+from progress import start_job, get_job, JobConflictError
+from profiling import run_in_threadpool
+
+router = APIRouter()
+
+JOB_ID_DESCRIPTION = "Client-chosen id to poll /jobs/{job_id} while the request runs"
+
+def _start_job(user_id: int, kind: str, total: Optional[int], job_id: Optional[str]):
+	try:
+		return start_job(user_id, kind, total, job_id)
+	except JobConflictError as e:
+		raise HTTPException(status_code=409, detail=str(e))
+
+async def _export_response(user_id: int, image_ids, job_id: Optional[str]):
+	images = await run_in_threadpool(get_export_images, user_id, image_ids)
+	if not images:
+		raise HTTPException(status_code=404, detail="No images to export")
+	job_id = _start_job(user_id, "export", len(images), job_id)
+	return StreamingResponse(
+		stream_archive(images, job_id),
+		media_type="application/zip",
+		headers={
+			"Content-Disposition": 'attachment; filename="gallery.zip"',
+			"X-Job-Id": job_id
+		}
+	)
+
+@router.get("/images/export")
+async def export_gallery(
+	job_id: Optional[str] = Query(None, description=JOB_ID_DESCRIPTION),
+	current_user = Depends(get_current_user)
+):
+	"""Download the whole gallery as a ZIP archive, streamed as it is written."""
+	return await _export_response(current_user["id"], None, job_id)
+
+@router.post("/images/export")
+async def export_selection(
+	request: ExportImagesRequest,
+	job_id: Optional[str] = Query(None, description=JOB_ID_DESCRIPTION),
+	current_user = Depends(get_current_user)
+):
+	"""Download the selected images (or the whole gallery) as a ZIP archive."""
+	if request.image_ids is not None and not request.image_ids:
+		raise HTTPException(status_code=400, detail="No image IDs provided")
+	return await _export_response(current_user["id"], request.image_ids, job_id)
+
+@router.post("/images/import", response_model=ArchiveImportResponse)
+async def import_gallery(
+	file: UploadFile = File(...),
+	job_id: Optional[str] = Query(None, description=JOB_ID_DESCRIPTION),
+	current_user = Depends(get_current_user)
+):
+	"""Import the images of a ZIP archive; entries that are not valid images are reported and skipped."""
+	job_id = _start_job(current_user["id"], "import", None, job_id)
+	try:
+		image_ids, errors = await run_in_threadpool(import_archive, current_user["id"], file.file, job_id)
+		return {"job_id": job_id, "imported_count": len(image_ids), "image_ids": image_ids, "errors": errors}
+	except zipfile.BadZipFile:
+		raise HTTPException(status_code=400, detail="File is not a valid ZIP archive")
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str, current_user = Depends(get_current_user)):
+	job = get_job(job_id, current_user["id"])
+	if job is None:
+		raise HTTPException(status_code=404, detail="Job not found")
+	return job
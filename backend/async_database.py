@@ -0,0 +1,96 @@
+# Async data access for the hot queries of request handlers: user by username, image by id and
+# image insert. Uses an asyncpg connection pool when asyncpg is installed; otherwise the sync
+# database.py functions run in the threadpool, which at least keeps them off the event loop.
+#
+# database.py stays the sync API for scripts (backfill, migrations, workers).
+import asyncio
+import json
+import os
+
+import database
+from db_connection import POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB, POSTGRES_HOST, POSTGRES_PORT
+from profiling import run_in_threadpool
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "2"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "20"))
+
+# asyncpg prepares every statement on first use and keeps it in a per-connection cache keyed by
+# the SQL text, so with pooled connections these are parsed and planned once per connection
+USER_BY_USERNAME_SQL = "SELECT * FROM users WHERE username = $1"
+IMAGE_BY_ID_SQL = "SELECT * FROM images WHERE id = $1 AND user_id = $2"
+INSERT_IMAGE_SQL = """
+    INSERT INTO images (user_id, filename, original_filename, file_path, file_size, mime_type,
+                        width, height, channels, orientation, content_hash, phash, dhash, features)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14) RETURNING id
+"""
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+async def _init_connection(conn):
+    # Decode JSON columns (annotations, edit params) like psycopg2 does
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+async def get_pool():
+    """The connection pool, created by the first query rather than at startup so the server
+    accepts connections before the database answers; None without asyncpg (the threadpool
+    fallback is used)."""
+    global _pool
+    if asyncpg is None or _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                user=POSTGRES_USER,
+                password=POSTGRES_PASSWORD,
+                database=POSTGRES_DB,
+                host=POSTGRES_HOST,
+                port=int(POSTGRES_PORT),
+                min_size=ASYNC_DB_POOL_MIN_SIZE,
+                max_size=ASYNC_DB_POOL_MAX_SIZE,
+                init=_init_connection
+            )
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def _to_dict(record):
+    return dict(record) if record is not None else None
+
+async def get_user_by_username(username: str):
+    pool = await get_pool()
+    if pool is None:
+        return await run_in_threadpool(database.get_user_by_username, username)
+    return _to_dict(await pool.fetchrow(USER_BY_USERNAME_SQL, username))
+
+async def get_user_image(image_id: int, user_id: int):
+    """Get a single image if it belongs to the user"""
+    pool = await get_pool()
+    if pool is None:
+        return await run_in_threadpool(database.get_user_image, image_id, user_id)
+    return _to_dict(await pool.fetchrow(IMAGE_BY_ID_SQL, image_id, user_id))
+
+async def create_image(user_id: int, filename: str, original_filename: str, file_path: str, file_size: int, mime_type: str, metadata: dict = None):
+    pool = await get_pool()
+    if pool is None:
+        return await run_in_threadpool(
+            database.create_image, user_id, filename, original_filename, file_path, file_size, mime_type, metadata
+        )
+    metadata = metadata or {}
+    return await pool.fetchval(
+        INSERT_IMAGE_SQL,
+        user_id, filename, original_filename, file_path, file_size, mime_type,
+        metadata.get("width"), metadata.get("height"), metadata.get("channels"),
+        metadata.get("orientation"), metadata.get("content_hash"),
+        metadata.get("phash"), metadata.get("dhash"), metadata.get("features")
+    )
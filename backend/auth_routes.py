@@ -5,8 +5,9 @@ from datetime import timedelta
 from auth import (
 	register_user, authenticate_user, create_access_token, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from database import get_user_by_username
+from async_database import get_user_by_username
 from models import UserCreate, UserLogin, Token, User
+from profiling import run_in_threadpool
 
 router = APIRouter()
 
@@ -26,7 +27,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 			detail="Invalid authentication credentials",
 			headers={"WWW-Authenticate": "Bearer"},
 		)
-	user = get_user_by_username(username)
+	user = await get_user_by_username(username)
 	if user is None:
 		print(f"User not found for username: {username}")
 		raise HTTPException(status_code=404, detail="User not found")
@@ -36,14 +37,15 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 # Authentication endpoints using PostgreSQL
 @router.post("/register", response_model=dict)
 async def register(user: UserCreate):
-	result = register_user(user.username, user.email, user.password)
+	# Password hashing and the database queries block, so they run in the threadpool
+	result = await run_in_threadpool(register_user, user.username, user.email, user.password)
 	if "error" in result:
 		raise HTTPException(status_code=400, detail=result["error"])
 	return result
 
 @router.post("/login", response_model=Token)
 async def login(user: UserLogin):
-	authenticated_user = authenticate_user(user.username, user.password)
+	authenticated_user = await run_in_threadpool(authenticate_user, user.username, user.password)
 	if not authenticated_user:
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
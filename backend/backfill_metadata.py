@@ -0,0 +1,46 @@
+# Backfill width/height/channels/orientation/content hash, perceptual hashes and
+# similarity features for images uploaded before metadata was extracted at upload time.
+#
+# Usage: python backfill_metadata.py [--batch-size 500]
+import argparse
+import os
+
+from database import init_database, get_images_missing_metadata, update_image_metadata, update_image_descriptors
+from image_metadata import extract_metadata
+from perceptual_hash import decode_proxy
+from image_features import compute_descriptors
+
+def backfill(batch_size: int):
+    updated = skipped = 0
+    last_id = 0
+    while True:
+        images = get_images_missing_metadata(last_id, batch_size)
+        if not images:
+            break
+        for image in images:
+            last_id = image["id"]
+            if not os.path.exists(image["file_path"]):
+                print(f"Skipping image {image['id']}: file {image['file_path']} is missing")
+                skipped += 1
+                continue
+            with open(image["file_path"], "rb") as f:
+                data = f.read()
+            metadata = extract_metadata(data)
+            proxy = metadata and decode_proxy(data, metadata["width"], metadata["height"])
+            if proxy is None:
+                print(f"Skipping image {image['id']}: unable to read image")
+                skipped += 1
+                continue
+            update_image_metadata(image["id"], metadata)
+            update_image_descriptors(image["id"], compute_descriptors(proxy))
+            updated += 1
+        print(f"Processed up to image {last_id} ({updated} updated, {skipped} skipped)")
+    return updated, skipped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill image metadata columns")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    init_database()
+    updated, skipped = backfill(args.batch_size)
+    print(f"Done: {updated} images updated, {skipped} skipped")
@@ -0,0 +1,73 @@
+# Concurrent throughput of the user lookup every authenticated request makes, through:
+#   sync        database.py called directly from coroutines (blocks the event loop, the old path)
+#   threadpool  database.py in the threadpool (async_database's fallback without asyncpg)
+#   asyncpg     async_database with its asyncpg pool and cached prepared statements
+#
+# Needs a reachable database with at least one user:
+#   python benchmarks/async_db_benchmark.py --username alice --concurrency 50 --requests 2000
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.concurrency import run_in_threadpool
+
+import async_database
+import database
+
+async def _run(lookup, username: str, concurrency: int, requests: int):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            start = time.perf_counter()
+            user = await lookup(username)
+            latencies.append(time.perf_counter() - start)
+            if user is None:
+                raise SystemExit(f"User {username!r} not found")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_second": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+async def _sync_lookup(username: str):
+    return database.get_user_by_username(username)
+
+async def _threadpool_lookup(username: str):
+    return await run_in_threadpool(database.get_user_by_username, username)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async user lookups under concurrency")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    modes = [("sync", _sync_lookup), ("threadpool", _threadpool_lookup)]
+    if async_database.asyncpg is not None:
+        await async_database.get_pool()
+        modes.append(("asyncpg", async_database.get_user_by_username))
+    else:
+        print("asyncpg is not installed, skipping the asyncpg mode")
+
+    print(f"{'mode':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, lookup in modes:
+        # Warm up connections and prepared statements before measuring
+        await _run(lookup, args.username, args.concurrency, args.concurrency)
+        result = await _run(lookup, args.username, args.concurrency, args.requests)
+        print(f"{name:<12}{result['requests_per_second']:>10.0f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}")
+    await async_database.close_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
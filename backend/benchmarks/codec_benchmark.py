@@ -0,0 +1,78 @@
+# Per-operation speedup of the codec fast paths, decode + operation + encode of one image:
+#   before   full BGR decode, operation, JPEG encode with OpenCV's defaults (what the endpoints did)
+#   codec    decode as the operation asks (gray or 2/4/8x reduced), operation, tuned JPEG encode
+# and of a batch of copies of the image processed one at a time vs BATCH_CONCURRENCY at a time.
+#
+#   python benchmarks/codec_benchmark.py path/to/photo.jpg --repeat 5 --batch 16
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+import codec
+from operations import parse_operation
+from operation_routes import BATCH_CONCURRENCY
+
+def _cases(width: int, height: int):
+    return [
+        ("grayscale", {}),
+        ("colorspace", {"target_space": "GRAY"}),
+        ("quick_adjust", {"brightness": 1.2, "contrast": 1.1, "saturation": 1.0, "hue_shift": 0}),
+        ("resize", {"width": width // 4, "height": height // 4}),
+        ("scale", {"scale_x": 0.125, "scale_y": 0.125}),
+        ("crop", {"x": 0, "y": 0, "width": width // 2, "height": height // 2}),
+    ]
+
+def _before(path: str, operation, params):
+    image = operation.apply(cv2.imread(path), params)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+def _codec(path: str, operation, params, width: int, height: int):
+    grayscale, reduction = operation.decode_options(params, width, height)
+    image = codec.decode(path, grayscale, reduction if codec.decodes_reduced(path) else 1)
+    return codec.encode(operation.apply_decoded(image, params, width, height))
+
+def _measure(run, repeat: int):
+    run()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the codec fast paths per operation")
+    parser.add_argument("image")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=16, help="Images in the batch comparison")
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Unable to read {args.image}")
+    height, width = image.shape[:2]
+    print(f"{width}x{height}, median of {args.repeat} runs")
+    print(f"{'operation':<14}{'before ms':>12}{'codec ms':>12}{'speedup':>10}")
+    for name, parameters in _cases(width, height):
+        operation, params = parse_operation(name, parameters)
+        before = _measure(lambda: _before(args.image, operation, params), args.repeat)
+        fast = _measure(lambda: _codec(args.image, operation, params, width, height), args.repeat)
+        print(f"{name:<14}{before:>12.1f}{fast:>12.1f}{before / fast:>9.2f}x")
+
+    operation, params = parse_operation("quick_adjust", _cases(width, height)[2][1])
+    run_one = lambda _: _codec(args.image, operation, params, width, height)
+    sequential = _measure(lambda: list(map(run_one, range(args.batch))), 1)
+    with ThreadPoolExecutor(BATCH_CONCURRENCY) as executor:
+        concurrent = _measure(lambda: list(executor.map(run_one, range(args.batch))), 1)
+    print(f"batch of {args.batch} quick_adjust: {sequential:.0f} ms sequential, {concurrent:.0f} ms "
+          f"with {BATCH_CONCURRENCY} at a time ({sequential / concurrent:.2f}x)")
+
+if __name__ == "__main__":
+    main()
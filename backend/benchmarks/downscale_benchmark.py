@@ -0,0 +1,66 @@
+# Large downscales: speed and aliasing of the interpolation modes, one-step cv2.resize (as resize and
+# scale did before) vs the geometry engine (pyramid reduction for linear/cubic/lanczos, area for auto).
+#
+# Quality is the PSNR against an anti-aliased reference (Gaussian pre-filter, then area resampling);
+# aliasing shows up as a low PSNR. Without an image, a zone plate (concentric rings of increasing
+# frequency, the worst case for aliasing) is used:
+#   python benchmarks/downscale_benchmark.py --size 8000 --target 400
+#   python benchmarks/downscale_benchmark.py photo.jpg --target 400
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from geometry import GeometryPlan
+from image_ops import INTERPOLATION_METHODS
+
+def _zone_plate(size: int):
+    coordinates = np.linspace(-1, 1, size, dtype=np.float32)
+    x, y = np.meshgrid(coordinates, coordinates)
+    plate = (np.cos(np.pi * size / 4 * (x * x + y * y)) * 127.5 + 127.5).astype(np.uint8)
+    return cv2.cvtColor(plate, cv2.COLOR_GRAY2BGR)
+
+def _measure(resize, repeat: int):
+    result = resize()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resize()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark large downscales by interpolation mode")
+    parser.add_argument("image", nargs="?")
+    parser.add_argument("--size", type=int, default=8000, help="Zone plate size when no image is given")
+    parser.add_argument("--target", type=int, default=400, help="Longest side of the output")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image) if args.image else _zone_plate(args.size)
+    if image is None:
+        raise SystemExit(f"Unable to read {args.image}")
+    height, width = image.shape[:2]
+    scale = args.target / max(width, height)
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    sigma = 0.5 / scale
+    reference = cv2.resize(cv2.GaussianBlur(image, (0, 0), sigma), target, interpolation=cv2.INTER_AREA)
+
+    print(f"{width}x{height} -> {target[0]}x{target[1]}, median of {args.repeat} runs")
+    print(f"{'mode':<24}{'ms':>10}{'PSNR dB':>10}")
+    rows = [(f"{name} (one step)", lambda flag=getattr(cv2, attribute): cv2.resize(image, target, interpolation=flag))
+            for name, attribute in INTERPOLATION_METHODS.items()]
+    rows += [(f"{name} (engine)", lambda name=name: GeometryPlan(width, height).resize(*target).execute(image, name))
+             for name in ["auto", "area", *INTERPOLATION_METHODS.keys()]]
+    for name, resize in rows:
+        milliseconds, result = _measure(resize, args.repeat)
+        print(f"{name:<24}{milliseconds:>10.1f}{cv2.PSNR(result, reference):>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Gallery listing cost for a large gallery:
+#   fresh-dict     new connection per call, SELECT *, RealDictCursor (the previous get_user_images)
+#   pooled-dict    pooled connection, SELECT *, RealDictCursor (get_user_images)
+#   pooled-slots   pooled connection, prepared statement, listing columns into slotted rows
+#                  (get_user_images(..., lightweight=True), used by /my-images)
+#
+# Seeds a temporary user with --images rows and removes it afterwards:
+#   python benchmarks/image_listing_benchmark.py --images 10000 --repeat 20
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+from database import DATABASE_URL, get_db_connection, get_user_images, init_database
+
+def _seed(count: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        name = f"listing_benchmark_{uuid.uuid4().hex[:8]}"
+        cur.execute(
+            "INSERT INTO users (username, email, hashed_password) VALUES (%s, %s, '') RETURNING id",
+            (name, f"{name}@example.invalid")
+        )
+        user_id = cur.fetchone()["id"]
+        execute_values(
+            cur,
+            """INSERT INTO images (user_id, filename, original_filename, file_path, file_size, mime_type,
+                                   width, height, channels, content_hash, features) VALUES %s""",
+            [(user_id, f"{i}.jpg", f"photo_{i}.jpg", f"uploads/{i}.jpg", 250000, "image/jpeg",
+              4000, 3000, 3, uuid.uuid4().hex, bytes(288)) for i in range(count)],
+            page_size=1000
+        )
+        conn.commit()
+        cur.close()
+        return user_id
+
+def _remove(user_id: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        conn.commit()
+        cur.close()
+
+def _fresh_dict(user_id: int):
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM images WHERE user_id = %s ORDER BY uploaded_at DESC", (user_id,))
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+def _measure(listing, user_id: int, repeat: int):
+    listing(user_id)  # warm up the pool and prepared statement
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        listing(user_id)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gallery listing for a large gallery")
+    parser.add_argument("--images", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    init_database()
+    user_id = _seed(args.images)
+    try:
+        modes = [
+            ("fresh-dict", _fresh_dict),
+            ("pooled-dict", get_user_images),
+            ("pooled-slots", lambda uid: get_user_images(uid, lightweight=True)),
+        ]
+        print(f"{args.images} images, median of {args.repeat} runs")
+        for name, listing in modes:
+            print(f"{name:<14}{_measure(listing, user_id, args.repeat):>10.1f} ms")
+    finally:
+        _remove(user_id)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Load test replaying the editing session of the frontend (components/ImageEditor.js) with concurrent
+# virtual users, in-process through the ASGI app of main.py or over HTTP against a running server:
+#
+#   login -> list gallery -> upload and open an image -> N quick-adjust slider moves -> crop -> resize
+#   -> draw (saved as a copy) -> delete both images
+#
+# Each virtual user registers its own account, then runs sessions back to back. The report gives the
+# throughput, the latency percentiles and error rate per endpoint, and status codes of failed requests.
+# Requests rejected by the per-user rate limit (429) are retried after their Retry-After and reported
+# separately from errors. Needs requirements-dev.txt and the database of the app; accounts are
+# removed afterwards.
+#
+#   python benchmarks/load_test.py --users 20 --sessions 5
+#   python benchmarks/load_test.py --url http://localhost:8000 --users 50 --duration 120 --image photo.jpg
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import cv2
+import httpx
+import numpy as np
+
+PASSWORD = "load-test-password"
+# Attempts of a request rejected with 429 before it counts as failed
+MAX_THROTTLED_ATTEMPTS = 5
+
+class SessionError(Exception):
+    pass
+
+class Recorder:
+    """Latencies and outcomes of every request, by endpoint (method and path template)."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(Counter)
+        self.throttled = Counter()
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs):
+        for attempt in range(MAX_THROTTLED_ATTEMPTS):
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                response, status = None, type(e).__name__
+            if status != 429 or attempt == MAX_THROTTLED_ATTEMPTS - 1:
+                break
+            # Rate or concurrency limit of the user: wait as told and retry, leaving the quick
+            # rejection out of the latencies
+            self.throttled[label] += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        self.latencies[label].append(time.perf_counter() - start)
+        if response is None or response.status_code >= 400:
+            self.failures[label][status] += 1
+            raise SessionError(f"{label}: {status}")
+        return response
+
+def _percentile(sorted_values, fraction: float):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def _test_images(path: str, count: int, width: int, height: int):
+    """Distinct JPEG uploads, so uploads aren't deduplicated into a single shared file."""
+    if path:
+        base = cv2.imread(path)
+        if base is None:
+            raise SystemExit(f"Unable to read {path}")
+    else:
+        # Smooth gradients with some texture, compressing like a photo rather than like flat color
+        x, y = np.meshgrid(np.linspace(0, 255, width, dtype=np.float32), np.linspace(0, 255, height, dtype=np.float32))
+        noise = np.random.default_rng(0).normal(0, 12, (height, width)).astype(np.float32)
+        base = np.clip(np.dstack([x + noise, y + noise, (x + y) / 2 + noise]), 0, 255).astype(np.uint8)
+    images = []
+    for index in range(count):
+        image = base.copy()
+        image[0, :8] = np.frombuffer(index.to_bytes(8, "big"), np.uint8)[:, None]
+        images.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return images, base.shape[1], base.shape[0]
+
+async def _session(client: httpx.AsyncClient, recorder: Recorder, username: str, upload: bytes,
+                   width: int, height: int, adjustments: int, think_time: float):
+    async def step(label, method, url, **kwargs):
+        response = await recorder.request(client, label, method, url, **kwargs)
+        if think_time:
+            await asyncio.sleep(think_time)
+        return response
+
+    login = await step("POST /login", "POST", "/login", json={"username": username, "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    await step("GET /my-images", "GET", "/my-images", headers=headers)
+    image = (await step(
+        "POST /upload-image", "POST", "/upload-image", headers=headers,
+        files={"file": (f"load_test_{uuid.uuid4().hex[:8]}.jpg", upload, "image/jpeg")}
+    )).json()
+    image_ids = [image["id"]]
+    image_id = image["id"]
+    try:
+        await step("GET /image/{id}/dimensions", "GET", f"/image/{image_id}/dimensions", headers=headers)
+        await step("GET /uploads/{filename}", "GET", image["url"])
+        await step("GET /thumbnails/{size}/{filename}", "GET", image["thumbnail_url"])
+        for index in range(adjustments):
+            # A slider dragged up and back, as the editor sends one request per change
+            position = 1 - abs(index / max(1, adjustments - 1) * 2 - 1)
+            await step("POST /image/{id}/quick-adjust", "POST", f"/image/{image_id}/quick-adjust", headers=headers, params={
+                "brightness": round(1 + 0.5 * position, 2), "contrast": round(1 + 0.2 * position, 2),
+                "saturation": 1.0, "hue_shift": round(10 * position)
+            })
+        await step("POST /image/{id}/crop", "POST", f"/image/{image_id}/crop", headers=headers, params={
+            "x": width // 8, "y": height // 8, "width": width * 3 // 4, "height": height * 3 // 4
+        })
+        await step("POST /image/{id}/resize", "POST", f"/image/{image_id}/resize", headers=headers, params={
+            "width": width // 2, "height": height // 2
+        })
+        drawn = await step("POST /image/{id}/draw", "POST", f"/image/{image_id}/draw", headers=headers, params={
+            "shape_type": "rectangle", "start_x": width // 4, "start_y": height // 4,
+            "end_x": width // 2, "end_y": height // 2, "color_r": 255, "color_g": 0, "color_b": 0,
+            "thickness": 4, "create_copy": True
+        })
+        image_ids.append(drawn.json()["new_image_id"])
+    finally:
+        await step("POST /images/delete", "POST", "/images/delete", headers=headers, json={"image_ids": image_ids})
+
+async def _virtual_user(client, recorder: Recorder, username: str, uploads, args, deadline: float, width: int, height: int):
+    session = 0
+    while session < args.sessions if deadline is None else time.perf_counter() < deadline:
+        try:
+            await _session(client, recorder, username, uploads[session % len(uploads)], width, height,
+                           args.adjustments, args.think_time / 1000)
+        except SessionError:
+            recorder.failed_sessions += 1
+        recorder.sessions += 1
+        session += 1
+
+def _report(recorder: Recorder, elapsed: float):
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    failed = sum(sum(counter.values()) for counter in recorder.failures.values())
+    throttled = sum(recorder.throttled.values())
+    print(f"\n{recorder.sessions} sessions ({recorder.failed_sessions} failed), {total} requests in {elapsed:.1f} s: "
+          f"{total / elapsed:.1f} requests/s, {recorder.sessions / elapsed * 60:.1f} sessions/min, "
+          f"{failed / max(1, total):.1%} errors, {throttled / max(1, total):.1%} throttled (429, retried)")
+    print(f"{'endpoint':<34}{'count':>7}{'req/s':>8}{'errors':>8}{'429s':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    report = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        errors = sum(recorder.failures[label].values())
+        row = {
+            "count": len(latencies), "requests_per_second": len(latencies) / elapsed, "error_rate": errors / len(latencies),
+            "throttled": recorder.throttled[label],
+            "p50_ms": _percentile(latencies, 0.5) * 1000, "p90_ms": _percentile(latencies, 0.9) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000, "max_ms": latencies[-1] * 1000,
+            "failures": {str(status): count for status, count in recorder.failures[label].items()}
+        }
+        report[label] = row
+        print(f"{label:<34}{row['count']:>7}{row['requests_per_second']:>8.1f}{row['error_rate']:>8.1%}{row['throttled']:>7}"
+              f"{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+        if row["failures"]:
+            print(f"{'':<34}failures: {row['failures']}")
+    return {"elapsed_s": elapsed, "sessions": recorder.sessions, "failed_sessions": recorder.failed_sessions,
+            "requests": total, "errors": failed, "throttled": throttled, "endpoints": report}
+
+def _remove_users(usernames):
+    from database import get_db_connection
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # Images left by failed sessions go with their user; their files stay in uploads/
+        cur.execute("DELETE FROM users WHERE username = ANY(%s)", (usernames,))
+        conn.commit()
+        cur.close()
+
+async def _run(args, client):
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    usernames = [f"load_test_{run_id}_{index}" for index in range(args.users)]
+    for username in usernames:
+        response = await client.post("/register", json={
+            "username": username, "email": f"{username}@example.invalid", "password": PASSWORD
+        })
+        response.raise_for_status()
+    # Every virtual user uploads its own images, cycled between its sessions
+    per_user = args.sessions if args.duration is None else 4
+    uploads, width, height = _test_images(args.image, args.users * per_user, args.width, args.height)
+    deadline = time.perf_counter() + args.duration if args.duration is not None else None
+    print(f"{args.users} virtual users, {f'{args.duration} s' if deadline else f'{args.sessions} sessions each'}, "
+          f"{width}x{height} image, {args.adjustments} adjustments per session, "
+          f"{'in-process' if args.url is None else args.url}")
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            _virtual_user(client, recorder, username, uploads[index * per_user:(index + 1) * per_user], args, deadline, width, height)
+            for index, username in enumerate(usernames)
+        ))
+    finally:
+        elapsed = time.perf_counter() - start
+        if not args.keep_users:
+            _remove_users(usernames)
+    return _report(recorder, elapsed)
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    if args.url is not None:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            return await _run(args, client)
+    # In-process: the app runs in this event loop, with its startup and shutdown handlers. Admission
+    # limits are read when admission.py is imported, so they are set before importing the app.
+    os.environ["USER_PROCESSING_RATE"] = str(args.user_rate)
+    os.environ["USER_PROCESSING_BURST"] = str(args.user_burst)
+    os.chdir(BACKEND_DIR)
+    from main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+            return await _run(args, client)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test with concurrent simulated editing sessions")
+    parser.add_argument("--url", help="Base URL of a running server; the app runs in-process when omitted")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--sessions", type=int, default=3, help="Sessions per virtual user")
+    parser.add_argument("--duration", type=float, help="Run sessions for this many seconds instead")
+    parser.add_argument("--adjustments", type=int, default=20, help="Slider adjustments per session")
+    # The editor's slider sends at most a few requests per second; without a pause, the 20+ processing
+    # requests of a session exceed the default per-user rate limit (5/s, burst 20) and get 429s
+    parser.add_argument("--think-time", type=float, default=250, help="Pause after each request, in ms")
+    parser.add_argument("--user-rate", type=float, default=float(os.getenv("USER_PROCESSING_RATE", "5")),
+                        help="Processing requests per second and user (in-process only; set on the server otherwise)")
+    parser.add_argument("--user-burst", type=int, default=int(os.getenv("USER_PROCESSING_BURST", "20")),
+                        help="Burst of processing requests per user (in-process only)")
+    parser.add_argument("--image", help="Image to upload; a synthetic photo-like image by default")
+    parser.add_argument("--width", type=int, default=3000, help="Synthetic image width")
+    parser.add_argument("--height", type=int, default=2000, help="Synthetic image height")
+    parser.add_argument("--timeout", type=float, default=120, help="Request timeout in seconds")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--keep-users", action="store_true", help="Don't delete the test accounts afterwards")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
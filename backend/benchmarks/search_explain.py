@@ -0,0 +1,106 @@
+# Query plans of the gallery search (gallery_search.py) on a large gallery: seeds a temporary user with
+# --images rows (default one million), runs EXPLAIN (ANALYZE, BUFFERS) for typical searches, including
+# deep keyset pages, and flags sequential scans of images. The user and its rows are removed afterwards.
+#
+#   python migrate.py                       # create the search indexes first
+#   python benchmarks/search_explain.py --images 1000000
+import argparse
+import hashlib
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from gallery_search import build_search_query
+
+SEED_SQL = """
+    INSERT INTO images (user_id, filename, original_filename, file_path, file_size, mime_type, uploaded_at, width, height)
+    SELECT %s, i || '.jpg',
+           (ARRAY['beach', 'city', 'family', 'holiday', 'portrait', 'scan', 'screenshot', 'sunset'])[1 + i %% 8]
+               || '_' || md5(i::text) || '.jpg',
+           'uploads/' || i || '.jpg',
+           50000 + (i * 7919) %% 10000000,
+           (ARRAY['image/jpeg', 'image/jpeg', 'image/jpeg', 'image/png', 'image/webp'])[1 + i %% 5],
+           now() - i * interval '30 seconds',
+           (ARRAY[640, 1280, 1920, 4000, 6000])[1 + i %% 5],
+           (ARRAY[480, 720, 1080, 3000, 4000])[1 + (i / 5) %% 5]
+    FROM generate_series(1, %s) AS i
+"""
+
+def _seed(count: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        name = f"search_explain_{uuid.uuid4().hex[:8]}"
+        cur.execute(
+            "INSERT INTO users (username, email, hashed_password) VALUES (%s, %s, '') RETURNING id",
+            (name, f"{name}@example.invalid")
+        )
+        user_id = cur.fetchone()["id"]
+        cur.execute(SEED_SQL, (user_id, count))
+        cur.execute("ANALYZE images")
+        conn.commit()
+        cur.close()
+        return user_id
+
+def _remove(user_id: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        conn.commit()
+        cur.close()
+
+def _row_at(user_id: int, sort: str, descending: bool, offset: int):
+    """(sort value, id) of the row at offset, as the cursor of a deep page would carry it."""
+    direction = "DESC" if descending else "ASC"
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT {sort} AS value, id FROM images WHERE user_id = %s ORDER BY {sort} {direction}, id {direction} OFFSET %s LIMIT 1",
+            (user_id, offset)
+        )
+        row = cur.fetchone()
+        cur.close()
+        return (row["value"], row["id"]) if row else None
+
+def _scenarios(user_id: int, count: int):
+    deep = count * 9 // 10
+    # Rows are 30 seconds apart
+    week = min(count - 1, 7 * 24 * 3600 // 30)
+    rare_name = hashlib.md5(str(count // 2).encode()).hexdigest()[4:12]
+    return [
+        ("newest, first page", {}, "uploaded_at", True, None),
+        (f"newest, page at row {deep}", {}, "uploaded_at", True, _row_at(user_id, "uploaded_at", True, deep)),
+        ("name contains a rare term", {"q": rare_name}, "uploaded_at", True, None),
+        ("name contains a common term", {"q": "sunset"}, "uploaded_at", True, None),
+        ("type image/png", {"mime_types": ["image/png"]}, "uploaded_at", True, None),
+        ("uploaded in the last week", {"uploaded_after": _row_at(user_id, "uploaded_at", True, week)[0]}, "uploaded_at", True, None),
+        ("5-6 MB, by size", {"min_size": 5_000_000, "max_size": 6_000_000}, "file_size", False, None),
+        ("at least 6000 px wide and 4000 high", {"min_width": 6000, "min_height": 4000}, "uploaded_at", True, None),
+        (f"by name, page at row {deep}", {}, "original_filename", False, _row_at(user_id, "original_filename", False, deep)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the gallery search on a large seeded gallery")
+    parser.add_argument("--images", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    user_id = _seed(args.images)
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            for name, filters, sort, descending, after in _scenarios(user_id, args.images):
+                sql, params = build_search_query(user_id, filters, sort, descending, after, args.limit + 1)
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                plan = [row["QUERY PLAN"] for row in cur.fetchall()]
+                warning = "  <-- sequential scan" if any("Seq Scan on images" in line for line in plan) else ""
+                print(f"\n== {name}{warning}")
+                print("\n".join(f"   {line}" for line in plan))
+            cur.close()
+    finally:
+        _remove(user_id)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Cold import cost of the API module: runs `python -X importtime -c "import main"` in a fresh
+# interpreter, prints the slowest imports by cumulative time, the total, and whether OpenCV and
+# NumPy were loaded (they shouldn't be until the first processing request).
+#
+#   python benchmarks/startup_benchmark.py --top 15 --repeat 5
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = "import sys, main; print(' '.join(m for m in ('cv2', 'numpy') if m in sys.modules))"
+
+def _import_once():
+    """(per-module cumulative microseconds, heavy modules loaded) for one cold import of main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative, result.stdout.split()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the API module")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.repeat):
+        cumulative, loaded = _import_once()
+        totals.append(cumulative.get("main", 0) / 1000)
+
+    print(f"{'module':<40}{'cumulative ms':>15}")
+    for name, micros in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<40}{micros / 1000:>15.1f}")
+    print(f"\nimport main: median {statistics.median(totals):.1f} ms over {args.repeat} runs")
+    print(f"heavy modules loaded at import: {', '.join(loaded) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Cost of getting an image's pixels: full decode vs mapping its working-store entry.
+#   decode        cv2.imread of the encoded file (what every request paid before)
+#   map           np.load(mmap_mode="c") of the raw entry, pages touched by a full read
+#   map+kernel    map, then grayscale conversion, to show the page faults are paid where pixels are used
+#
+#   python benchmarks/working_store_benchmark.py path/to/photo.jpg --repeat 20
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+def _measure(load, repeat: int):
+    load()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decoding vs mapping decoded pixels")
+    parser.add_argument("image")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Unable to read {args.image}")
+    with tempfile.TemporaryDirectory() as directory:
+        entry = os.path.join(directory, "entry.npy")
+        np.save(entry, image)
+        modes = [
+            ("decode", lambda: cv2.imread(args.image)),
+            ("map", lambda: int(np.load(entry, mmap_mode="c").sum(dtype=np.uint64))),
+            ("map+kernel", lambda: cv2.cvtColor(np.load(entry, mmap_mode="c"), cv2.COLOR_BGR2GRAY)),
+        ]
+        height, width = image.shape[:2]
+        print(f"{width}x{height}, encoded {os.path.getsize(args.image) / 1e6:.1f} MB, raw {image.nbytes / 1e6:.1f} MB")
+        for name, load in modes:
+            print(f"{name:<12}{_measure(load, args.repeat):>10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Codec layer: image decoding and encoding for the processing endpoints, with the fast paths in one place:
+#   - grayscale decode (IMREAD_GRAYSCALE) for operations that only need luma: the JPEG decoder
+#     skips the chroma planes and the color conversion
+#   - reduced decode (IMREAD_REDUCED_*_2/4/8) when the output is at least 2x smaller: libjpeg
+#     scales in the DCT domain and produces a fraction of the pixels
+#   - tuned encoder parameters per format
+# OpenCV releases the GIL while decoding and encoding, so threads decode/encode images concurrently.
+import os
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "90"))
+# zlib level 1: renders and checkpoints are rewritten often, so encode time matters more than size
+PNG_COMPRESSION = int(os.getenv("PNG_COMPRESSION", "1"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "90"))
+
+REDUCTIONS = (1, 2, 4, 8)
+# Formats whose decoder scales while decoding; others would be decoded in full and resized afterwards
+REDUCED_DECODE_EXTENSIONS = (".jpg", ".jpeg")
+
+def _read_flag(grayscale: bool, reduction: int):
+    name = "GRAYSCALE" if grayscale else "COLOR"
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Reduction must be one of {REDUCTIONS}")
+    return getattr(cv2, f"IMREAD_{name}" if reduction == 1 else f"IMREAD_REDUCED_{name}_{reduction}")
+
+def reduction_for(scale_x: float, scale_y: float) -> int:
+    """Largest decoder reduction that still leaves at least as many pixels as an output scaled by
+    (scale_x, scale_y) needs, so the final resampling only ever shrinks."""
+    reduction = 1
+    while reduction < REDUCTIONS[-1] and max(scale_x, scale_y) * reduction * 2 <= 1:
+        reduction *= 2
+    return reduction
+
+def decodes_reduced(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in REDUCED_DECODE_EXTENSIONS
+
+def decode(path: str, grayscale: bool = False, reduction: int = 1):
+    """Decode an image file as BGR (or one gray channel), reduced 2/4/8x by the decoder; None if unreadable.
+
+    Only JPEG decodes faster when reduced (see decodes_reduced); OpenCV resizes other formats after decoding.
+    """
+    return cv2.imread(path, _read_flag(grayscale, reduction))
+
+def fit(image, max_size: int):
+    """Downsize an image so its longest side is at most max_size."""
+    height, width = image.shape[:2]
+    scale = max_size / max(height, width)
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def decode_fit(path: str, max_size: int, width: int, height: int):
+    """Decode a width x height file downsized to fit max_size, the decoder doing most of the downscale."""
+    scale = max_size / max(width, height)
+    image = decode(path, reduction=reduction_for(scale, scale) if decodes_reduced(path) else 1)
+    return fit(image, max_size) if image is not None else None
+
+def decode_unchanged(path: str):
+    """Decode a file keeping its stored channels and depth, e.g. lossless checkpoints."""
+    return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+def decode_bytes(data: bytes, grayscale: bool = False, reduction: int = 1):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), _read_flag(grayscale, reduction))
+
+def encode_params(extension: str, quality: int = None):
+    extension = extension.lower()
+    if extension in (".jpg", ".jpeg"):
+        # Baseline with standard Huffman tables and 4:2:0 chroma subsampling is the fastest encode;
+        # quality 90 looks the same as OpenCV's default of 95 at a smaller size
+        return [cv2.IMWRITE_JPEG_QUALITY, quality or JPEG_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+    if extension == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+    if extension == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, quality or WEBP_QUALITY]
+    return []
+
+def encode(image, extension: str = ".jpg", quality: int = None) -> bytes:
+    success, encoded = cv2.imencode(extension, image, encode_params(extension, quality))
+    if not success:
+        raise ValueError(f"Unable to encode image as {extension}")
+    return encoded.tobytes()
+
+def write(path: str, image, quality: int = None) -> bool:
+    return cv2.imwrite(path, image, encode_params(os.path.splitext(path)[1], quality))
@@ -1,19 +1,9 @@
-import os
-from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from contextlib import contextmanager
-
-# Load environment variables
-load_dotenv()
-
-POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
-POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "admin")
-POSTGRES_DB = os.getenv("POSTGRES_DB", "neuradb")
-POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
-POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
-
-DATABASE_URL = f"dbname={POSTGRES_DB} user={POSTGRES_USER} password={POSTGRES_PASSWORD} host={POSTGRES_HOST} port={POSTGRES_PORT}"
+from psycopg2.extensions import cursor as TupleCursor
+# Connection settings and the pool live in db_connection.py; get_db_connection is re-exported here
+from db_connection import DATABASE_URL, get_db_connection, execute_prepared
+from image_blobs import drop_blob_reference
+from file_jobs import create_file_job_tables, enqueue_file_jobs, UNLINK, REMOVE_EDIT_FILES, REMOVE_DERIVED_FILES
 
 def init_database():
     conn = psycopg2.connect(DATABASE_URL)
@@ -39,18 +29,76 @@ def init_database():
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Metadata extracted at upload time so requests don't need to decode the image
+    cur.execute('''
+        ALTER TABLE images
+            ADD COLUMN IF NOT EXISTS width INTEGER,
+            ADD COLUMN IF NOT EXISTS height INTEGER,
+            ADD COLUMN IF NOT EXISTS channels SMALLINT,
+            ADD COLUMN IF NOT EXISTS orientation SMALLINT,
+            ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64),
+            ADD COLUMN IF NOT EXISTS phash BIGINT,
+            ADD COLUMN IF NOT EXISTS dhash BIGINT,
+            ADD COLUMN IF NOT EXISTS features BYTEA
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images (content_hash)")
+    # Gallery listing and search (gallery_search.py): every index leads with user_id and ends with id,
+    # the keyset pagination tie-breaker; btree indexes serve both sort directions
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_user_uploaded_id ON images (user_id, uploaded_at, id)")
+    cur.execute("DROP INDEX IF EXISTS idx_images_user_uploaded")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_user_type ON images (user_id, mime_type, uploaded_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_user_size ON images (user_id, file_size, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_user_name ON images (user_id, original_filename, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_images_user_dimensions ON images (user_id, width, height)")
+    # Substring name search: trigram GIN index, with btree_gin so it also narrows to the user
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_user_name_trgm ON images USING gin (user_id, original_filename gin_trgm_ops)"
+    )
+    # Uploaded files are stored once per distinct content and shared by all images rows referencing them
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            content_hash VARCHAR(64) PRIMARY KEY,
+            filename VARCHAR(255) NOT NULL,
+            file_path VARCHAR(500) NOT NULL,
+            file_size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Vector annotations (list of DrawingParams), rasterized only for preview and export
+    cur.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS annotations JSONB NOT NULL DEFAULT '[]'")
+    # Non-destructive edit history: ordered operations per image, edit_head marks how many are applied
+    cur.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS edit_head INTEGER NOT NULL DEFAULT 0")
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS image_edits (
+            id SERIAL PRIMARY KEY,
+            image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            operation VARCHAR(50) NOT NULL,
+            params JSONB NOT NULL DEFAULT '{}',
+            output_width INTEGER NOT NULL,
+            output_height INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (image_id, seq)
+        )
+    ''')
+    # Lossless snapshots of the rendered image after every few edits, to bound replay cost
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS edit_checkpoints (
+            edit_id INTEGER PRIMARY KEY REFERENCES image_edits(id) ON DELETE CASCADE,
+            file_path VARCHAR(500) NOT NULL
+        )
+    ''')
+    # Last change of an image's file or descriptors, part of the signature that invalidates cached similarity indexes
+    cur.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    # Post-commit filesystem work (file removal), executed by file_worker.py
+    create_file_job_tables(cur)
     conn.commit()
     cur.close()
     conn.close()
 
-@contextmanager
-def get_db_connection():
-    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 def create_user(username: str, email: str, hashed_password: str):
     with get_db_connection() as conn:
         cur = conn.cursor()
@@ -66,7 +114,11 @@ def create_user(username: str, email: str, hashed_password: str):
 def get_user_by_username(username: str):
     with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+        execute_prepared(
+            cur, "user_by_username",
+            "SELECT id, username, email, hashed_password, created_at FROM users WHERE username = $1",
+            (username,)
+        )
         user = cur.fetchone()
         cur.close()
         return user
@@ -79,45 +131,227 @@ def get_user_by_email(email: str):
         cur.close()
         return user
 
-def create_image(user_id: int, filename: str, original_filename: str, file_path: str, file_size: int, mime_type: str):
+def create_image(user_id: int, filename: str, original_filename: str, file_path: str, file_size: int, mime_type: str, metadata: dict = None):
+    metadata = metadata or {}
     with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute(
-            """INSERT INTO images (user_id, filename, original_filename, file_path, file_size, mime_type) 
-               VALUES (%s, %s, %s, %s, %s, %s) RETURNING id""",
-            (user_id, filename, original_filename, file_path, file_size, mime_type)
+        execute_prepared(
+            cur, "insert_image",
+            """INSERT INTO images (user_id, filename, original_filename, file_path, file_size, mime_type,
+                                   width, height, channels, orientation, content_hash, phash, dhash, features)
+               VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14) RETURNING id""",
+            (user_id, filename, original_filename, file_path, file_size, mime_type,
+             metadata.get("width"), metadata.get("height"), metadata.get("channels"),
+             metadata.get("orientation"), metadata.get("content_hash"),
+             metadata.get("phash"), metadata.get("dhash"), metadata.get("features"))
         )
         image_id = cur.fetchone()["id"]
         conn.commit()
         cur.close()
         return image_id
 
-def get_user_images(user_id: int):
+IMAGE_LIST_COLUMNS = ("id", "filename", "original_filename", "file_size", "mime_type", "uploaded_at", "width", "height")
+
+class ImageListRow:
+    """Gallery listing row: slots instead of a dict per row, with dict-style item access."""
+    __slots__ = IMAGE_LIST_COLUMNS
+
+    def __init__(self, id, filename, original_filename, file_size, mime_type, uploaded_at, width, height):
+        self.id = id
+        self.filename = filename
+        self.original_filename = original_filename
+        self.file_size = file_size
+        self.mime_type = mime_type
+        self.uploaded_at = uploaded_at
+        self.width = width
+        self.height = height
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+def get_user_images(user_id: int, lightweight: bool = False):
+    """All of the user's images, newest first.
+
+    lightweight returns ImageListRow objects with the listing columns only, read through a
+    prepared statement and a tuple cursor; much cheaper for large galleries.
+    """
+    with get_db_connection() as conn:
+        if lightweight:
+            cur = conn.cursor(cursor_factory=TupleCursor)
+            execute_prepared(
+                cur, "user_image_list",
+                f"SELECT {', '.join(IMAGE_LIST_COLUMNS)} FROM images WHERE user_id = $1 ORDER BY uploaded_at DESC",
+                (user_id,)
+            )
+            images = [ImageListRow(*row) for row in cur.fetchall()]
+        else:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM images WHERE user_id = %s ORDER BY uploaded_at DESC", (user_id,))
+            images = cur.fetchall()
+        cur.close()
+        return images
+
+def get_user_image(image_id: int, user_id: int):
+    """Get a single image if it belongs to the user"""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM images WHERE id = %s AND user_id = %s", (image_id, user_id))
+        image = cur.fetchone()
+        cur.close()
+        return image
+
+def update_image_metadata(image_id: int, metadata: dict):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE images SET width = %s, height = %s, channels = %s, orientation = %s,
+                   content_hash = COALESCE(%s, content_hash)
+               WHERE id = %s""",
+            (metadata["width"], metadata["height"], metadata["channels"],
+             metadata["orientation"], metadata["content_hash"], image_id)
+        )
+        conn.commit()
+        cur.close()
+
+def update_image_descriptors(image_id: int, descriptors: dict):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE images SET phash = %s, dhash = %s, features = %s, updated_at = NOW() WHERE id = %s",
+            (descriptors["phash"], descriptors["dhash"], descriptors["features"], image_id)
+        )
+        conn.commit()
+        cur.close()
+
+def get_user_image_hashes(user_id: int, after_id: int = 0, updated_after=None):
+    """Get perceptual hashes of a user's images, optionally only those newer than after_id
+    or changed after updated_after"""
     with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM images WHERE user_id = %s ORDER BY uploaded_at DESC", (user_id,))
+        cur.execute(
+            """SELECT id, phash, dhash FROM images
+               WHERE user_id = %s AND (id > %s OR updated_at > COALESCE(%s::timestamp, 'infinity'))
+                   AND phash IS NOT NULL""",
+            (user_id, after_id, updated_after)
+        )
         images = cur.fetchall()
         cur.close()
         return images
 
+def get_user_image_features(user_id: int, after_id: int = 0, updated_after=None):
+    """Get packed feature vectors of a user's images, optionally only those newer than after_id
+    or changed after updated_after"""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT id, features FROM images
+               WHERE user_id = %s AND (id > %s OR updated_at > COALESCE(%s::timestamp, 'infinity'))
+                   AND features IS NOT NULL ORDER BY id""",
+            (user_id, after_id, updated_after)
+        )
+        images = cur.fetchall()
+        cur.close()
+        return images
+
+def get_user_image_ids(user_id: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM images WHERE user_id = %s", (user_id,))
+        image_ids = [row["id"] for row in cur.fetchall()]
+        cur.close()
+        return image_ids
+
+def get_user_images_signature(user_id: int):
+    """Cheap fingerprint of a user's gallery (count, max id, last change) used to invalidate in-memory indexes"""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT COUNT(*) AS count, MAX(id) AS max_id, MAX(updated_at) AS updated_at FROM images WHERE user_id = %s",
+            (user_id,)
+        )
+        row = cur.fetchone()
+        cur.close()
+        return (row["count"], row["max_id"], row["updated_at"])
+
+def get_images_missing_metadata(after_id: int, limit: int):
+    """Get a batch of images uploaded before metadata extraction existed, in id order"""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT id, file_path FROM images
+               WHERE id > %s AND (width IS NULL OR content_hash IS NULL OR phash IS NULL OR features IS NULL)
+               ORDER BY id LIMIT %s""",
+            (after_id, limit)
+        )
+        images = cur.fetchall()
+        cur.close()
+        return images
+
+def replace_image_file(image_id: int, filename: str, file_path: str, file_size: int, metadata: dict):
+    """Point an image at a new file (e.g. after an in-place edit) and release its previous blob.
+
+    metadata holds the new file's metadata and descriptors (image_features.compute_descriptors).
+    The previous file is queued for removal once it is no longer referenced. The edit history is
+    cleared: the new file includes the applied edits (gallery_saves.py), and the renders and
+    intermediates were made from the previous pixels. Annotations are positioned on the image with
+    its applied edits; they are kept only if the new file has that size.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT i.content_hash, i.file_path, COALESCE(e.output_width, i.width) AS rendered_width,
+                      COALESCE(e.output_height, i.height) AS rendered_height
+               FROM images i LEFT JOIN image_edits e ON e.image_id = i.id AND e.seq = i.edit_head
+               WHERE i.id = %s FOR UPDATE OF i""",
+            (image_id,)
+        )
+        previous = cur.fetchone()
+        keep_annotations = (previous["rendered_width"], previous["rendered_height"]) == (metadata["width"], metadata["height"])
+        cur.execute(
+            """UPDATE images SET filename = %s, file_path = %s, file_size = %s, width = %s, height = %s,
+                   channels = %s, orientation = %s, content_hash = %s, phash = %s, dhash = %s, features = %s,
+                   edit_head = 0, annotations = CASE WHEN %s THEN annotations ELSE '[]'::jsonb END,
+                   updated_at = NOW()
+               WHERE id = %s""",
+            (filename, file_path, file_size, metadata["width"], metadata["height"], metadata["channels"],
+             metadata["orientation"], metadata["content_hash"], metadata["phash"], metadata["dhash"],
+             metadata["features"], keep_annotations, image_id)
+        )
+        # Checkpoints go with their edits (ON DELETE CASCADE)
+        cur.execute("DELETE FROM image_edits WHERE image_id = %s", (image_id,))
+        removable_path = drop_blob_reference(cur, previous["content_hash"], previous["file_path"])
+        enqueue_file_jobs(cur, [
+            (UNLINK, {"paths": [removable_path] if removable_path not in (None, file_path) else []}),
+            (REMOVE_DERIVED_FILES, {"image_ids": [image_id]})
+        ])
+        conn.commit()
+        cur.close()
+
 def delete_image(image_id: int, user_id: int):
     """Delete a single image from the database if it belongs to the user"""
     with get_db_connection() as conn:
         cur = conn.cursor()
         
-        # First check if image exists and belongs to user
-        cur.execute("SELECT file_path FROM images WHERE id = %s AND user_id = %s", (image_id, user_id))
+        # Delete the image if it exists and belongs to the user, then drop its reference to the shared file
+        execute_prepared(
+            cur, "delete_user_image",
+            "DELETE FROM images WHERE id = $1 AND user_id = $2 RETURNING file_path, content_hash",
+            (image_id, user_id)
+        )
         image = cur.fetchone()
         
         if not image:
             return False, "Image not found or access denied"
-            
-        # Delete the image from database
-        cur.execute("DELETE FROM images WHERE id = %s AND user_id = %s", (image_id, user_id))
-        conn.commit()
+
+        removable_path = drop_blob_reference(cur, image["content_hash"], image["file_path"])
         
-        # Return the file path so we can delete the physical file
-        return True, image["file_path"]
+        # Files are removed after the commit by the file worker (none while other images still use the file)
+        enqueue_file_jobs(cur, [
+            (UNLINK, {"paths": [removable_path] if removable_path else []}),
+            (REMOVE_EDIT_FILES, {"image_ids": [image_id]})
+        ])
+        conn.commit()
+        return True, f"Image {image_id} deleted successfully"
 
 def delete_multiple_images(image_ids: list, user_id: int):
     """Delete multiple images from the database if they belong to the user"""
@@ -128,27 +362,29 @@ def delete_multiple_images(image_ids: list, user_id: int):
         cur = conn.cursor()
         
         # Get all file paths for images that exist and belong to the user
-        placeholders = ','.join(['%s'] * len(image_ids))
         cur.execute(
-            f"SELECT id, file_path FROM images WHERE id IN ({placeholders}) AND user_id = %s",
-            [*image_ids, user_id]
+            "SELECT id, file_path, content_hash FROM images WHERE id = ANY(%s) AND user_id = %s",
+            (list(image_ids), user_id)
         )
         images = cur.fetchall()
         
         if not images:
             return [], "No matching images found or access denied"
             
-        # Extract IDs and file paths
+        # Extract IDs
         found_ids = [img["id"] for img in images]
-        file_paths = [img["file_path"] for img in images]
         
         # Delete the images from database
-        placeholders = ','.join(['%s'] * len(found_ids))
-        cur.execute(
-            f"DELETE FROM images WHERE id IN ({placeholders}) AND user_id = %s",
-            [*found_ids, user_id]
-        )
-        conn.commit()
+        cur.execute("DELETE FROM images WHERE id = ANY(%s) AND user_id = %s", (found_ids, user_id))
+        
+        # Drop blob references; only files whose last reference went away are removed
+        file_paths = []
+        for img in images:
+            removable_path = drop_blob_reference(cur, img["content_hash"], img["file_path"])
+            if removable_path is not None and removable_path not in file_paths:
+                file_paths.append(removable_path)
         
-        # Return the file paths so we can delete the physical files
-        return file_paths, f"Successfully deleted {len(file_paths)} images"
+        # One job per kind for the whole batch, executed after the commit by the file worker
+        enqueue_file_jobs(cur, [(UNLINK, {"paths": file_paths}), (REMOVE_EDIT_FILES, {"image_ids": found_ids})])
+        conn.commit()
+        return found_ids, f"Successfully deleted {len(found_ids)} images"
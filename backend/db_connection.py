@@ -0,0 +1,84 @@
+# PostgreSQL connection settings, the shared connection pool and server-side prepared statements.
+import os
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+import psycopg2
+from psycopg2.extensions import connection as _connection
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+# Load environment variables
+load_dotenv()
+
+POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "admin")
+POSTGRES_DB = os.getenv("POSTGRES_DB", "neuradb")
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
+POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+
+DATABASE_URL = f"dbname={POSTGRES_DB} user={POSTGRES_USER} password={POSTGRES_PASSWORD} host={POSTGRES_HOST} port={POSTGRES_PORT}"
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+# Matches the default threadpool size, so sync handlers never wait on each other for a connection
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "40"))
+
+class PooledConnection(_connection):
+    """Connection that remembers which statements were already prepared in its session."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_SIZE)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DATABASE_URL,
+                    connection_factory=PooledConnection, cursor_factory=RealDictCursor
+                )
+    return _pool
+
+@contextmanager
+def get_db_connection():
+    """A pooled connection; blocks while the pool is exhausted, so async handlers call it through
+    the threadpool (or use async_database.py)."""
+    pool = _get_pool()
+    _pool_slots.acquire()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        broken = conn.closed != 0
+        if not broken:
+            try:
+                # Discard anything the caller didn't commit, like closing the connection used to
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+        _pool_slots.release()
+
+def execute_prepared(cur, name: str, sql: str, params=()):
+    """Execute sql (with $1, $2... placeholders) as a server-side prepared statement.
+
+    The statement is parsed and planned once per pooled connection; later calls only send
+    EXECUTE with the parameters. Prepared statements should name their columns instead of
+    using SELECT *, since a cached plan can't change its result type after a schema change.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
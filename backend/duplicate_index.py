@@ -0,0 +1,102 @@
+# Near-duplicate search over perceptual hashes: per-user multi-index tables and duplicate clusters,
+# kept in memory and updated with the images added, edited or deleted since the last request
+# instead of being rebuilt for the whole gallery.
+import threading
+from collections import OrderedDict
+
+from database import get_user_image_hashes, get_user_image_ids, get_user_images_signature
+from perceptual_hash import DuplicateClusters, MultiIndex
+
+HASH_TYPES = ('phash', 'dhash')
+MAX_CACHED_GALLERIES = 32
+# Cluster sets kept per gallery, one per (hash type, threshold) asked for
+MAX_CACHED_CLUSTERS = 4
+
+# user_id -> _GalleryHashes, least recently used first
+_galleries = OrderedDict()
+# Searches run in the threadpool; each gallery has its own lock for its updates
+_galleries_lock = threading.Lock()
+
+class _GalleryHashes:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.signature = None
+        self.max_id = 0
+        self.updated_at = None
+        self.indexes = {hash_type: MultiIndex() for hash_type in HASH_TYPES}
+        self.clusters = OrderedDict()  # (hash_type, threshold) -> DuplicateClusters
+
+    def refresh(self, user_id: int, signature):
+        """Apply the changes since the last refresh; signature was read before, so nothing is missed."""
+        if signature == self.signature:
+            return
+        if self.signature is None:
+            rows, deleted = get_user_image_hashes(user_id), []
+        else:
+            rows = get_user_image_hashes(user_id, after_id=self.max_id, updated_after=self.updated_at)
+            current_ids = set(get_user_image_ids(user_id))
+            deleted = [image_id for image_id in self.indexes["phash"].values if image_id not in current_ids]
+        for image_id in deleted:
+            self._remove(image_id)
+        for row in rows:
+            # Edited images get their new hashes
+            self._remove(row["id"])
+            self._add(row)
+        self.signature = signature
+        self.max_id = signature[1] or 0
+        self.updated_at = signature[2]
+
+    def _add(self, row):
+        for hash_type, index in self.indexes.items():
+            if row[hash_type] is not None:
+                index.add(row[hash_type], row["id"])
+        for (hash_type, _), clusters in self.clusters.items():
+            if row["id"] in self.indexes[hash_type]:
+                clusters.added(row["id"])
+
+    def _remove(self, image_id: int):
+        for hash_type, index in self.indexes.items():
+            if image_id in index:
+                index.remove(image_id)
+                for (clusters_hash_type, _), clusters in self.clusters.items():
+                    if clusters_hash_type == hash_type:
+                        clusters.removed(image_id)
+
+    def duplicate_clusters(self, hash_type: str, threshold: int):
+        key = (hash_type, threshold)
+        clusters = self.clusters.get(key)
+        if clusters is None:
+            clusters = self.clusters[key] = DuplicateClusters(self.indexes[hash_type], threshold)
+            while len(self.clusters) > MAX_CACHED_CLUSTERS:
+                self.clusters.popitem(last=False)
+        self.clusters.move_to_end(key)
+        return clusters.clusters()
+
+def _gallery(user_id: int) -> _GalleryHashes:
+    with _galleries_lock:
+        gallery = _galleries.get(user_id)
+        if gallery is None:
+            gallery = _galleries[user_id] = _GalleryHashes()
+        _galleries.move_to_end(user_id)
+        while len(_galleries) > MAX_CACHED_GALLERIES:
+            _galleries.popitem(last=False)
+        return gallery
+
+def find_duplicate_clusters(user_id: int, hash_type: str, threshold: int):
+    """Group the user's images into clusters of near-duplicates (sorted id lists).
+
+    Reads the database, so callers run it in the threadpool.
+    """
+    signature = get_user_images_signature(user_id)
+    gallery = _gallery(user_id)
+    with gallery.lock:
+        gallery.refresh(user_id, signature)
+        return gallery.duplicate_clusters(hash_type, threshold)
+
+def find_near_duplicates(user_id: int, hash_type: str, value: int, threshold: int):
+    """Return [(distance, id)] of the user's images within threshold of the hash value."""
+    signature = get_user_images_signature(user_id)
+    gallery = _gallery(user_id)
+    with gallery.lock:
+        gallery.refresh(user_id, signature)
+        return gallery.indexes[hash_type].search(value, threshold)
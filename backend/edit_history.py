@@ -0,0 +1,206 @@
+# Non-destructive edit history: edits are stored as an ordered operation list per image and
+# rendered lazily from the original, with lossless checkpoints every CHECKPOINT_INTERVAL edits.
+import glob
+import os
+import uuid
+
+from psycopg2.extras import Json
+
+import codec
+
+from database import get_db_connection
+from image_ops import OperationError
+from operations import parse_operation
+from admission import MAX_OUTPUT_PIXELS, MAX_IMAGE_DIMENSION, estimate_cost, stored_size
+
+RENDER_DIR = os.getenv("RENDER_DIR", "renders")
+CHECKPOINT_INTERVAL = int(os.getenv("EDIT_CHECKPOINT_INTERVAL", "10"))
+
+def _render_path(image_id: int, edit_id: int):
+    # A render is keyed by the last applied edit: edit ids are never reused, so the key
+    # identifies the whole chain of edits before it
+    return os.path.join(RENDER_DIR, f"{image_id}_e{edit_id}.jpg")
+
+def _checkpoint_path(image_id: int, edit_id: int):
+    return os.path.join(RENDER_DIR, f"{image_id}_c{edit_id}.png")
+
+def _write_image_atomic(path: str, image):
+    """Write through a temporary file so concurrent readers never see a partial image."""
+    base, extension = os.path.splitext(path)
+    temp_path = f"{base}.{uuid.uuid4().hex}.tmp{extension}"
+    if not codec.write(temp_path, image):
+        raise IOError(f"Unable to write {path}")
+    os.replace(temp_path, path)
+
+def remove_edit_files(image_id: int, edit_ids=None):
+    """Remove cached renders and checkpoints of the given edits, or of all edits of the image."""
+    if edit_ids is None:
+        paths = glob.glob(os.path.join(RENDER_DIR, f"{image_id}_*"))
+    else:
+        paths = [path for edit_id in edit_ids
+                 for path in (_render_path(image_id, edit_id), _checkpoint_path(image_id, edit_id))]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def get_edit_history(image_id: int):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT seq, operation, params AS parameters, created_at FROM image_edits
+               WHERE image_id = %s ORDER BY seq""",
+            (image_id,)
+        )
+        edits = cur.fetchall()
+        cur.close()
+        return edits
+
+def append_edit(image_info: dict, operation: str, parameters: dict):
+    """Validate and record an edit after the current head, discarding any undone edits.
+
+    Returns the new head. Raises OperationError for invalid operations or parameters.
+    """
+    op, params = parse_operation(operation, parameters)
+    # Renders are BGR JPEGs, and the edits after this one would read its channels as BGR
+    # (gray results are gray BGR, so they can be recorded)
+    if op.output_space is not None and op.output_space(params) != "GRAY":
+        raise OperationError(f"{operation} to {op.output_space(params)} can't be recorded as an edit; "
+                             "use the operation endpoint or a pipeline instead")
+    image_id = image_info["id"]
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT edit_head, width, height FROM images WHERE id = %s FOR UPDATE", (image_id,))
+        image = cur.fetchone()
+        head, width, height = image["edit_head"], image["width"], image["height"]
+        if head > 0:
+            cur.execute(
+                "SELECT output_width, output_height FROM image_edits WHERE image_id = %s AND seq = %s",
+                (image_id, head)
+            )
+            previous = cur.fetchone()
+            width, height = previous["output_width"], previous["output_height"]
+        elif width is None:
+            # Images uploaded before metadata extraction; raises when the file can't be read
+            width, height = stored_size(image_info)
+
+        # Validated against the size the image will have at this point, so replays can't fail
+        output_width, output_height = op.output_size(params, width, height)
+        # Every render replays the chain, so no intermediate result may exceed the processing limits
+        if output_width * output_height > MAX_OUTPUT_PIXELS or max(output_width, output_height) > MAX_IMAGE_DIMENSION:
+            raise OperationError("Edit would exceed the maximum image size")
+
+        cur.execute("DELETE FROM image_edits WHERE image_id = %s AND seq > %s RETURNING id", (image_id, head))
+        discarded_ids = [row["id"] for row in cur.fetchall()]
+        cur.execute(
+            """INSERT INTO image_edits (image_id, seq, operation, params, output_width, output_height)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            (image_id, head + 1, operation, Json(params.dict() if params is not None else {}),
+             output_width, output_height)
+        )
+        cur.execute("UPDATE images SET edit_head = %s WHERE id = %s", (head + 1, image_id))
+        conn.commit()
+        cur.close()
+    remove_edit_files(image_id, discarded_ids)
+    return head + 1
+
+def move_edit_head(image_id: int, delta: int):
+    """Undo (delta=-1) or redo (delta=1); returns the new head, or None if there is nothing to move to."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE images SET edit_head = edit_head + %s
+               WHERE id = %s AND edit_head + %s BETWEEN 0
+                   AND (SELECT COUNT(*) FROM image_edits WHERE image_id = %s)
+               RETURNING edit_head""",
+            (delta, image_id, delta, image_id)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+        return row["edit_head"] if row else None
+
+def _save_checkpoint(image_id: int, edit_id: int, image):
+    path = _checkpoint_path(image_id, edit_id)
+    _write_image_atomic(path, image)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO edit_checkpoints (edit_id, file_path) VALUES (%s, %s) ON CONFLICT (edit_id) DO NOTHING",
+            (edit_id, path)
+        )
+        conn.commit()
+        cur.close()
+
+def _replay_cost(image_info: dict, edits):
+    """Estimated (output pixels, memory) of the most expensive edit of a replay."""
+    width, height = stored_size(image_info)
+    costs = []
+    for edit in edits:
+        costs.append(estimate_cost(width, height, edit["output_width"], edit["output_height"]))
+        width, height = edit["output_width"], edit["output_height"]
+    return max(costs, key=lambda cost: cost[1])
+
+def rendered_size(image_info: dict):
+    """(width, height) of the image with its applied edits, without rendering it."""
+    if image_info["edit_head"] == 0:
+        return stored_size(image_info)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT output_width, output_height FROM image_edits WHERE image_id = %s AND seq = %s",
+            (image_info["id"], image_info["edit_head"])
+        )
+        edit = cur.fetchone()
+        cur.close()
+    return edit["output_width"], edit["output_height"]
+
+def render_edits(image_info: dict, ticket=None):
+    """Return the path of the image with its applied edits, rendering and caching it if needed.
+
+    Blocks on the database and on the replay, so async callers run it in the threadpool. With an
+    admission ticket (admission.Ticket), the replay's memory is reserved before anything is decoded.
+    """
+    image_id, head = image_info["id"], image_info["edit_head"]
+    original_path = os.path.join("uploads", image_info["filename"])
+    if head == 0:
+        return original_path
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT e.id, e.seq, e.operation, e.params, e.output_width, e.output_height, c.file_path AS checkpoint
+               FROM image_edits e LEFT JOIN edit_checkpoints c ON c.edit_id = e.id
+               WHERE e.image_id = %s AND e.seq <= %s ORDER BY e.seq""",
+            (image_id, head)
+        )
+        edits = cur.fetchall()
+        cur.close()
+
+    render_path = _render_path(image_id, edits[-1]["id"])
+    if os.path.exists(render_path):
+        return render_path
+    if ticket is not None:
+        ticket.reserve(_replay_cost(image_info, edits))
+
+    # Replay from the latest checkpoint, at most CHECKPOINT_INTERVAL - 1 edits away
+    image, start = None, 0
+    for index in range(len(edits) - 1, -1, -1):
+        checkpoint = edits[index]["checkpoint"]
+        if checkpoint and os.path.exists(checkpoint):
+            image = codec.decode_unchanged(checkpoint)
+            start = index + 1
+            break
+    if image is None:
+        image = codec.decode(original_path)
+        if image is None:
+            raise IOError("Unable to read image")
+
+    os.makedirs(RENDER_DIR, exist_ok=True)
+    for edit in edits[start:]:
+        operation, params = parse_operation(edit["operation"], edit["params"])
+        image = operation.apply(image, params)
+        if edit["seq"] % CHECKPOINT_INTERVAL == 0:
+            _save_checkpoint(image_id, edit["id"], image)
+
+    _write_image_atomic(render_path, image)
+    return render_path
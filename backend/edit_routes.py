@@ -0,0 +1,77 @@
+# Non-destructive edit history endpoints: record operations, undo/redo, lazy rendering
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from auth_routes import get_current_user
+from admission import processing_ticket, Ticket
+from async_database import get_user_image
+from models import EditRequest, EditHistoryResponse
+from image_ops import OperationError
+from edit_history import get_edit_history, append_edit, move_edit_head, render_edits
+from profiling import run_in_threadpool
+
+router = APIRouter()
+
+async def _get_image_or_404(image_id: int, current_user):
+	image_info = await get_user_image(image_id, current_user["id"])
+	if not image_info:
+		raise HTTPException(status_code=404, detail="Image not found")
+	return image_info
+
+@router.get("/image/{image_id}/edits", response_model=EditHistoryResponse)
+async def get_edits(image_id: int, current_user = Depends(get_current_user)):
+	image_info = await _get_image_or_404(image_id, current_user)
+	return {
+		"image_id": image_id,
+		"head": image_info["edit_head"],
+		"edits": await run_in_threadpool(get_edit_history, image_id)
+	}
+
+@router.post("/image/{image_id}/edits")
+async def add_edit(image_id: int, request: EditRequest, current_user = Depends(get_current_user)):
+	"""Record an edit without touching any pixels; the result is rendered on demand."""
+	image_info = await _get_image_or_404(image_id, current_user)
+	try:
+		head = await run_in_threadpool(append_edit, image_info, request.operation, request.parameters)
+	except OperationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	return {
+		"success": True,
+		"image_id": image_id,
+		"head": head,
+		"operation": request.operation,
+		"render_url": f"/image/{image_id}/render"
+	}
+
+@router.post("/image/{image_id}/undo")
+async def undo_edit(image_id: int, current_user = Depends(get_current_user)):
+	await _get_image_or_404(image_id, current_user)
+	head = await run_in_threadpool(move_edit_head, image_id, -1)
+	if head is None:
+		raise HTTPException(status_code=409, detail="Nothing to undo")
+	return {"success": True, "image_id": image_id, "head": head}
+
+@router.post("/image/{image_id}/redo")
+async def redo_edit(image_id: int, current_user = Depends(get_current_user)):
+	await _get_image_or_404(image_id, current_user)
+	head = await run_in_threadpool(move_edit_head, image_id, 1)
+	if head is None:
+		raise HTTPException(status_code=409, detail="Nothing to redo")
+	return {"success": True, "image_id": image_id, "head": head}
+
+@router.get("/image/{image_id}/render")
+async def render_image(
+	image_id: int,
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Serve the image with its applied edits, rendered lazily and cached per edit state."""
+	image_info = await _get_image_or_404(image_id, current_user)
+	try:
+		# A replay decodes and processes at full resolution, admitted like any processing request
+		render_path = await run_in_threadpool(render_edits, image_info, ticket)
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error rendering image: {str(e)}")
+	media_type = image_info["mime_type"] if image_info["edit_head"] == 0 else "image/jpeg"
+	return FileResponse(render_path, media_type=media_type)
@@ -0,0 +1,197 @@
+# WebSocket edit session for real-time slider adjustments.
+# The session authenticates and decodes once, then streams previews for a stream of parameter
+# updates. Only the latest pending update is rendered; stale ones are dropped.
+# An open session holds the memory of its pinned image (admission.py). Each load, render and commit
+# takes one of the user's processing slots while it runs; previews don't count against the rate limit.
+import asyncio
+import json
+import logging
+import time
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query
+from lazy_imports import lazy_module
+import codec
+from auth import verify_token
+from async_database import get_user_by_username, get_user_image
+from models import QuickAdjustParams
+from image_ops import OperationError, apply_quick_adjust
+from edit_history import render_edits, rendered_size, append_edit
+from admission import admit, Ticket, estimate_cost, WORK_COPIES_FLOAT
+from profiling import run_in_threadpool
+
+cv2 = lazy_module("cv2")
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+PREVIEW_JPEG_QUALITY = 80
+# WebSocket close codes for rejected sessions (application range 4000-4999)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_BUSY = 4429
+CLOSE_INTERNAL_ERROR = 1011
+
+def _load_session_image(image_info, max_size: int, session: Ticket, ticket: Ticket):
+	"""Decode the image with its applied edits and a preview proxy of at most max_size; (None, None) if unreadable.
+
+	On success the session ticket holds the memory of this image instead of the previously pinned one;
+	the replay's working memory is reserved on ticket, the load's processing slot.
+	"""
+	loading = Ticket(session.user_id)
+	try:
+		loading.reserve(estimate_cost(*rendered_size(image_info)))
+		image = codec.decode(render_edits(image_info, ticket))
+		if image is None:
+			return None, None
+		height, width = image.shape[:2]
+		scale = min(1.0, max_size / max(height, width))
+		proxy = image if scale == 1.0 else cv2.resize(
+			image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+		session.take_over(loading)
+		return image, proxy
+	finally:
+		loading.release_memory()
+
+def _commit_adjustment(image_info, params: QuickAdjustParams, max_size: int, session: Ticket, ticket: Ticket):
+	"""Record the adjustment in the edit history and load the result; returns (image_info, image, proxy)."""
+	head = append_edit(image_info, "quick_adjust", params.dict())
+	# Later previews and commits apply on top of the committed result, as the saved history does
+	image_info = {**image_info, "edit_head": head}
+	return (image_info, *_load_session_image(image_info, max_size, session, ticket))
+
+def _render_preview(image, params: QuickAdjustParams, ticket: Ticket):
+	start = time.perf_counter()
+	# The working buffers of the adjustment matter for full-resolution renders
+	ticket.reserve(estimate_cost(image.shape[1], image.shape[0], work_copies=WORK_COPIES_FLOAT))
+	processed_image = apply_quick_adjust(image, params)
+	return codec.encode(processed_image, ".jpg", PREVIEW_JPEG_QUALITY), (time.perf_counter() - start) * 1000
+
+async def _in_slot(user_id: int, rate_limited: bool, func, *args):
+	"""Run func(*args, ticket) in the threadpool while holding one of the user's processing slots."""
+	ticket = admit(user_id, rate_limited)
+	try:
+		return await run_in_threadpool(func, *args, ticket)
+	finally:
+		ticket.release()
+
+async def _close_with_error(websocket: WebSocket, detail: str, code: int = 1000):
+	try:
+		await websocket.send_json({"type": "error", "detail": detail})
+		await websocket.close(code=code)
+	except Exception:
+		# The client is already gone
+		pass
+
+@router.websocket("/ws/image/{image_id}/adjust")
+async def adjust_session(
+	websocket: WebSocket,
+	image_id: int,
+	token: str = Query(...),
+	max_size: int = Query(1024, ge=64, le=4096)
+):
+	"""Stream quick-adjust previews.
+
+	Client messages (JSON text):
+	  {"seq": 1, "brightness": 1.2, "contrast": 1.0, "saturation": 1.0, "hue_shift": 0, "full": false}
+	  {"action": "commit", ...params}  records the adjustment in the image's edit history
+	Server replies with a JSON text header ({"type": "preview", "seq", "render_ms", ...})
+	followed by the JPEG as a binary message, or a JSON {"type": "error"|"committed"} message.
+	"""
+	# Accepted first: a close before the handshake reaches browsers as a failed connection, not a close code
+	await websocket.accept()
+	# Browsers can't set headers on WebSocket requests, so the bearer token comes as a query parameter
+	username = verify_token(token)
+	user = await get_user_by_username(username) if username else None
+	if user is None:
+		await websocket.close(code=CLOSE_UNAUTHORIZED)
+		return
+	image_info = await get_user_image(image_id, user["id"])
+	if image_info is None:
+		await websocket.close(code=CLOSE_NOT_FOUND)
+		return
+	user_id = user["id"]
+	# Holds the memory of the pinned image while the session is open; it isn't admitted, so it takes no slot
+	session = Ticket(user_id)
+	try:
+		# Pin the decoded image (with its applied edits) and a preview proxy until the next commit
+		try:
+			image, proxy = await _in_slot(user_id, True, _load_session_image, image_info, max_size, session)
+		except HTTPException as e:
+			await _close_with_error(websocket, e.detail, CLOSE_BUSY if e.status_code == 429 else 1000)
+			return
+		if image is None:
+			await _close_with_error(websocket, "Unable to read image")
+			return
+
+		# Latest pending preview update and commit; older pending values are overwritten (coalesced)
+		pending = {"preview": None, "commit": None}
+		update_ready = asyncio.Event()
+
+		async def render_loop():
+			nonlocal image_info, image, proxy
+			while True:
+				await update_ready.wait()
+				update_ready.clear()
+				# A commit makes every preview requested before it stale
+				if pending["commit"] is not None:
+					message, pending["commit"] = pending["commit"], None
+				else:
+					message, pending["preview"] = pending["preview"], None
+				if message is None:
+					continue
+				if pending["preview"] is not None or pending["commit"] is not None:
+					update_ready.set()
+				seq = message.get("seq")
+				try:
+					params = QuickAdjustParams(**{key: message[key] for key in QuickAdjustParams.__fields__ if key in message})
+					if message.get("action") == "commit":
+						committed_info, loaded_image, loaded_proxy = await _in_slot(
+							user_id, True, _commit_adjustment, image_info, params, max_size, session)
+						if loaded_image is None:
+							await _close_with_error(websocket, "Unable to read image")
+							return
+						image_info, image, proxy = committed_info, loaded_image, loaded_proxy
+						await websocket.send_json({"type": "committed", "seq": seq, "head": image_info["edit_head"],
+							"render_url": f"/image/{image_id}/render"})
+						continue
+					source = image if message.get("full") else proxy
+					encoded, render_ms = await _in_slot(user_id, False, _render_preview, source, params)
+				except (OperationError, ValueError) as e:
+					await websocket.send_json({"type": "error", "seq": seq, "detail": str(e)})
+					continue
+				except HTTPException as e:
+					# No free slot, or over the memory budget, e.g. a full-resolution render while the server is busy
+					await websocket.send_json({"type": "error", "seq": seq, "detail": e.detail})
+					continue
+				await websocket.send_json({"type": "preview", "seq": seq, "render_ms": round(render_ms, 2),
+					"width": source.shape[1], "height": source.shape[0]})
+				await websocket.send_bytes(encoded)
+
+		async def run_renderer():
+			try:
+				await render_loop()
+			except Exception:
+				# Otherwise the error would only surface when the task is garbage collected, and the
+				# client would keep sending updates nobody renders
+				logger.exception("Edit session of image %s failed", image_id)
+				await _close_with_error(websocket, "Internal error", CLOSE_INTERNAL_ERROR)
+
+		renderer = asyncio.create_task(run_renderer())
+		try:
+			while True:
+				try:
+					message = json.loads(await websocket.receive_text())
+				except ValueError:
+					await websocket.send_json({"type": "error", "detail": "Messages must be JSON"})
+					continue
+				if message.get("action") == "commit":
+					pending["commit"], pending["preview"] = message, None
+				else:
+					pending["preview"] = message
+				update_ready.set()
+		except WebSocketDisconnect:
+			pass
+		finally:
+			renderer.cancel()
+	finally:
+		session.release_memory()
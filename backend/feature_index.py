@@ -0,0 +1,167 @@
+# Similarity search over image feature vectors: in-memory brute force for regular galleries,
+# an on-disk inverted-file (IVF) index for large ones.
+from __future__ import annotations
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+from lazy_imports import lazy_module
+
+from database import get_user_image_features, get_user_image_ids, get_user_images_signature
+from image_features import FEATURE_DIM, stack_features, top_k
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+FEATURE_INDEX_DIR = os.getenv("FEATURE_INDEX_DIR", "feature_indexes")
+ANN_MIN_IMAGES = int(os.getenv("SIMILARITY_ANN_MIN_IMAGES", "20000"))
+ANN_NPROBE = int(os.getenv("SIMILARITY_ANN_NPROBE", "8"))
+ANN_TRAINING_SAMPLE = 20000
+# Rebuild the on-disk index once this share of the gallery was added, edited or deleted since the last build
+ANN_REBUILD_RATIO = 0.1
+MAX_CACHED_MATRICES = 32
+
+# user_id -> (gallery signature, ids, matrix), least recently used first
+_matrix_cache = OrderedDict()
+# Searches run in the threadpool: the cache is shared between threads, index builds are one at a time per user
+_cache_lock = threading.Lock()
+_build_locks = {}
+
+def _get_matrix(user_id: int, signature):
+    with _cache_lock:
+        cached = _matrix_cache.get(user_id)
+        if cached is not None and cached[0] == signature:
+            _matrix_cache.move_to_end(user_id)
+            return cached[1], cached[2]
+    ids, matrix = stack_features(get_user_image_features(user_id))
+    with _cache_lock:
+        _matrix_cache[user_id] = (signature, ids, matrix)
+        _matrix_cache.move_to_end(user_id)
+        while len(_matrix_cache) > MAX_CACHED_MATRICES:
+            _matrix_cache.popitem(last=False)
+    return ids, matrix
+
+def _build_lock(user_id: int):
+    with _cache_lock:
+        return _build_locks.setdefault(user_id, threading.Lock())
+
+class FeatureIndex:
+    """IVF index: vectors grouped by nearest k-means centroid, stored as memory-mapped .npy files."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.max_id = meta["max_id"]
+        self.size = meta["size"]
+        self.updated_at = meta.get("updated_at")
+        self.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r")
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+
+    @staticmethod
+    def build(directory: str, ids: np.ndarray, matrix: np.ndarray, updated_at=None):
+        list_count = max(1, int(np.sqrt(len(ids))))
+        sample = matrix
+        if len(matrix) > ANN_TRAINING_SAMPLE:
+            sample = matrix[np.random.default_rng(0).choice(len(matrix), ANN_TRAINING_SAMPLE, replace=False)]
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-3)
+        _, _, centroids = cv2.kmeans(sample, list_count, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+        assignment = _nearest_centroids(matrix, centroids, 1)[:, 0]
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(list_count + 1))
+
+        # Write into a fresh directory and swap it in, so readers never see a partial index
+        staging = f"{directory}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(staging)
+        np.save(os.path.join(staging, "centroids.npy"), centroids)
+        np.save(os.path.join(staging, "offsets.npy"), offsets)
+        np.save(os.path.join(staging, "ids.npy"), ids[order])
+        np.save(os.path.join(staging, "vectors.npy"), matrix[order].astype(np.float16))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({
+                "max_id": int(ids.max()),
+                "size": int(len(ids)),
+                # Last gallery change the vectors include; images changed later are searched from the database
+                "updated_at": updated_at.isoformat() if updated_at is not None else None,
+            }, f)
+        retired = f"{directory}.old-{uuid.uuid4().hex}"
+        try:
+            os.rename(directory, retired)
+        except FileNotFoundError:
+            retired = None
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Another worker process swapped in its build first, which is as recent as this one
+            shutil.rmtree(staging, ignore_errors=True)
+        if retired is not None:
+            shutil.rmtree(retired, ignore_errors=True)
+
+    def search(self, query: np.ndarray, nprobe: int):
+        """Return ids and vectors of the nprobe lists closest to the query."""
+        lists = _nearest_centroids(query[np.newaxis, :], self.centroids, nprobe)[0]
+        ids = np.concatenate([self.ids[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        vectors = np.concatenate([self.vectors[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        return ids, vectors.astype(np.float32)
+
+def _nearest_centroids(matrix: np.ndarray, centroids: np.ndarray, count: int, chunk_size: int = 8192):
+    count = min(count, len(centroids))
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    nearest = np.empty((len(matrix), count), dtype=np.int64)
+    for start in range(0, len(matrix), chunk_size):
+        # ||x - c||^2 up to the constant ||x||^2
+        distances = centroid_norms - 2 * matrix[start:start + chunk_size] @ centroids.T
+        nearest[start:start + chunk_size] = np.argsort(distances, axis=1)[:, :count]
+    return nearest
+
+def _index_directory(user_id: int):
+    return os.path.join(FEATURE_INDEX_DIR, str(user_id))
+
+def _changed_features(user_id: int, index: FeatureIndex):
+    """Ids and vectors of images added or edited since the index was built."""
+    return stack_features(get_user_image_features(user_id, after_id=index.max_id, updated_after=index.updated_at))
+
+def _load_index(user_id: int, current_ids: np.ndarray, updated_at):
+    """Open the user's on-disk index, rebuilding it when missing or too stale.
+
+    Returns the index with the ids and vectors of images added or edited since it was built.
+    """
+    directory = _index_directory(user_id)
+    # Concurrent searches wait for one build instead of each running k-means
+    with _build_lock(user_id):
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            index = FeatureIndex(directory)
+            changed_ids, changed = _changed_features(user_id, index)
+            deleted = index.size - int((current_ids <= index.max_id).sum())
+            if len(changed_ids) + deleted <= ANN_REBUILD_RATIO * index.size:
+                return index, changed_ids, changed
+        ids, matrix = stack_features(get_user_image_features(user_id))
+        os.makedirs(FEATURE_INDEX_DIR, exist_ok=True)
+        FeatureIndex.build(directory, ids, matrix, updated_at)
+        index = FeatureIndex(directory)
+    return (index, *_changed_features(user_id, index))
+
+def search_similar(user_id: int, query: np.ndarray, k: int, exclude_id: int = None):
+    """Return the k images most similar to the query vector as [(id, score)], best first.
+
+    Reads the database and may rebuild the index, so callers run it in the threadpool.
+    """
+    signature = get_user_images_signature(user_id)
+    if signature[0] < ANN_MIN_IMAGES:
+        ids, matrix = _get_matrix(user_id, signature)
+        return top_k(ids, matrix, query, k, exclude_id)
+
+    current_ids = np.array(get_user_image_ids(user_id), dtype=np.int64)
+    index, changed_ids, changed = _load_index(user_id, current_ids, signature[2])
+    candidate_ids, candidates = index.search(query.astype(np.float32), ANN_NPROBE)
+    # Images added or edited since the index was built are searched exhaustively, with their current vectors
+    current = ~np.isin(candidate_ids, changed_ids)
+    ids = np.concatenate([candidate_ids[current], changed_ids])
+    matrix = np.concatenate([candidates[current], changed])
+    # Skip images deleted since the index was built
+    alive = np.isin(ids, current_ids)
+    return top_k(ids[alive], matrix[alive].reshape(-1, FEATURE_DIM), query, k, exclude_id)
@@ -0,0 +1,43 @@
+# Durable queue for filesystem work that follows a database change (e.g. removing deleted files).
+# Jobs are inserted with the cursor of the transaction that makes them necessary, so they commit
+# (or roll back) together with it; file_worker.py executes them after the commit.
+from psycopg2.extras import Json, execute_values
+
+# Remove files: {"paths": [...]}
+UNLINK = "unlink"
+# Remove cached edit renders and checkpoints of deleted images: {"image_ids": [...]}
+REMOVE_EDIT_FILES = "remove_edit_files"
+# Remove edit renders, checkpoints and intermediates made from a file that was replaced: {"image_ids": [...]}
+REMOVE_DERIVED_FILES = "remove_derived_files"
+
+def create_file_job_tables(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS file_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_file_jobs_available_at ON file_jobs (available_at)")
+    # Jobs that kept failing after all retries, kept for inspection and manual requeue
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS file_jobs_dead (
+            id BIGINT PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def enqueue_file_jobs(cur, jobs):
+    """Queue (kind, payload) jobs within the caller's transaction; empty payload lists are skipped."""
+    rows = [(kind, Json(payload)) for kind, payload in jobs if any(payload.values())]
+    if rows:
+        execute_values(cur, "INSERT INTO file_jobs (kind, payload) VALUES %s", rows)
@@ -0,0 +1,160 @@
+# Executes queued file jobs (see file_jobs.py) after their transaction committed.
+#
+# Runs as a thread inside the API process (started on app startup) and can also run standalone:
+#   python file_worker.py                  # process jobs until interrupted
+#   python file_worker.py --requeue-dead   # move dead-lettered jobs back to the queue
+# Several workers can run at once: jobs are claimed with FOR UPDATE SKIP LOCKED.
+import argparse
+import logging
+import os
+import threading
+
+from database import get_db_connection
+from edit_history import remove_edit_files
+from intermediates import remove_intermediates
+from thumbnails import remove_thumbnails
+from storage import backup_path, remove_file
+from file_jobs import UNLINK, REMOVE_EDIT_FILES, REMOVE_DERIVED_FILES
+
+logger = logging.getLogger(__name__)
+
+FILE_JOB_BATCH_SIZE = int(os.getenv("FILE_JOB_BATCH_SIZE", "100"))
+FILE_JOB_MAX_ATTEMPTS = int(os.getenv("FILE_JOB_MAX_ATTEMPTS", "5"))
+FILE_JOB_RETRY_SECONDS = float(os.getenv("FILE_JOB_RETRY_SECONDS", "5"))
+FILE_JOB_POLL_SECONDS = float(os.getenv("FILE_JOB_POLL_SECONDS", "10"))
+
+def _unlink(payload):
+    for path in payload["paths"]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            # Already removed, e.g. by an earlier attempt that was interrupted
+            pass
+        remove_thumbnails(os.path.basename(path))
+
+def _remove_derived_files(payload):
+    for image_id in payload["image_ids"]:
+        remove_edit_files(image_id)
+        remove_intermediates(image_id)
+
+def _remove_edit_files(payload):
+    _remove_derived_files(payload)
+    # The backup of the last in-place edit is kept until the image itself is deleted
+    for image_id in payload["image_ids"]:
+        remove_file(backup_path(image_id))
+
+FILE_JOB_HANDLERS = {
+    UNLINK: _unlink,
+    REMOVE_EDIT_FILES: _remove_edit_files,
+    REMOVE_DERIVED_FILES: _remove_derived_files,
+}
+
+def process_file_jobs(limit: int = FILE_JOB_BATCH_SIZE):
+    """Claim and run up to limit due jobs in one transaction; returns the number of jobs claimed.
+
+    Failed jobs are retried with exponential backoff and dead-lettered after FILE_JOB_MAX_ATTEMPTS.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT id, kind, payload, attempts FROM file_jobs WHERE available_at <= NOW()
+               ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED""",
+            (limit,)
+        )
+        jobs = cur.fetchall()
+        done, failed = [], []
+        for job in jobs:
+            try:
+                handler = FILE_JOB_HANDLERS.get(job["kind"])
+                if handler is None:
+                    raise ValueError(f"Unknown file job kind: {job['kind']}")
+                handler(job["payload"])
+                done.append(job["id"])
+            except Exception as e:
+                logger.warning("File job %s (%s) failed: %s", job["id"], job["kind"], e)
+                failed.append((job, str(e)))
+
+        if done:
+            cur.execute("DELETE FROM file_jobs WHERE id = ANY(%s)", (done,))
+        for job, error in failed:
+            attempts = job["attempts"] + 1
+            if attempts >= FILE_JOB_MAX_ATTEMPTS:
+                cur.execute(
+                    """WITH dead AS (DELETE FROM file_jobs WHERE id = %s RETURNING id, kind, payload, created_at)
+                       INSERT INTO file_jobs_dead (id, kind, payload, attempts, last_error, created_at)
+                       SELECT id, kind, payload, %s, %s, created_at FROM dead""",
+                    (job["id"], attempts, error)
+                )
+            else:
+                cur.execute(
+                    """UPDATE file_jobs SET attempts = %s, last_error = %s,
+                           available_at = NOW() + make_interval(secs => %s)
+                       WHERE id = %s""",
+                    (attempts, error, FILE_JOB_RETRY_SECONDS * 2 ** (attempts - 1), job["id"])
+                )
+        conn.commit()
+        cur.close()
+        return len(jobs)
+
+def requeue_dead_jobs():
+    """Move all dead-lettered jobs back to the queue with a fresh retry budget; returns their count."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """WITH revived AS (DELETE FROM file_jobs_dead RETURNING kind, payload, created_at)
+               INSERT INTO file_jobs (kind, payload, created_at) SELECT kind, payload, created_at FROM revived"""
+        )
+        count = cur.rowcount
+        conn.commit()
+        cur.close()
+        return count
+
+class FileWorker:
+    """Background thread draining the file job queue; wake() skips the poll delay after an enqueue."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="file-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            # Cleared before claiming, so an enqueue during processing still triggers another pass
+            self._wakeup.clear()
+            try:
+                # Keep going while full batches come back, then wait for a wakeup or the next poll
+                if process_file_jobs() >= FILE_JOB_BATCH_SIZE:
+                    continue
+            except Exception:
+                logger.exception("File worker iteration failed")
+            self._wakeup.wait(FILE_JOB_POLL_SECONDS)
+
+file_worker = FileWorker()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued file jobs")
+    parser.add_argument("--requeue-dead", action="store_true", help="Move dead-lettered jobs back to the queue and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.requeue_dead:
+        print(f"Requeued {requeue_dead_jobs()} jobs")
+    else:
+        try:
+            FileWorker().run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,211 @@
+# Gallery ZIP archives: streaming export with constant memory, and import of archive entries
+# through the upload pipeline with one bulk insert per batch.
+import io
+import mimetypes
+import os
+import zipfile
+from collections import Counter
+
+from psycopg2.extras import execute_values
+
+from database import get_db_connection
+from progress import update_job, finish_job
+from storage import prepare_upload, write_file, remove_file, InvalidImageError
+
+CHUNK_SIZE = 1024 * 1024
+IMPORT_BATCH_SIZE = int(os.getenv("ARCHIVE_IMPORT_BATCH_SIZE", "100"))
+MAX_ENTRY_BYTES = int(os.getenv("ARCHIVE_MAX_ENTRY_BYTES", str(100 * 1024 * 1024)))
+# Already-compressed formats are stored as is; deflating them costs CPU for no gain
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+def get_export_images(user_id: int, image_ids=None):
+    """Images to export, oldest first; all of the user's images when image_ids is None."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        query = "SELECT id, original_filename, file_path, uploaded_at FROM images WHERE user_id = %s"
+        params = [user_id]
+        if image_ids is not None:
+            query += " AND id = ANY(%s)"
+            params.append(list(image_ids))
+        cur.execute(query + " ORDER BY id", params)
+        images = cur.fetchall()
+        cur.close()
+        return images
+
+class _ZipOutput(io.RawIOBase):
+    """Non-seekable sink that buffers zipfile output until the stream drains it.
+
+    Being non-seekable makes zipfile write sizes and CRCs in data descriptors after each
+    entry instead of seeking back, so nothing but the current chunk is held in memory.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _archive_name(image, used_names: set):
+    name = os.path.basename(image["original_filename"] or "").strip() or f"image_{image['id']}.jpg"
+    base, extension = os.path.splitext(name)
+    candidate, counter = name, 1
+    while candidate in used_names:
+        candidate = f"{base} ({counter}){extension}"
+        counter += 1
+    used_names.add(candidate)
+    return candidate
+
+def stream_archive(images, job_id: str):
+    """Yield a ZIP archive of the images' files chunk by chunk."""
+    output = _ZipOutput()
+    used_names = set()
+    try:
+        with zipfile.ZipFile(output, "w") as archive:
+            for image in images:
+                if not os.path.exists(image["file_path"]):
+                    update_job(job_id, failed=1)
+                    continue
+                name = _archive_name(image, used_names)
+                info = zipfile.ZipInfo(name, date_time=image["uploaded_at"].timetuple()[:6])
+                info.file_size = os.path.getsize(image["file_path"])
+                extension = os.path.splitext(name)[1].lower()
+                info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                with open(image["file_path"], "rb") as source, archive.open(info, "w") as entry:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        entry.write(chunk)
+                        yield output.drain()
+                yield output.drain()
+                update_job(job_id, processed=1)
+        # Central directory
+        yield output.drain()
+        finish_job(job_id)
+    except GeneratorExit:
+        finish_job(job_id, status="cancelled")
+        raise
+    except Exception as e:
+        finish_job(job_id, error=str(e))
+        raise
+
+def _insert_batch(user_id: int, batch):
+    """Register the batch's blobs and images in one transaction; returns the new image ids.
+
+    Entries whose content was first seen in this batch carry the file they wrote; if a blob
+    with that content already exists, the existing file is shared and the new one removed.
+    """
+    references = Counter(item["metadata"]["content_hash"] for item in batch)
+    written = {item["metadata"]["content_hash"]: item for item in batch if item["file_path"]}
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            blobs = execute_values(
+                cur,
+                """INSERT INTO image_blobs (content_hash, filename, file_path, file_size, ref_count) VALUES %s
+                   ON CONFLICT (content_hash) DO UPDATE SET ref_count = image_blobs.ref_count + EXCLUDED.ref_count
+                   RETURNING content_hash, filename, file_path""",
+                [(content_hash, item["filename"], item["file_path"], item["file_size"], references[content_hash])
+                 for content_hash, item in written.items()],
+                page_size=len(written), fetch=True
+            )
+            stored = {blob["content_hash"]: blob for blob in blobs}
+            rows = []
+            for item in batch:
+                metadata, blob = item["metadata"], stored[item["metadata"]["content_hash"]]
+                rows.append((
+                    user_id, blob["filename"], item["original_filename"], blob["file_path"], item["file_size"],
+                    item["mime_type"], metadata.get("width"), metadata.get("height"), metadata.get("channels"),
+                    metadata.get("orientation"), metadata.get("content_hash"), metadata.get("phash"),
+                    metadata.get("dhash"), metadata.get("features")
+                ))
+            ids = execute_values(
+                cur,
+                """INSERT INTO images (user_id, filename, original_filename, file_path, file_size, mime_type,
+                                       width, height, channels, orientation, content_hash, phash, dhash, features)
+                   VALUES %s RETURNING id""",
+                rows, page_size=len(rows), fetch=True
+            )
+            conn.commit()
+            cur.close()
+    except Exception:
+        for item in written.values():
+            remove_file(item["file_path"])
+        raise
+    for content_hash, item in written.items():
+        if stored[content_hash]["file_path"] != item["file_path"]:
+            remove_file(item["file_path"])
+    return [row["id"] for row in ids]
+
+def _is_importable(info: zipfile.ZipInfo):
+    name = info.filename
+    return not info.is_dir() and not name.startswith("__MACOSX/") and not os.path.basename(name).startswith(".")
+
+def import_archive(user_id: int, archive_file, job_id: str):
+    """Import every image entry of a ZIP archive; entries are read one at a time.
+
+    Returns the new image ids and per-entry errors.
+    """
+    image_ids, errors, batch = [], [], []
+    # Hashes whose file was written by the current batch; duplicates within it share that file
+    batch_hashes = set()
+
+    def flush():
+        image_ids.extend(_insert_batch(user_id, batch))
+        update_job(job_id, processed=len(batch))
+        batch.clear()
+        batch_hashes.clear()
+
+    try:
+        with zipfile.ZipFile(archive_file) as archive:
+            entries = [info for info in archive.infolist() if _is_importable(info)]
+            update_job(job_id, total=len(entries))
+            for info in entries:
+                original_filename = os.path.basename(info.filename)
+                mime_type = mimetypes.guess_type(original_filename)[0] or "application/octet-stream"
+                try:
+                    if info.file_size > MAX_ENTRY_BYTES:
+                        raise InvalidImageError("Entry exceeds the maximum image size")
+                    contents = archive.read(info)
+                    metadata = prepare_upload(contents)
+                except (InvalidImageError, zipfile.BadZipFile, NotImplementedError) as e:
+                    errors.append({"filename": info.filename, "error": str(e)})
+                    update_job(job_id, failed=1)
+                    continue
+                filename = file_path = None
+                if metadata["content_hash"] not in batch_hashes:
+                    filename, file_path = write_file(contents, original_filename)
+                    batch_hashes.add(metadata["content_hash"])
+                batch.append({
+                    "original_filename": original_filename,
+                    "mime_type": mime_type,
+                    "file_size": len(contents),
+                    "metadata": metadata,
+                    "filename": filename,
+                    "file_path": file_path
+                })
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+    except Exception as e:
+        for item in batch:
+            remove_file(item["file_path"])
+        finish_job(job_id, error=str(e))
+        raise
+    finish_job(job_id)
+    return image_ids, errors
@@ -0,0 +1,71 @@
+# Saving processing results to the gallery (operations with saves_to_gallery, e.g. draw): as a new image,
+# or in place of the image's file. Results start from the image with its applied edits (edit_history.py),
+# so an in-place save bakes them into the new file before replace_image_file clears the history.
+import os
+import uuid
+
+import codec
+from async_database import create_image
+from database import replace_image_file
+from edit_history import render_edits
+from file_worker import file_worker
+from image_blobs import is_shared_blob
+from image_features import compute_descriptors
+from image_metadata import read_file_metadata
+from profiling import run_in_threadpool
+from storage import backup_path
+from working_store import load_working_image, discard_working_image
+
+def load_edited_image(image_info, ticket):
+    """Decode the image with its applied edits, replayed under the request's ticket; None if unreadable."""
+    if image_info["edit_head"] == 0:
+        return load_working_image(image_info)
+    return codec.decode(render_edits(image_info, ticket))
+
+def _write_copy(image):
+    """Write a result that becomes a new gallery image; returns (filename, path, metadata)."""
+    # Uploads are shared between users with identical content, so derived files get names of their own
+    processed_filename = f"{uuid.uuid4()}.jpg"
+    processed_path = os.path.join("uploads", processed_filename)
+    codec.write(processed_path, image)
+    return processed_filename, processed_path, {**read_file_metadata(processed_path), **compute_descriptors(image)}
+
+def _replace_original(image_info, image, original):
+    """Replace the image's file with the result, keeping a backup; returns the new filename.
+
+    The result always gets a new file: a concurrent upload of the same content may reference the previous
+    blob at any moment, so it is never overwritten; replace_image_file queues it for removal once unused.
+    """
+    # Keep the image before the edit (one backup per image, removed with the image)
+    codec.write(backup_path(image_info["id"]), original)
+    if not is_shared_blob(image_info["content_hash"], image_info["file_path"]):
+        # Nothing else shows the previous content, so its decoded pixels can go
+        discard_working_image(image_info)
+    processed_filename = f"{uuid.uuid4()}{os.path.splitext(image_info['filename'])[1]}"
+    processed_path = os.path.join("uploads", processed_filename)
+    codec.write(processed_path, image)
+    # The previous file is queued for removal if nothing references it anymore
+    replace_image_file(
+        image_info["id"], processed_filename, processed_path,
+        os.path.getsize(processed_path), {**read_file_metadata(processed_path), **compute_descriptors(image)}
+    )
+    return processed_filename
+
+async def save_to_gallery(image_info, image, original, create_copy: bool, current_user):
+    """Add the result to the gallery as a new image, or replace the image's file; returns (filename, image id)."""
+    if create_copy:
+        processed_filename, processed_path, metadata = await run_in_threadpool(_write_copy, image)
+        new_image_id = await create_image(
+            user_id=current_user["id"],
+            filename=processed_filename,
+            original_filename=f"{image_info['original_filename']} (edited)",
+            file_path=processed_path,
+            file_size=os.path.getsize(processed_path),
+            mime_type="image/jpeg",
+            metadata=metadata
+        )
+        return processed_filename, new_image_id
+    # Writes files and blocks on the database (blob references, the file swap)
+    processed_filename = await run_in_threadpool(_replace_original, image_info, image, original)
+    file_worker.wake()
+    return processed_filename, image_info["id"]
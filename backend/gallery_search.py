@@ -0,0 +1,100 @@
+# Gallery search: filters on the original filename, type, upload date, file size and dimensions, one page
+# at a time with keyset pagination. A page continues after the (sort value, id) of the previous page's
+# last row instead of using OFFSET, so every page costs the same however deep the client scrolls.
+#
+# Indexes (database.init_database), all leading with user_id:
+#   idx_images_user_name_trgm    GIN trigram, filename substring (q)
+#   idx_images_user_uploaded_id  default order and upload date ranges
+#   idx_images_user_type         type filter, in upload order
+#   idx_images_user_size         size ranges and size order
+#   idx_images_user_name         name order
+#   idx_images_user_dimensions   width/height ranges
+# python benchmarks/search_explain.py shows the plans on a gallery of a million rows.
+import base64
+import json
+from datetime import datetime
+
+from psycopg2.extensions import cursor as TupleCursor
+
+from database import get_db_connection, IMAGE_LIST_COLUMNS, ImageListRow
+
+SEARCH_SORTS = ("uploaded_at", "file_size", "original_filename")
+SEARCH_MAX_LIMIT = 200
+
+# Filter name -> condition on the column
+RANGE_FILTERS = {
+    "uploaded_after": "uploaded_at >= %s",
+    "uploaded_before": "uploaded_at < %s",
+    "min_size": "file_size >= %s",
+    "max_size": "file_size <= %s",
+    "min_width": "width >= %s",
+    "max_width": "width <= %s",
+    "min_height": "height >= %s",
+    "max_height": "height <= %s",
+}
+
+class InvalidCursorError(ValueError):
+    pass
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def encode_cursor(row, sort: str, descending: bool) -> str:
+    """Opaque cursor of a row: the page after it, in the same order."""
+    value = row[sort]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort, descending, value, row["id"]]).encode()).decode()
+
+def decode_cursor(cursor: str, sort: str, descending: bool):
+    """The (sort value, id) a cursor continues after; it must come from a search in the same order."""
+    try:
+        cursor_sort, cursor_descending, value, image_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if (cursor_sort, cursor_descending) != (sort, descending):
+            raise InvalidCursorError("Cursor belongs to a search in a different order")
+        if sort == "uploaded_at":
+            value = datetime.fromisoformat(value)
+        return value, int(image_id)
+    except InvalidCursorError:
+        raise
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+def build_search_query(user_id: int, filters: dict, sort: str = "uploaded_at", descending: bool = True,
+                       after=None, limit: int = 50):
+    """SQL and parameters of one page; after is the (sort value, id) the page continues after."""
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"Sort must be one of: {list(SEARCH_SORTS)}")
+    conditions, params = ["user_id = %s"], [user_id]
+    if filters.get("q"):
+        conditions.append("original_filename ILIKE %s")
+        params.append(f"%{_escape_like(filters['q'])}%")
+    if filters.get("mime_types"):
+        conditions.append("mime_type = ANY(%s)")
+        params.append(list(filters["mime_types"]))
+    for name, condition in RANGE_FILTERS.items():
+        if filters.get(name) is not None:
+            conditions.append(condition)
+            params.append(filters[name])
+    if after is not None:
+        # Row comparison, so the index on (user_id, sort, id) is entered right at the cursor
+        conditions.append(f"({sort}, id) {'<' if descending else '>'} (%s, %s)")
+        params.extend(after)
+    direction = "DESC" if descending else "ASC"
+    sql = (f"SELECT {', '.join(IMAGE_LIST_COLUMNS)} FROM images WHERE {' AND '.join(conditions)} "
+           f"ORDER BY {sort} {direction}, id {direction} LIMIT %s")
+    return sql, params + [limit]
+
+def search_user_images(user_id: int, filters: dict, sort: str = "uploaded_at", descending: bool = True,
+                       cursor: str = None, limit: int = 50):
+    """One page of the user's matching images as ImageListRow objects; returns (rows, next cursor or None)."""
+    after = decode_cursor(cursor, sort, descending) if cursor else None
+    # One row more than the page tells whether another page follows
+    sql, params = build_search_query(user_id, filters, sort, descending, after, limit + 1)
+    with get_db_connection() as conn:
+        cur = conn.cursor(cursor_factory=TupleCursor)
+        cur.execute(sql, params)
+        rows = [ImageListRow(*row) for row in cur.fetchall()]
+        cur.close()
+    next_cursor = encode_cursor(rows[limit - 1], sort, descending) if len(rows) > limit else None
+    return rows[:limit], next_cursor
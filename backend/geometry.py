@@ -0,0 +1,189 @@
+# Fused geometric transform engine: translate/rotate/scale/resize/crop sequences are composed into a
+# single affine matrix plus an output size, and executed with one resampling pass (or a plain slice).
+#
+# Matrices are kept in "pixel area" coordinates where pixel (i, j) covers [i, i+1) x [j, j+1); this is
+# the convention cv2.resize uses, so scaling composes without half-pixel drift.
+from __future__ import annotations
+import math
+from functools import lru_cache
+
+from lazy_imports import lazy_module
+
+from image_ops import INTERPOLATION_METHODS, OperationError
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+EPSILON = 1e-6
+
+@lru_cache(maxsize=1)
+def _area_conversions():
+    """Matrices converting OpenCV pixel-index coordinates (pixel centers at integers) to pixel-area
+    coordinates and back."""
+    to_area = np.array([[1, 0, 0.5], [0, 1, 0.5], [0, 0, 1]], dtype=np.float64)
+    return to_area, np.linalg.inv(to_area)
+
+def _is_integer(value: float):
+    return abs(value - round(value)) < EPSILON
+
+def _pyramid_reduce(image: np.ndarray, target_width: float, target_height: float) -> np.ndarray:
+    """Halve with cv2.pyrDown (Gaussian blur, then drop every other pixel) while the image is at least
+    twice the target size, leaving a reduction of less than 2x for the final resize or warp.
+
+    Cubic and Lanczos kernels only look at a few source pixels per output pixel, so a large reduction
+    in one step is aliased (and slower, as every output pixel still evaluates the wide kernel).
+    """
+    while image.shape[1] >= 2 * target_width and image.shape[0] >= 2 * target_height:
+        image = cv2.pyrDown(image)
+    return image
+
+class GeometryPlan:
+    """Accumulates geometric operations on an image of the given size without touching pixels."""
+
+    def __init__(self, width: int, height: int):
+        self.source_width, self.source_height = width, height
+        self.width, self.height = width, height
+        self.matrix = np.eye(3, dtype=np.float64)
+        # Translations and rotations expose areas outside the image, filled with black like before;
+        # pure scale/crop plans replicate the border like cv2.resize
+        self.fills_border = False
+
+    def _apply(self, matrix: np.ndarray, width: int, height: int):
+        if width <= 0 or height <= 0:
+            raise OperationError("Resulting image would be empty")
+        self.matrix = matrix @ self.matrix
+        self.width, self.height = width, height
+        return self
+
+    def translate(self, tx: float, ty: float):
+        self.fills_border = True
+        return self._apply(np.array([[1, 0, tx], [0, 1, ty], [0, 0, 1]], dtype=np.float64), self.width, self.height)
+
+    def rotate(self, angle: float, center_x: float = None, center_y: float = None, expand: bool = False):
+        """Rotate counter-clockwise around a center (pixel indices, default the canvas center).
+
+        With expand, the canvas grows to the rotated bounding box instead of clipping corners.
+        """
+        self.fills_border = True
+        center_x = self.width // 2 if center_x is None else center_x
+        center_y = self.height // 2 if center_y is None else center_y
+        rotation = np.vstack([cv2.getRotationMatrix2D((center_x + 0.5, center_y + 0.5), angle, 1.0), [0, 0, 1]])
+        width, height = self.width, self.height
+        if expand:
+            corners = np.array([[0, 0, 1], [self.width, 0, 1], [0, self.height, 1], [self.width, self.height, 1]],
+                               dtype=np.float64).T
+            rotated = rotation @ corners
+            min_x, min_y = rotated[0].min(), rotated[1].min()
+            rotation = np.array([[1, 0, -min_x], [0, 1, -min_y], [0, 0, 1]], dtype=np.float64) @ rotation
+            width = math.ceil(rotated[0].max() - min_x - EPSILON)
+            height = math.ceil(rotated[1].max() - min_y - EPSILON)
+        return self._apply(rotation, width, height)
+
+    def resize(self, width: int, height: int):
+        if width <= 0 or height <= 0:
+            raise OperationError("Width and height must be positive")
+        scale = np.array([[width / self.width, 0, 0], [0, height / self.height, 0], [0, 0, 1]], dtype=np.float64)
+        return self._apply(scale, width, height)
+
+    def scale(self, scale_x: float, scale_y: float):
+        if scale_x <= 0 or scale_y <= 0:
+            raise OperationError("Scale factors must be positive")
+        # Same output size as cv2.resize(fx, fy)
+        return self.resize(max(1, round(self.width * scale_x)), max(1, round(self.height * scale_y)))
+
+    def crop(self, x: int, y: int, width: int, height: int):
+        if width <= 0 or height <= 0:
+            raise OperationError("Width and height must be positive")
+        if x < 0 or y < 0:
+            raise OperationError("Coordinates must be non-negative")
+        if x + width > self.width or y + height > self.height:
+            raise OperationError("Crop area exceeds image boundaries")
+        return self._apply(np.array([[1, 0, -x], [0, 1, -y], [0, 0, 1]], dtype=np.float64), width, height)
+
+    def scale_factors(self):
+        """Horizontal and vertical scale of the composed transform (< 1 means downscaling)."""
+        return float(np.hypot(self.matrix[0, 0], self.matrix[1, 0])), float(np.hypot(self.matrix[0, 1], self.matrix[1, 1]))
+
+    def _source_rect(self):
+        """For axis-aligned plans, the source rectangle mapped onto the output canvas, if integer-aligned."""
+        a, b, tx = self.matrix[0]
+        c, d, ty = self.matrix[1]
+        if abs(b) > EPSILON or abs(c) > EPSILON or a <= 0 or d <= 0:
+            return None
+        x0, x1 = -tx / a, (self.width - tx) / a
+        y0, y1 = -ty / d, (self.height - ty) / d
+        if not all(_is_integer(v) for v in (x0, x1, y0, y1)):
+            return None
+        x0, x1, y0, y1 = round(x0), round(x1), round(y0), round(y1)
+        if x0 < 0 or y0 < 0 or x1 > self.source_width or y1 > self.source_height:
+            return None
+        return x0, y0, x1, y1
+
+    def interpolation_flag(self, interpolation: str):
+        if interpolation == "auto":
+            # INTER_AREA averages source pixels when shrinking, avoiding aliasing
+            return cv2.INTER_AREA if min(self.scale_factors()) < 1 - EPSILON else cv2.INTER_LINEAR
+        if interpolation == "area":
+            return cv2.INTER_AREA
+        if interpolation not in INTERPOLATION_METHODS:
+            raise OperationError(f"Interpolation must be one of: {['auto', 'area', *INTERPOLATION_METHODS.keys()]}")
+        return getattr(cv2, INTERPOLATION_METHODS[interpolation])
+
+    def execute(self, image: np.ndarray, interpolation: str = "auto") -> np.ndarray:
+        flag = self.interpolation_flag(interpolation)
+        rect = self._source_rect()
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            # Crops (and translations by whole pixels within the image) are views, no copy
+            view = image[y0:y1, x0:x1]
+            if (x1 - x0, y1 - y0) == (self.width, self.height):
+                return view
+            if flag not in (cv2.INTER_AREA, cv2.INTER_NEAREST):
+                view = _pyramid_reduce(view, self.width, self.height)
+            return cv2.resize(view, (self.width, self.height), interpolation=flag)
+
+        matrix = self.matrix
+        scale_x, scale_y = self.scale_factors()
+        height, width = image.shape[:2]
+        if flag == cv2.INTER_AREA:
+            # warpAffine has no area filter: shrink once with INTER_AREA, then warp the remainder linearly
+            if scale_x < 1 or scale_y < 1:
+                reduced_width = max(1, round(width * min(scale_x, 1.0)))
+                reduced_height = max(1, round(height * min(scale_y, 1.0)))
+                image = cv2.resize(image, (reduced_width, reduced_height), interpolation=cv2.INTER_AREA)
+            flag = cv2.INTER_LINEAR
+        elif flag != cv2.INTER_NEAREST:
+            image = _pyramid_reduce(image, width * scale_x, height * scale_y)
+        if image.shape[:2] != (height, width):
+            # The matrix maps the original pixels; map the reduced ones instead
+            matrix = matrix @ np.diag([width / image.shape[1], height / image.shape[0], 1.0])
+        border = cv2.BORDER_CONSTANT if self.fills_border else cv2.BORDER_REPLICATE
+        to_area, from_area = _area_conversions()
+        index_matrix = (from_area @ matrix @ to_area)[:2]
+        return cv2.warpAffine(image, index_matrix, (self.width, self.height), flags=flag, borderMode=border)
+
+def build_plan(width: int, height: int, operations, decoded_size=None) -> GeometryPlan:
+    """Compose GeometryOperation models into a plan for an image of the given size.
+
+    decoded_size is the (width, height) of a reduced decode of that image: the plan then starts by
+    scaling it up to the full size, so coordinates and the output size stay those of the full image.
+    """
+    plan = GeometryPlan(width, height) if decoded_size is None else GeometryPlan(*decoded_size).resize(width, height)
+    for op in operations:
+        if op.type == "translate":
+            plan.translate(op.tx, op.ty)
+        elif op.type == "rotate":
+            plan.rotate(op.angle, op.center_x, op.center_y, op.expand)
+        elif op.type == "scale":
+            plan.scale(op.scale_x, op.scale_y)
+        elif op.type == "resize":
+            if op.width is None or op.height is None:
+                raise OperationError("Resize needs width and height")
+            plan.resize(op.width, op.height)
+        elif op.type == "crop":
+            if op.width is None or op.height is None:
+                raise OperationError("Crop needs width and height")
+            plan.crop(op.x, op.y, op.width, op.height)
+        else:
+            raise OperationError("Operation type must be one of: translate, rotate, scale, resize, crop")
+    return plan
@@ -0,0 +1,84 @@
+# Composite geometry endpoint: any sequence of translate/rotate/scale/resize/crop in one resampling pass
+from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import json
+import os
+import codec
+from auth_routes import get_current_user
+from async_database import get_user_image
+from models import GeometryRequest
+from image_ops import OperationError
+from geometry import build_plan
+from profiling import annotate_profile, run_in_threadpool
+from working_store import load_working_image
+from signed_urls import upload_url
+from admission import processing_ticket, Ticket, estimate_cost, stored_size
+
+router = APIRouter()
+
+def _transform(image_info, request: GeometryRequest, processed_filename: str, ticket: Ticket):
+	"""Validate, admit, decode, transform and write the result; returns the output size.
+
+	Runs in the threadpool: the decode, the warp and the encode all take long on large images.
+	"""
+	# Validate the whole sequence and admit its estimated cost before decoding
+	source_width, source_height = stored_size(image_info)
+	plan = build_plan(source_width, source_height, request.operations)
+	ticket.reserve(estimate_cost(source_width, source_height, plan.width, plan.height), (plan.width, plan.height))
+
+	# Large downscales let the JPEG decoder produce a 2/4/8x smaller image
+	reduction = 1
+	if codec.decodes_reduced(image_info["filename"]):
+		reduction = codec.reduction_for(*plan.scale_factors())
+	if reduction > 1:
+		image = codec.decode(os.path.join("uploads", image_info["filename"]), False, reduction)
+	else:
+		image = load_working_image(image_info)
+	if image is None:
+		raise HTTPException(status_code=400, detail="Unable to read image")
+	annotate_profile(image_shape=list(image.shape), reduction=reduction)
+
+	if reduction > 1:
+		plan = build_plan(source_width, source_height, request.operations, (image.shape[1], image.shape[0]))
+	else:
+		plan = build_plan(image.shape[1], image.shape[0], request.operations)
+	transformed_image = plan.execute(image, request.interpolation)
+	codec.write(os.path.join("uploads", processed_filename), transformed_image)
+	return plan.width, plan.height
+
+@router.post("/image/{image_id}/geometry")
+async def apply_geometry(
+	image_id: int,
+	request: GeometryRequest,
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Compose the operations into one affine transform and apply it with a single warp (or a slice)."""
+	try:
+		if not request.operations:
+			raise HTTPException(status_code=400, detail="No operations provided")
+		image_info = await get_user_image(image_id, current_user["id"])
+		if not image_info:
+			raise HTTPException(status_code=404, detail="Image not found")
+
+		# Name the output after the operation sequence, so repeating it reuses the file
+		parameters = request.dict()
+		digest = hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:12]
+		base_name = os.path.splitext(image_info["filename"])[0]
+		processed_filename = f"{base_name}_geometry_{digest}.jpg"
+		output_width, output_height = await run_in_threadpool(_transform, image_info, request, processed_filename, ticket)
+
+		return {
+			"success": True,
+			"processed_filename": processed_filename,
+			"processed_url": upload_url(processed_filename, current_user["id"]),
+			"message": f"{len(request.operations)} geometric operations applied as one transform",
+			"operation": "geometry",
+			"parameters": {**parameters, "output_size": [output_width, output_height]}
+		}
+	except OperationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error transforming image: {str(e)}")
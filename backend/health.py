@@ -0,0 +1,99 @@
+# Liveness and readiness probes for orchestrators.
+#   /health/live   the process serves requests; no dependency is touched, so it's always cheap
+#   /health/ready  the worker can take traffic: the database answers within a timeout, uploads/ has
+#                  free disk, and the threadpool and processing memory budget aren't saturated.
+#                  503 pulls a saturated or disconnected worker out of rotation.
+# Readiness results are cached for READINESS_CACHE_SECONDS and concurrent probes share one check, so
+# frequent polling costs at most one database round trip per interval and worker.
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime
+
+import anyio.to_thread
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from async_database import get_pool
+from database import get_db_connection
+from admission import processing_load
+
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "2"))
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "1"))
+READINESS_MIN_FREE_DISK_MB = int(os.getenv("READINESS_MIN_FREE_DISK_MB", "1024"))
+# Tasks waiting for a threadpool thread before the worker reports itself saturated
+READINESS_MAX_THREADPOOL_WAITING = int(os.getenv("READINESS_MAX_THREADPOOL_WAITING", "20"))
+READINESS_MAX_PROCESSING_LOAD = float(os.getenv("READINESS_MAX_PROCESSING_LOAD", "0.9"))
+
+router = APIRouter(prefix="/health")
+
+_cached = None  # (expiry on the monotonic clock, (ready, body))
+_check_lock = asyncio.Lock()
+
+def _ping_sync():
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+
+async def _check_database():
+    start = time.perf_counter()
+    try:
+        pool = await asyncio.wait_for(get_pool(), READINESS_DB_TIMEOUT)
+        if pool is None:
+            # Without asyncpg, requests use the sync pool through the threadpool
+            await asyncio.wait_for(run_in_threadpool(_ping_sync), READINESS_DB_TIMEOUT)
+            details = {}
+        else:
+            await asyncio.wait_for(pool.fetchval("SELECT 1"), READINESS_DB_TIMEOUT)
+            details = {"pool_size": pool.get_size(), "pool_idle": pool.get_idle_size(), "pool_max": pool.get_max_size()}
+    except asyncio.TimeoutError:
+        return False, {"error": f"No answer within {READINESS_DB_TIMEOUT} s"}
+    except Exception as e:
+        return False, {"error": str(e)}
+    return True, {**details, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+def _check_disk():
+    free_mb = shutil.disk_usage("uploads").free // (1024 * 1024)
+    return free_mb >= READINESS_MIN_FREE_DISK_MB, {"free_mb": free_mb, "min_free_mb": READINESS_MIN_FREE_DISK_MB}
+
+def _check_threadpool():
+    statistics = anyio.to_thread.current_default_thread_limiter().statistics()
+    return statistics.tasks_waiting <= READINESS_MAX_THREADPOOL_WAITING, {
+        "busy": statistics.borrowed_tokens,
+        "size": statistics.total_tokens,
+        "waiting": statistics.tasks_waiting,
+        "max_waiting": READINESS_MAX_THREADPOOL_WAITING,
+    }
+
+def _check_processing():
+    load = processing_load()
+    return load <= READINESS_MAX_PROCESSING_LOAD, {"memory_load": round(load, 3), "max_memory_load": READINESS_MAX_PROCESSING_LOAD}
+
+async def _readiness():
+    global _cached
+    async with _check_lock:
+        # Probes that waited for the lock get the result of the check they waited for
+        if _cached is not None and _cached[0] > time.monotonic():
+            return _cached[1]
+        checks = {"database": await _check_database()}
+        checks.update({"disk": _check_disk(), "threadpool": _check_threadpool(), "processing": _check_processing()})
+        ready = all(ok for ok, _ in checks.values())
+        body = {
+            "status": "ready" if ready else "not_ready",
+            "checks": {name: {"ok": ok, **details} for name, (ok, details) in checks.items()},
+            "checked_at": datetime.now().isoformat(),
+        }
+        _cached = (time.monotonic() + READINESS_CACHE_SECONDS, (ready, body))
+        return ready, body
+
+@router.get("/live")
+async def liveness():
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@router.get("/ready")
+async def readiness():
+    ready, body = await _readiness()
+    return JSONResponse(status_code=200 if ready else 503, content=body)
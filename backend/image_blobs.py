@@ -0,0 +1,79 @@
+# Shared file storage: each distinct upload content is stored once and reference counted
+from db_connection import get_db_connection
+
+def add_blob_reference(content_hash: str):
+    """Reference an already stored blob; returns its row, or None if no blob has this content"""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE image_blobs SET ref_count = ref_count + 1 WHERE content_hash = %s
+               RETURNING filename, file_path""",
+            (content_hash,)
+        )
+        blob = cur.fetchone()
+        conn.commit()
+        cur.close()
+        return blob
+
+def register_blob(content_hash: str, filename: str, file_path: str, file_size: int):
+    """Register a newly written blob with one reference.
+
+    If a concurrent upload registered the same content first, that blob is referenced
+    instead and returned, and the caller should discard its own file.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO image_blobs (content_hash, filename, file_path, file_size, ref_count)
+               VALUES (%s, %s, %s, %s, 1)
+               ON CONFLICT (content_hash) DO UPDATE SET ref_count = image_blobs.ref_count + 1
+               RETURNING filename, file_path""",
+            (content_hash, filename, file_path, file_size)
+        )
+        blob = cur.fetchone()
+        conn.commit()
+        cur.close()
+        return blob
+
+def drop_blob_reference(cur, content_hash: str, file_path: str):
+    """Drop one reference to the blob stored at file_path.
+
+    Returns the file path when it should be removed from disk: either the last reference
+    to a shared blob went away, or the file was never a shared blob (edited copies).
+    """
+    if content_hash is None:
+        return file_path
+    cur.execute(
+        """UPDATE image_blobs SET ref_count = ref_count - 1
+           WHERE content_hash = %s AND file_path = %s RETURNING ref_count""",
+        (content_hash, file_path)
+    )
+    blob = cur.fetchone()
+    if blob is None:
+        return file_path
+    if blob["ref_count"] > 0:
+        return None
+    cur.execute("DELETE FROM image_blobs WHERE content_hash = %s", (content_hash,))
+    return file_path
+
+def release_blob_reference(content_hash: str, file_path: str):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        removable_path = drop_blob_reference(cur, content_hash, file_path)
+        conn.commit()
+        cur.close()
+        return removable_path
+
+def is_shared_blob(content_hash: str, file_path: str):
+    """Whether other images reference the file too, at the time of the query."""
+    if content_hash is None:
+        return False
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT 1 FROM image_blobs WHERE content_hash = %s AND file_path = %s AND ref_count > 1",
+            (content_hash, file_path)
+        )
+        shared = cur.fetchone() is not None
+        cur.close()
+        return shared
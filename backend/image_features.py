@@ -0,0 +1,74 @@
+# Compact visual feature vectors (HSV color histogram + gradient texture) for similarity search
+from __future__ import annotations
+from lazy_imports import lazy_module
+
+from perceptual_hash import compute_image_hashes
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+PROXY_SIZE = 256
+HSV_BINS = (8, 4, 4)  # Hue, saturation, value
+TEXTURE_BINS = 16  # Gradient orientations, weighted by magnitude
+FEATURE_DIM = HSV_BINS[0] * HSV_BINS[1] * HSV_BINS[2] + TEXTURE_BINS
+FEATURE_DTYPE = "float16"
+
+def _proxy(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    height, width = image.shape[:2]
+    scale = PROXY_SIZE / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return image
+
+def compute_feature_vector(image: np.ndarray) -> np.ndarray:
+    """Return an L2-normalized feature vector, so cosine similarity is a dot product."""
+    image = _proxy(image)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    color = cv2.calcHist([hsv], [0, 1, 2], None, list(HSV_BINS), [0, 180, 0, 256, 0, 256]).ravel()
+    color /= max(color.sum(), 1)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    magnitude, angle = cv2.cartToPolar(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+    bins = (angle.ravel() * (TEXTURE_BINS / (2 * np.pi))).astype(np.int32) % TEXTURE_BINS
+    texture = np.bincount(bins, weights=magnitude.ravel(), minlength=TEXTURE_BINS).astype(np.float32)
+    texture /= max(texture.sum(), 1)
+
+    # Square root (Hellinger kernel) keeps large bins from dominating the similarity
+    vector = np.sqrt(np.concatenate([color, texture]))
+    vector /= max(np.linalg.norm(vector), 1e-6)
+    return vector.astype(FEATURE_DTYPE)
+
+def pack_features(vector: np.ndarray) -> bytes:
+    return vector.astype(FEATURE_DTYPE).tobytes()
+
+def unpack_features(data) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype=FEATURE_DTYPE)
+
+def stack_features(rows):
+    """Turn DB rows (id, features) into an id array and a float32 matrix."""
+    ids = np.array([row["id"] for row in rows], dtype=np.int64)
+    if not rows:
+        return ids, np.empty((0, FEATURE_DIM), dtype=np.float32)
+    matrix = np.frombuffer(b"".join(bytes(row["features"]) for row in rows), dtype=FEATURE_DTYPE)
+    return ids, matrix.reshape(len(rows), FEATURE_DIM).astype(np.float32)
+
+def top_k(ids: np.ndarray, matrix: np.ndarray, query: np.ndarray, k: int, exclude_id: int = None):
+    """Brute-force cosine top-k; returns [(id, score)] best first."""
+    if len(ids) == 0:
+        return []
+    scores = matrix @ query.astype(np.float32)
+    if exclude_id is not None:
+        scores[ids == exclude_id] = -np.inf
+    count = min(k + (exclude_id is not None), len(ids))
+    best = np.argpartition(-scores, count - 1)[:count]
+    best = best[np.argsort(-scores[best])]
+    return [(int(ids[i]), float(scores[i])) for i in best if np.isfinite(scores[i])][:k]
+
+def compute_descriptors(image: np.ndarray) -> dict:
+    """Perceptual hashes and packed feature vector, as stored in the images table."""
+    return {**compute_image_hashes(image), "features": pack_features(compute_feature_vector(image))}
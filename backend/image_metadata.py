@@ -0,0 +1,164 @@
+# Image metadata extraction (dimensions, channels, EXIF orientation, content hash)
+# Dimensions are read from the file header where the format allows it, so no full decode is needed.
+import hashlib
+import struct
+
+HEADER_READ_SIZE = 64 * 1024
+
+# EXIF orientations 5-8 rotate the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def compute_content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _parse_exif_orientation(segment: bytes):
+    """Return the orientation tag from an APP1 Exif segment payload, or None."""
+    if not segment.startswith(b"Exif\x00\x00"):
+        return None
+    tiff = segment[6:]
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return None
+    try:
+        ifd_offset = struct.unpack(endian + "I", tiff[4:8])[0]
+        entry_count = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(entry_count):
+            entry = tiff[ifd_offset + 2 + i * 12: ifd_offset + 14 + i * 12]
+            tag = struct.unpack(endian + "H", entry[:2])[0]
+            if tag == 0x0112:
+                return struct.unpack(endian + "H", entry[8:10])[0]
+    except struct.error:
+        return None
+    return None
+
+def _probe_jpeg(data: bytes):
+    orientation = None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):  # End of image / start of scan before any frame header
+            return None
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1 and orientation is None:
+            orientation = _parse_exif_orientation(segment)
+        elif marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            if len(segment) < 6:
+                return None
+            height, width = struct.unpack(">HH", segment[1:5])
+            return width, height, segment[5], orientation or 1
+        pos += 2 + length
+    return None
+
+def _probe_png(data: bytes):
+    if len(data) < 26 or data[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", data[16:24])
+    channels = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}.get(data[25], 3)
+    return width, height, channels, 1
+
+def _probe_gif(data: bytes):
+    if len(data) < 10:
+        return None
+    width, height = struct.unpack("<HH", data[6:10])
+    return width, height, 3, 1
+
+def _probe_bmp(data: bytes):
+    if len(data) < 30 or struct.unpack("<I", data[14:18])[0] < 40:
+        return None
+    width, height = struct.unpack("<ii", data[18:26])
+    bits_per_pixel = struct.unpack("<H", data[28:30])[0]
+    return width, abs(height), 4 if bits_per_pixel == 32 else 3, 1
+
+def _probe_webp(data: bytes):
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF, 3, 1
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = struct.unpack("<I", data[21:25])[0]
+        channels = 4 if bits >> 28 & 1 else 3
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, channels, 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height, 4 if data[20] & 0x10 else 3, 1
+    return None
+
+def probe_header(data: bytes):
+    """Read (width, height, channels, orientation) from the image header, or None if unsupported."""
+    try:
+        if data[:2] == b"\xff\xd8":
+            return _probe_jpeg(data)
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return _probe_png(data)
+        if data[:4] == b"GIF8":
+            return _probe_gif(data)
+        if data[:2] == b"BM":
+            return _probe_bmp(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _probe_webp(data)
+    except struct.error:
+        return None
+    return None
+
+def _probe_by_decoding(data: bytes):
+    # Fallback for formats without a header parser (TIFF, ...): full decode with OpenCV
+    import cv2
+    import numpy as np
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    channels = image.shape[2] if image.ndim == 3 else 1
+    return width, height, channels, 1
+
+def extract_metadata(data: bytes, header_only: bool = False):
+    """Extract width, height, channels, EXIF orientation and content hash from image bytes.
+
+    Width and height are reported as displayed, i.e. after the EXIF rotation that
+    cv2.imread applies, so they can be used to validate processing requests.
+    Returns None if the bytes are not a readable image.
+    """
+    probed = probe_header(data)
+    if probed is None:
+        if header_only:
+            return None
+        probed = _probe_by_decoding(data)
+        if probed is None:
+            return None
+    width, height, channels, orientation = probed
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return {
+        "width": width,
+        "height": height,
+        "channels": channels,
+        "orientation": orientation,
+        "content_hash": None if header_only else compute_content_hash(data),
+    }
+
+def read_file_metadata(file_path: str, include_hash: bool = True):
+    """Extract metadata from a file, reading only its header when no content hash is needed."""
+    if not include_hash:
+        with open(file_path, "rb") as f:
+            metadata = extract_metadata(f.read(HEADER_READ_SIZE), header_only=True)
+        if metadata is not None:
+            return metadata
+    with open(file_path, "rb") as f:
+        data = f.read()
+    metadata = extract_metadata(data)
+    if metadata is not None and not include_hash:
+        metadata["content_hash"] = None
+    return metadata
@@ -0,0 +1,123 @@
+# Image processing kernels: pure functions from a BGR image and a parameter model to a new BGR image.
+# Used to replay edits, so every kernel keeps the 3-channel BGR layout the endpoints decode to.
+from __future__ import annotations
+from lazy_imports import lazy_module
+
+from models import QuickAdjustParams, HSVAdjustParams, RGBChannelParams, DrawingParams
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+# Names of the OpenCV flags, resolved on use so importing this module doesn't load OpenCV
+INTERPOLATION_METHODS = {
+    "nearest": "INTER_NEAREST",
+    "linear": "INTER_LINEAR",
+    "cubic": "INTER_CUBIC",
+    "lanczos": "INTER_LANCZOS4"
+}
+
+FONT_STYLES = {
+    "HERSHEY_SIMPLEX": "FONT_HERSHEY_SIMPLEX",
+    "HERSHEY_PLAIN": "FONT_HERSHEY_PLAIN",
+    "HERSHEY_DUPLEX": "FONT_HERSHEY_DUPLEX",
+    "HERSHEY_COMPLEX": "FONT_HERSHEY_COMPLEX",
+    "HERSHEY_TRIPLEX": "FONT_HERSHEY_TRIPLEX",
+    "HERSHEY_COMPLEX_SMALL": "FONT_HERSHEY_COMPLEX_SMALL",
+    "HERSHEY_SCRIPT_SIMPLEX": "FONT_HERSHEY_SCRIPT_SIMPLEX",
+    "HERSHEY_SCRIPT_COMPLEX": "FONT_HERSHEY_SCRIPT_COMPLEX",
+}
+
+class OperationError(ValueError):
+    """Invalid operation parameters; endpoints report it as a 400."""
+
+def validate_quick_adjust(params: QuickAdjustParams):
+    if not (0.3 <= params.brightness <= 2.0):
+        raise OperationError("Brightness must be between 0.3 and 2.0")
+    if not (0.3 <= params.contrast <= 2.0):
+        raise OperationError("Contrast must be between 0.3 and 2.0")
+    if not (0.0 <= params.saturation <= 2.0):
+        raise OperationError("Saturation must be between 0.0 and 2.0")
+    if not (-30 <= params.hue_shift <= 30):
+        raise OperationError("Hue shift must be between -30 and 30")
+
+def validate_hsv_adjust(params: HSVAdjustParams):
+    if not (-180 <= params.hue_shift <= 180):
+        raise OperationError("Hue shift must be between -180 and 180")
+    if not (0.0 <= params.saturation_scale <= 2.0):
+        raise OperationError("Saturation scale must be between 0.0 and 2.0")
+    if not (0.0 <= params.value_scale <= 2.0):
+        raise OperationError("Value scale must be between 0.0 and 2.0")
+
+def apply_grayscale(image: np.ndarray, params=None) -> np.ndarray:
+    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR)
+
+def apply_quick_adjust(image: np.ndarray, params: QuickAdjustParams) -> np.ndarray:
+    validate_quick_adjust(params)
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
+    hsv_image[:,:,2] = np.clip(hsv_image[:,:,2] * params.brightness, 0, 255)
+    hsv_image[:,:,1] = np.clip(hsv_image[:,:,1] * params.saturation, 0, 255)
+    if params.hue_shift != 0:
+        hsv_image[:,:,0] = (hsv_image[:,:,0] + params.hue_shift) % 180
+    processed_image = cv2.cvtColor(hsv_image.astype(np.uint8), cv2.COLOR_HSV2BGR)
+    # Contrast is applied in BGR space
+    if params.contrast != 1.0:
+        processed_image = cv2.convertScaleAbs(processed_image, alpha=params.contrast, beta=0)
+    return processed_image
+
+def apply_hsv_adjust(image: np.ndarray, params: HSVAdjustParams) -> np.ndarray:
+    validate_hsv_adjust(params)
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
+    hsv_image[:,:,0] = (hsv_image[:,:,0] + params.hue_shift) % 180
+    hsv_image[:,:,1] = np.clip(hsv_image[:,:,1] * params.saturation_scale, 0, 255)
+    hsv_image[:,:,2] = np.clip(hsv_image[:,:,2] * params.value_scale, 0, 255)
+    return cv2.cvtColor(hsv_image.astype(np.uint8), cv2.COLOR_HSV2BGR)
+
+def apply_rgb_channel(image: np.ndarray, params: RGBChannelParams) -> np.ndarray:
+    channel_idx = {'blue': 0, 'green': 1, 'red': 2}.get(params.channel)
+    if channel_idx is None:
+        raise OperationError("Channel must be 'red', 'green' or 'blue'")
+    channel_image = np.zeros_like(image)
+    channel_image[:,:,channel_idx] = image[:,:,channel_idx]
+    return channel_image
+
+def validate_shape(params: DrawingParams):
+    if params.shape_type in ("line", "rectangle") and params.end_point is not None:
+        return
+    if params.shape_type == "circle" and params.radius is not None:
+        return
+    if params.shape_type == "text" and params.text is not None:
+        return
+    raise OperationError("Invalid shape type or missing parameters")
+
+def draw_shape(target_image: np.ndarray, params: DrawingParams, scale: float = 1.0):
+    """Rasterize one shape onto target_image in place, optionally scaled for a downsized preview."""
+    validate_shape(params)
+    color = params.color  # BGR
+    start_point = (round(params.start_point[0] * scale), round(params.start_point[1] * scale))
+    thickness = params.thickness if params.thickness < 0 else max(1, round(params.thickness * scale))
+    if params.shape_type == "line":
+        end_point = (round(params.end_point[0] * scale), round(params.end_point[1] * scale))
+        cv2.line(target_image, start_point, end_point, color, thickness)
+    elif params.shape_type == "rectangle":
+        end_point = (round(params.end_point[0] * scale), round(params.end_point[1] * scale))
+        cv2.rectangle(target_image, start_point, end_point, color, thickness)
+    elif params.shape_type == "circle":
+        cv2.circle(target_image, start_point, max(1, round(params.radius * scale)), color, thickness)
+    else:
+        # Thickness doubles as text size: 1-41 maps to 1.0-5.0 for OpenCV
+        actual_font_size = (params.thickness + 9) / 10.0 * scale
+        font = getattr(cv2, FONT_STYLES.get(params.font_style, "FONT_HERSHEY_SIMPLEX"))
+        cv2.putText(target_image, params.text, start_point, font, actual_font_size, color, thickness)
+
+def rasterize_shapes(image: np.ndarray, shapes, scale: float = 1.0) -> np.ndarray:
+    """Draw all shapes onto a single copy of the image in one pass."""
+    target_image = image.copy()
+    for params in shapes:
+        draw_shape(target_image, params, scale)
+    return target_image
+
+def apply_draw(image: np.ndarray, params: DrawingParams) -> np.ndarray:
+    target_image = image.copy()
+    draw_shape(target_image, params)
+    return target_image
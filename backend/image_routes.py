@@ -1,70 +1,114 @@
 # Image upload, retrieval, and deletion endpoints
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
 from datetime import datetime
+from typing import Optional
 import os
-from database import create_image, get_user_images, delete_image, delete_multiple_images
-from models import ImageResponse, DeleteImagesRequest
-from .auth_routes import get_current_user
+from database import get_user_images, delete_image, delete_multiple_images, IMAGE_LIST_COLUMNS
+from gallery_search import search_user_images, InvalidCursorError, SEARCH_SORTS, SEARCH_MAX_LIMIT
+from models import ImageResponse, ImageSearchResponse, DeleteImagesRequest
+from auth_routes import get_current_user
+from storage import store_upload, InvalidImageError
+from file_worker import file_worker
+from signed_urls import upload_url, thumbnail_url, verify_signature, cache_headers, SIGNED_URLS_REQUIRED
+from thumbnails import get_thumbnail, THUMBNAIL_SIZES
+from profiling import run_in_threadpool
 
 router = APIRouter()
 
+def _signed_urls(filename: str, user_id: int):
+	# Signed here, after the ownership check, so the file routes need no auth lookup per image
+	return {"url": upload_url(filename, user_id), "thumbnail_url": thumbnail_url(filename, user_id, THUMBNAIL_SIZES[0])}
+
+def _listing(images, columns, user_id: int):
+	"""Listing entries with their signed URLs; the URLs carry each file's version, which takes a stat,
+	so long listings are built in the threadpool."""
+	return [{**{column: img[column] for column in columns}, **_signed_urls(img["filename"], user_id)} for img in images]
+
 @router.post("/upload-image", response_model=ImageResponse)
 async def upload_image(file: UploadFile = File(...), current_user = Depends(get_current_user)):
 	if not file.content_type.startswith("image/"):
 		raise HTTPException(status_code=400, detail="File must be an image")
 	try:
-		import uuid
-		file_extension = file.filename.split('.')[-1]
-		unique_filename = f"{uuid.uuid4()}.{file_extension}"
-		file_path = os.path.join("uploads", unique_filename)
 		contents = await file.read()
-		with open(file_path, "wb") as f:
-			f.write(contents)
-		image_id = create_image(
-			user_id=current_user["id"],
-			filename=unique_filename,
-			original_filename=file.filename,
-			file_path=file_path,
-			file_size=len(contents),
-			mime_type=file.content_type
-		)
-		return {
-			"id": image_id,
-			"filename": unique_filename,
-			"original_filename": file.filename,
-			"file_size": len(contents),
-			"mime_type": file.content_type,
-			"uploaded_at": datetime.now()
-		}
+		# Identical content is stored once and shared between uploads
+		image = await run_in_threadpool(store_upload, current_user["id"], file.filename, contents, file.content_type)
+		return {**image, "uploaded_at": datetime.now(), **_signed_urls(image["filename"], current_user["id"])}
+	except InvalidImageError as e:
+		raise HTTPException(status_code=400, detail=str(e))
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @router.get("/my-images", response_model=list[ImageResponse])
 async def get_my_images(current_user = Depends(get_current_user)):
-	images = get_user_images(current_user["id"])
-	return [
-		{
-			"id": img["id"],
-			"filename": img["filename"],
-			"original_filename": img["original_filename"],
-			"file_size": img["file_size"],
-			"mime_type": img["mime_type"],
-			"uploaded_at": img["uploaded_at"]
-		}
-		for img in images
-	]
+	# Slotted rows with the listing columns only, cheap even for very large galleries
+	images = await run_in_threadpool(get_user_images, current_user["id"], True)
+	columns = ("id", "filename", "original_filename", "file_size", "mime_type", "uploaded_at")
+	return await run_in_threadpool(_listing, images, columns, current_user["id"])
+
+@router.get("/images/search", response_model=ImageSearchResponse)
+async def search_images(
+	q: Optional[str] = Query(None, max_length=255, description="Part of the original filename, case-insensitive"),
+	mime_type: Optional[list[str]] = Query(None, description="Any of these types; repeat the parameter for several"),
+	uploaded_after: Optional[datetime] = None,
+	uploaded_before: Optional[datetime] = None,
+	min_size: Optional[int] = Query(None, ge=0, description="File size in bytes"),
+	max_size: Optional[int] = Query(None, ge=0),
+	min_width: Optional[int] = Query(None, ge=0),
+	max_width: Optional[int] = Query(None, ge=0),
+	min_height: Optional[int] = Query(None, ge=0),
+	max_height: Optional[int] = Query(None, ge=0),
+	sort: str = Query("uploaded_at", description=f"One of: {', '.join(SEARCH_SORTS)}"),
+	order: str = Query("desc", description="asc or desc"),
+	limit: int = Query(50, ge=1, le=SEARCH_MAX_LIMIT),
+	cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+	current_user = Depends(get_current_user)
+):
+	"""Search the gallery one page at a time; images without stored dimensions never match dimension filters."""
+	if sort not in SEARCH_SORTS:
+		raise HTTPException(status_code=400, detail=f"Sort must be one of: {list(SEARCH_SORTS)}")
+	if order not in ("asc", "desc"):
+		raise HTTPException(status_code=400, detail="Order must be 'asc' or 'desc'")
+	filters = {
+		"q": q, "mime_types": mime_type, "uploaded_after": uploaded_after, "uploaded_before": uploaded_before,
+		"min_size": min_size, "max_size": max_size, "min_width": min_width, "max_width": max_width,
+		"min_height": min_height, "max_height": max_height
+	}
+	try:
+		images, next_cursor = await run_in_threadpool(
+			search_user_images, current_user["id"], filters, sort, order == "desc", cursor, limit
+		)
+	except InvalidCursorError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	return {
+		"images": await run_in_threadpool(_listing, images, IMAGE_LIST_COLUMNS, current_user["id"]),
+		"next_cursor": next_cursor
+	}
+
+@router.get("/thumbnails/{size}/{filename}")
+async def get_image_thumbnail(size: int, filename: str, request: Request):
+	"""Downsized JPEG of an image; authorized by the signed URL (thumbnail_url), not a bearer token."""
+	remaining = verify_signature(f"/thumbnails/{size}/{filename}", request.query_params)
+	if remaining is None and SIGNED_URLS_REQUIRED:
+		raise HTTPException(status_code=403, detail="Invalid or expired signature")
+	if size not in THUMBNAIL_SIZES or filename != os.path.basename(filename) or filename.startswith("."):
+		raise HTTPException(status_code=404, detail="Thumbnail not found")
+	path = await run_in_threadpool(get_thumbnail, filename, size)
+	if path is None:
+		raise HTTPException(status_code=404, detail="Thumbnail not found")
+	return FileResponse(path, media_type="image/jpeg", headers=cache_headers(remaining))
 
 @router.delete("/image/{image_id}")
 async def delete_single_image(image_id: int, current_user = Depends(get_current_user)):
 	try:
-		success, result = delete_image(image_id, current_user["id"])
+		success, message = await run_in_threadpool(delete_image, image_id, current_user["id"])
 		if not success:
-			raise HTTPException(status_code=404, detail=result)
-		if os.path.exists(result):
-			os.remove(result)
+			raise HTTPException(status_code=404, detail=message)
+		# The files are removed in the background; their removal was queued with the delete
+		file_worker.wake()
 		return {
 			"success": True,
-			"message": f"Image {image_id} deleted successfully"
+			"message": message
 		}
 	except Exception as e:
 		if isinstance(e, HTTPException):
@@ -76,18 +120,16 @@ async def delete_multiple_images_endpoint(request: DeleteImagesRequest, current_
 	try:
 		if not request.image_ids:
 			raise HTTPException(status_code=400, detail="No image IDs provided")
-		file_paths, message = delete_multiple_images(request.image_ids, current_user["id"])
-		if not file_paths:
+		deleted_ids, message = await run_in_threadpool(delete_multiple_images, request.image_ids, current_user["id"])
+		if not deleted_ids:
 			raise HTTPException(status_code=404, detail=message)
-		deleted_files = 0
-		for path in file_paths:
-			if os.path.exists(path):
-				os.remove(path)
-				deleted_files += 1
+		deleted_count = len(deleted_ids)
+		# Files no longer referenced by any image are removed in the background
+		file_worker.wake()
 		return {
 			"success": True,
-			"message": f"Successfully deleted {deleted_files} images",
-			"deleted_count": deleted_files
+			"message": f"Successfully deleted {deleted_count} images",
+			"deleted_count": deleted_count
 		}
 	except Exception as e:
 		if isinstance(e, HTTPException):
@@ -0,0 +1,78 @@
+# Lossless intermediates: results that aren't BGR images (HSV/LAB/YUV/GRAY conversions) are stored as
+# raw .npy arrays with a JSON sidecar describing their channels, instead of going through a JPEG
+# encoder that assumes BGR. Later steps map them read-only with np.load(mmap_mode="r"), without
+# decoding or copying; only an explicit export renders a viewable JPEG.
+import glob
+import json
+import os
+import re
+import uuid
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+INTERMEDIATE_DIR = os.getenv("INTERMEDIATE_DIR", "intermediates")
+
+COLOR_SPACE_CHANNELS = {
+    "HSV": ["H", "S", "V"],  # H is 0-179 (degrees / 2)
+    "LAB": ["L", "A", "B"],
+    "YUV": ["Y", "U", "V"],
+    "GRAY": ["Y"],
+}
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def _paths(name: str):
+    return os.path.join(INTERMEDIATE_DIR, f"{name}.npy"), os.path.join(INTERMEDIATE_DIR, f"{name}.json")
+
+def _replace_atomic(path: str, write):
+    """Write through a temporary file so concurrent readers never map a partial file."""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+
+def save_intermediate(image_id: int, name_part: str, array, color_space: str, roi=None) -> str:
+    """Store an array in the given color space for the image; returns its name."""
+    name = f"{image_id}_{name_part}"
+    # Kernels keep three channels; a whole-image gray result only needs one of them
+    if color_space == "GRAY" and roi is None and array.ndim == 3:
+        array = array[:, :, 0]
+    array = np.ascontiguousarray(array)
+    metadata = {
+        "image_id": image_id,
+        "color_space": color_space,
+        "channels": COLOR_SPACE_CHANNELS[color_space],
+        "shape": list(array.shape),
+        "dtype": str(array.dtype),
+        # Only the region is in color_space when the conversion was limited to a region of interest
+        "roi": roi.dict() if roi is not None else None,
+    }
+    os.makedirs(INTERMEDIATE_DIR, exist_ok=True)
+    array_path, metadata_path = _paths(name)
+    _replace_atomic(array_path, lambda f: np.save(f, array))
+    # The sidecar is written last: an intermediate exists once its metadata does
+    _replace_atomic(metadata_path, lambda f: f.write(json.dumps(metadata).encode()))
+    return name
+
+def load_intermediate(image_id: int, name: str):
+    """Map an intermediate of the image read-only without copying; returns (array, metadata) or None."""
+    if not name.startswith(f"{image_id}_") or not _NAME_PATTERN.match(name):
+        return None
+    array_path, metadata_path = _paths(name)
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    return np.load(array_path, mmap_mode="r"), metadata
+
+def as_working_image(array):
+    """The 3-channel layout kernels work on; gray intermediates are expanded, others used as they are."""
+    return cv2.cvtColor(array, cv2.COLOR_GRAY2BGR) if array.ndim == 2 else array
+
+def remove_intermediates(image_id: int):
+    for path in glob.glob(os.path.join(INTERMEDIATE_DIR, f"{image_id}_*")):
+        if os.path.exists(path):
+            os.remove(path)
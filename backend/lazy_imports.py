@@ -0,0 +1,34 @@
+# Deferred imports of heavy modules (OpenCV, NumPy), so the server starts and serves auth and
+# listing routes without loading them; the first processing request pays the import instead.
+import importlib
+import threading
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        module = self._module if self._module is not None else self._load()
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+_modules = {}
+
+def lazy_module(name: str) -> LazyModule:
+    """Shared lazy stand-in for the named module."""
+    if name not in _modules:
+        _modules[name] = LazyModule(name)
+    return _modules[name]
@@ -0,0 +1,9 @@
+# Create or update the database schema (tables, indexes, column additions). Run once per deploy,
+# before starting the API; the API itself no longer runs DDL on startup.
+#
+# Usage: python migrate.py
+from database import init_database
+
+if __name__ == "__main__":
+    init_database()
+    print("Database schema is up to date")
@@ -30,13 +30,25 @@ class ImageResponse(BaseModel):
     file_size: int
     mime_type: str
     uploaded_at: datetime
+    # Signed, short-lived URLs of the image and of its gallery thumbnail (relative to the API)
+    url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+
+class ImageSearchResult(ImageResponse):
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+class ImageSearchResponse(BaseModel):
+    images: list[ImageSearchResult]
+    next_cursor: Optional[str] = None  # pass back as cursor for the next page; None on the last page
 
 # Image Processing Models
 class ImageDimensionsResponse(BaseModel):
     width: int
     height: int
-    channels: int
+    channels: int  # channels of the decoded image processing works on: always 3 (BGR)
     total_pixels: int
+    file_channels: Optional[int] = None  # channels stored in the file: 1 gray, 2 gray + alpha, 3 color, 4 with alpha
 
 class ImageProcessingRequest(BaseModel):
     image_id: int
@@ -48,6 +60,12 @@ class HSVAdjustParams(BaseModel):
     saturation_scale: float = 1.0  # 0.0 to 2.0
     value_scale: float = 1.0  # 0.0 to 2.0
 
+class QuickAdjustParams(BaseModel):
+    brightness: float = 1.0  # 0.3 to 2.0
+    contrast: float = 1.0    # 0.3 to 2.0
+    saturation: float = 1.0  # 0.0 to 2.0
+    hue_shift: int = 0       # -30 to 30
+
 class RGBChannelParams(BaseModel):
     channel: str  # 'red', 'green', 'blue', 'all'
 
@@ -74,6 +92,7 @@ class DrawingParams(BaseModel):
     thickness: int = 2
     text: Optional[str] = None
     font_size: float = 1.0
+    font_style: str = "HERSHEY_SIMPLEX"
 
 class TransformParams(BaseModel):
     operation: str  # 'translate', 'rotate'
@@ -82,19 +101,115 @@ class TransformParams(BaseModel):
     angle: Optional[float] = 0  # Rotation angle in degrees
     center_x: Optional[float] = None  # Rotation center X
     center_y: Optional[float] = None  # Rotation center Y
+    expand: bool = False  # Rotate: grow the canvas to fit instead of clipping corners
 
 class ResizeParams(BaseModel):
     width: int
     height: int
-    interpolation: str = 'linear'  # 'nearest', 'linear', 'cubic', 'lanczos'
+    interpolation: str = 'auto'  # 'auto' (area when shrinking), 'area', 'nearest', 'linear', 'cubic', 'lanczos'
 
 class ScaleParams(BaseModel):
     scale_x: float = 1.0
     scale_y: float = 1.0
-    interpolation: str = 'linear'
+    interpolation: str = 'auto'
 
 class CropParams(BaseModel):
     x: int  # Top-left x coordinate
     y: int  # Top-left y coordinate
     width: int  # Crop width
-    height: int  # Crop height
\ No newline at end of file
+    height: int  # Crop height
+# Near-duplicate Detection Models
+class DuplicateClustersResponse(BaseModel):
+    hash_type: str  # 'phash', 'dhash'
+    threshold: int
+    clusters: list[list[int]]  # Image ids per cluster
+
+class NearDuplicate(BaseModel):
+    id: int
+    distance: int  # Hamming distance between hashes
+
+class SimilarImage(BaseModel):
+    id: int
+    score: float  # Cosine similarity of feature vectors, 1.0 is identical
+
+# Edit History Models
+class EditRequest(BaseModel):
+    operation: str  # 'grayscale', 'quick_adjust', 'hsv_adjust', 'rgb_channel', 'colorspace', 'draw', 'transform', 'resize', 'scale', 'crop'
+    parameters: dict = {}
+
+class EditEntry(BaseModel):
+    seq: int
+    operation: str
+    parameters: dict
+    created_at: datetime
+
+class EditHistoryResponse(BaseModel):
+    image_id: int
+    head: int  # Number of edits currently applied; edits after it can be redone
+    edits: list[EditEntry]
+
+# Annotation Models
+class AnnotationBatchRequest(BaseModel):
+    shapes: list[DrawingParams]
+
+class AnnotationsResponse(BaseModel):
+    image_id: int
+    shapes: list[DrawingParams]
+
+# Geometry Engine Models
+class GeometryOperation(BaseModel):
+    type: str  # 'translate', 'rotate', 'scale', 'resize', 'crop'
+    tx: float = 0  # translate
+    ty: float = 0
+    angle: float = 0  # rotate, degrees counter-clockwise
+    center_x: Optional[float] = None
+    center_y: Optional[float] = None
+    expand: bool = False  # rotate: grow the canvas instead of clipping corners
+    scale_x: float = 1.0  # scale
+    scale_y: float = 1.0
+    x: int = 0  # crop
+    y: int = 0
+    width: Optional[int] = None  # resize, crop
+    height: Optional[int] = None
+
+class GeometryRequest(BaseModel):
+    operations: list[GeometryOperation]
+    interpolation: str = 'auto'  # 'auto' (area when shrinking), 'area', 'nearest', 'linear', 'cubic', 'lanczos'
+
+# Region of Interest Model
+class RegionOfInterest(BaseModel):
+    x: int  # Top-left x coordinate
+    y: int  # Top-left y coordinate
+    width: int
+    height: int
+
+# Operation Registry Models
+class BatchOperationRequest(BaseModel):
+    image_ids: list[int]
+    operation: str  # Any registered operation, see operations.py
+    parameters: dict = {}
+
+class PipelineRequest(BaseModel):
+    steps: list[EditRequest]  # Applied in order with one decode and one encode
+    source: Optional[str] = None  # Start from a stored intermediate of the image instead of the image
+
+# Archive Models
+class ExportImagesRequest(BaseModel):
+    image_ids: Optional[list[int]] = None  # None exports the whole gallery
+
+class ArchiveImportResponse(BaseModel):
+    job_id: str
+    imported_count: int
+    image_ids: list[int]
+    errors: list[dict]  # {"filename", "error"} per skipped entry
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str  # 'export', 'import'
+    status: str  # 'running', 'completed', 'failed', 'cancelled'
+    total: Optional[int] = None
+    processed: int
+    failed: int
+    error: Optional[str] = None
+    started_at: float
+    finished_at: Optional[float] = None
@@ -0,0 +1,353 @@
+# Image processing endpoints generated from the operation registry (operations.py): one endpoint per
+# operation, plus batch, pipeline and preview endpoints accepting any registered operation.
+# Decoding, kernels and encoding run in the threadpool, so processing never blocks the event loop;
+# the images of a batch are processed concurrently (OpenCV releases the GIL).
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import os
+import codec
+from auth_routes import get_current_user
+from async_database import get_user_image
+from models import RegionOfInterest, BatchOperationRequest, PipelineRequest
+from image_ops import OperationError
+from operations import OPERATIONS, parse_operation, parse_steps, plan_steps, admit_steps
+from roi import roi_query, roi_suffix, apply_in_roi, validate_roi
+from admission import processing_ticket, Ticket, estimate_cost, stored_size
+from edit_history import rendered_size
+from gallery_saves import save_to_gallery, load_edited_image
+from profiling import annotate_profile, run_in_threadpool
+from working_store import load_working_image
+from intermediates import COLOR_SPACE_CHANNELS, save_intermediate, load_intermediate, as_working_image
+from signed_urls import upload_url
+
+router = APIRouter()
+
+PREVIEW_JPEG_QUALITY = 85
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+
+async def _get_image_or_404(image_id: int, current_user):
+	image_info = await get_user_image(image_id, current_user["id"])
+	if not image_info:
+		raise HTTPException(status_code=404, detail="Image not found")
+	return image_info
+
+def _decode(image_info, grayscale: bool = False, reduction: int = 1):
+	if grayscale or reduction > 1:
+		image = codec.decode(os.path.join("uploads", image_info["filename"]), grayscale, reduction)
+	else:
+		# Images being edited are mapped from the working store instead of decoded on every request
+		image = load_working_image(image_info)
+	if image is None:
+		raise HTTPException(status_code=400, detail="Unable to read image")
+	return image
+
+def _write_processed(image_info, name_part: str, roi: Optional[RegionOfInterest], image):
+	base_name = os.path.splitext(image_info["filename"])[0]
+	processed_filename = f"{base_name}_{name_part}{roi_suffix(roi)}.jpg"
+	codec.write(os.path.join("uploads", processed_filename), image)
+	return processed_filename
+
+def _store_result(operation, params, image, roi: Optional[RegionOfInterest], image_info):
+	"""Write a result as a JPEG under uploads/, or as a lossless intermediate when it isn't BGR."""
+	name_part = operation.describe(params)[0]
+	if operation.output_space is not None:
+		return save_intermediate(image_info["id"], f"{name_part}{roi_suffix(roi)}", image, operation.output_space(params), roi)
+	return _write_processed(image_info, name_part, roi, image)
+
+def _process_and_store(operation, variants, image, roi: Optional[RegionOfInterest], image_info, width: int, height: int):
+	names = []
+	for params in variants:
+		if roi is None:
+			# The image may be a gray or reduced decode (Operation.decode_options)
+			result = operation.apply_decoded(image, params, width, height)
+		else:
+			# Region edits are composited into the decoded image, so variants each need their own copy
+			source = image.copy() if len(variants) > 1 else image
+			result = apply_in_roi(source, roi, lambda region: operation.apply(region, params))
+		names.append(_store_result(operation, params, result, roi, image_info))
+	return names
+
+async def _run_operation(operation, image_info, params, roi: Optional[RegionOfInterest], create_copy: bool,
+						 ticket: Ticket, current_user):
+	variants = operation.expand(params)
+	# Validate against the stored size and admit the estimated cost before decoding; gallery results
+	# start from the image with its applied edits (gallery_saves.py)
+	width, height = rendered_size(image_info) if operation.saves_to_gallery else stored_size(image_info)
+	validate_roi(roi, width, height)
+	if roi is not None:
+		for variant in variants:
+			if operation.output_size(variant, roi.width, roi.height) != (roi.width, roi.height):
+				raise OperationError("Operations that change the image size can't be limited to a region of interest")
+	admit_steps(ticket, [(operation, variant) for variant in variants], width, height)
+
+	# Decode only what the operation needs: the luma, or a 2/4/8x reduction for large downscales
+	grayscale, reduction = False, 1
+	if roi is None and len(variants) == 1 and not operation.saves_to_gallery:
+		grayscale, reduction = operation.decode_options(params, width, height)
+		if not codec.decodes_reduced(image_info["filename"]):
+			reduction = 1
+	if operation.saves_to_gallery:
+		image = await run_in_threadpool(load_edited_image, image_info, ticket)
+		if image is None:
+			raise HTTPException(status_code=400, detail="Unable to read image")
+	else:
+		image = await run_in_threadpool(_decode, image_info, grayscale, reduction)
+	annotate_profile(operation=operation.name, image_shape=list(image.shape), luma_only=grayscale, reduction=reduction)
+
+	name_part, message = operation.describe(params)
+	response = {
+		"success": True,
+		"message": message,
+		"operation": operation.name,
+		"parameters": {**(params.dict() if params is not None else {}), "roi": roi.dict() if roi else None}
+	}
+	if operation.saves_to_gallery:
+		# Gallery operations take no region, so the decoded image stays intact for the backup
+		result = await run_in_threadpool(operation.apply, image, params)
+		processed_filename, new_image_id = await save_to_gallery(image_info, result, image, create_copy, current_user)
+		response["message"] += " (created copy)" if create_copy else " (updated original)"
+		return {
+			**response,
+			"processed_filename": processed_filename,
+			"processed_url": upload_url(processed_filename, current_user["id"]),
+			"original_filename": image_info["filename"],
+			"create_copy": create_copy,
+			"new_image_id": new_image_id
+		}
+	filenames = await run_in_threadpool(_process_and_store, operation, variants, image, roi, image_info, width, height)
+	if operation.output_space is not None:
+		color_space = operation.output_space(params)
+		return {**response, "intermediate": filenames[0], "color_space": color_space, "channels": COLOR_SPACE_CHANNELS[color_space]}
+	if len(filenames) == 1:
+		return {**response, "processed_filename": filenames[0], "processed_url": upload_url(filenames[0], current_user["id"])}
+	base_name = os.path.splitext(image_info["filename"])[0]
+	return {**response, "processed_filename": f"{base_name}_{name_part}{roi_suffix(roi)}", "processed_filenames": filenames,
+			"processed_urls": [upload_url(filename, current_user["id"]) for filename in filenames]}
+
+def _none():
+	return None
+
+def _create_copy_query(create_copy: bool = Query(True, description="Whether to create a copy or update the original image")):
+	return create_copy
+
+def _add_operation_endpoint(operation):
+	async def operation_endpoint(
+		image_id: int,
+		params = Depends(operation.query or _none),
+		roi: Optional[RegionOfInterest] = Depends(roi_query if operation.supports_roi else _none),
+		create_copy: Optional[bool] = Depends(_create_copy_query if operation.saves_to_gallery else _none),
+		ticket: Ticket = Depends(processing_ticket),
+		current_user = Depends(get_current_user)
+	):
+		try:
+			image_info = await _get_image_or_404(image_id, current_user)
+			return await _run_operation(operation, image_info, params, roi, create_copy, ticket, current_user)
+		except OperationError as e:
+			raise HTTPException(status_code=400, detail=str(e))
+		except HTTPException:
+			raise
+		except Exception as e:
+			raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+	operation_endpoint.__name__ = f"{operation.name}_image"
+	operation_endpoint.__doc__ = f"Apply {operation.name} to an image" + (", optionally limited to a region." if operation.supports_roi else ".")
+	router.add_api_route(f"/image/{{image_id}}/{operation.path}", operation_endpoint, methods=["POST"])
+
+for _operation in OPERATIONS.values():
+	_add_operation_endpoint(_operation)
+
+def _open_intermediate(image_info, name: str):
+	loaded = load_intermediate(image_info["id"], name)
+	if loaded is None:
+		raise HTTPException(status_code=404, detail="Intermediate not found")
+	return loaded
+
+def _open_input(image_info, source: Optional[str]):
+	"""A pipeline's input without decoding it: (mapped intermediate or None, width, height, color space).
+
+	Pipelines start from the image (BGR), or from one of its stored intermediates.
+	"""
+	if source is None:
+		return (None, *stored_size(image_info), None)
+	array, metadata = _open_intermediate(image_info, source)
+	return array, array.shape[1], array.shape[0], metadata["color_space"]
+
+async def _read_input(image_info, array):
+	# Intermediates are already mapped in memory, only the image needs decoding
+	if array is not None:
+		return as_working_image(array)
+	return await run_in_threadpool(_decode, image_info)
+
+def _output_space(steps, color_space: Optional[str]):
+	"""Color space of a pipeline's result, None for BGR; later steps treat channels as they are."""
+	for operation, params in steps:
+		if operation.output_space is not None:
+			color_space = operation.output_space(params)
+	return color_space
+
+def _apply_steps(steps, image):
+	for operation, params in steps:
+		image = operation.apply(image, params)
+	return image
+
+def _read_preview_input(image_info, array, width: int, height: int, max_size: int):
+	"""The pipeline input downsized to max_size; images are mostly downsized by the JPEG decoder."""
+	if array is not None:
+		return codec.fit(as_working_image(array), max_size)
+	image = codec.decode_fit(os.path.join("uploads", image_info["filename"]), max_size, width, height)
+	if image is None:
+		raise HTTPException(status_code=400, detail="Unable to read image")
+	return image
+
+def _render_preview(steps, image, width: int, height: int, max_size: int):
+	for operation, params in steps:
+		output_width, output_height = operation.output_size(params, width, height)
+		image = operation.preview(image, params, width, height)
+		width, height = output_width, output_height
+	# Upscaling steps grow the preview along with the image
+	return codec.encode(codec.fit(image, max_size), ".jpg", PREVIEW_JPEG_QUALITY)
+
+@router.post("/images/batch")
+async def batch_operation(
+	request: BatchOperationRequest,
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Apply one operation to several images, BATCH_CONCURRENCY at a time; failures are reported per image."""
+	try:
+		if not request.image_ids:
+			raise HTTPException(status_code=400, detail="No image IDs provided")
+		operation, params = parse_operation(request.operation, request.parameters)
+		semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+		async def process(image_id: int):
+			# Each image reserves and returns its own memory; the request holds the user's admission
+			image_ticket = Ticket(ticket.user_id)
+			async with semaphore:
+				try:
+					image_info = await _get_image_or_404(image_id, current_user)
+					result = await _run_operation(operation, image_info, params, None, True, image_ticket, current_user)
+					return {"image_id": image_id, **result}
+				except OperationError as e:
+					return {"image_id": image_id, "success": False, "error": str(e)}
+				except HTTPException as e:
+					return {"image_id": image_id, "success": False, "error": e.detail}
+				finally:
+					image_ticket.release_memory()
+
+		results = await asyncio.gather(*(process(image_id) for image_id in request.image_ids))
+		failed_count = sum(1 for result in results if not result["success"])
+		return {
+			"success": failed_count < len(results),
+			"message": f"{operation.name} applied to {len(results) - failed_count} of {len(results)} images",
+			"operation": operation.name,
+			"results": results,
+			"failed_count": failed_count
+		}
+	except OperationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+
+@router.post("/image/{image_id}/pipeline")
+async def run_pipeline(
+	image_id: int,
+	request: PipelineRequest,
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Apply a sequence of operations with a single decode and a single encode."""
+	try:
+		steps = parse_steps(request.steps)
+		image_info = await _get_image_or_404(image_id, current_user)
+		source, width, height, color_space = _open_input(image_info, request.source)
+		output_width, output_height = admit_steps(ticket, steps, width, height)
+
+		image = await _read_input(image_info, source)
+		annotate_profile(operation="pipeline", steps=[operation.name for operation, _ in steps], image_shape=list(image.shape))
+		result = await run_in_threadpool(_apply_steps, steps, image)
+
+		# Name the output after the steps, so repeating a pipeline reuses the file
+		parameters = request.dict()
+		digest = hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:12]
+		response = {
+			"success": True,
+			"message": f"{len(steps)} operations applied",
+			"operation": "pipeline",
+			"parameters": {**parameters, "output_size": [output_width, output_height]}
+		}
+		color_space = _output_space(steps, color_space)
+		if color_space is not None:
+			name = await run_in_threadpool(save_intermediate, image_info["id"], f"pipeline_{digest}", result, color_space)
+			return {**response, "intermediate": name, "color_space": color_space, "channels": COLOR_SPACE_CHANNELS[color_space]}
+		processed_filename = await run_in_threadpool(_write_processed, image_info, f"pipeline_{digest}", None, result)
+		return {**response, "processed_filename": processed_filename, "processed_url": upload_url(processed_filename, current_user["id"])}
+	except OperationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@router.post("/image/{image_id}/preview")
+async def preview_pipeline(
+	image_id: int,
+	request: PipelineRequest,
+	max_size: int = Query(1024, ge=64, le=4096, description="Longest side of the preview in pixels"),
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Render the operations on a downsized copy of the image and return it as a JPEG; nothing is saved."""
+	try:
+		steps = parse_steps(request.steps)
+		image_info = await _get_image_or_404(image_id, current_user)
+		source, width, height, _ = _open_input(image_info, request.source)
+		# Every step is validated at full size, but only the decode is paid at full size
+		plan_steps(steps, width, height)
+		ticket.reserve(estimate_cost(width, height))
+
+		image = await run_in_threadpool(_read_preview_input, image_info, source, width, height, max_size)
+		annotate_profile(operation="preview", steps=[operation.name for operation, _ in steps], image_shape=list(image.shape))
+		content = await run_in_threadpool(_render_preview, steps, image, width, height, max_size)
+		return Response(content=content, media_type="image/jpeg")
+	except OperationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error rendering preview: {str(e)}")
+
+@router.post("/image/{image_id}/intermediates/{name}/export")
+async def export_intermediate(
+	image_id: int,
+	name: str,
+	ticket: Ticket = Depends(processing_ticket),
+	current_user = Depends(get_current_user)
+):
+	"""Render a stored intermediate as a viewable JPEG, showing its channels as they are."""
+	try:
+		image_info = await _get_image_or_404(image_id, current_user)
+		array, metadata = _open_intermediate(image_info, name)
+		ticket.reserve(estimate_cost(array.shape[1], array.shape[0]))
+		base_name = os.path.splitext(image_info["filename"])[0]
+		processed_filename = f"{base_name}_{name[len(f'{image_id}_'):]}.jpg"
+		if not await run_in_threadpool(codec.write, os.path.join("uploads", processed_filename), array):
+			raise HTTPException(status_code=500, detail="Error encoding image")
+		return {
+			"success": True,
+			"processed_filename": processed_filename,
+			"processed_url": upload_url(processed_filename, current_user["id"]),
+			"message": f"{metadata['color_space']} intermediate exported",
+			"operation": "export_intermediate",
+			"parameters": {"intermediate": name, "color_space": metadata["color_space"]}
+		}
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error exporting intermediate: {str(e)}")
@@ -0,0 +1,301 @@
+# Operation registry: every image operation registers its parameter model, validation/output size,
+# cost and kernel once. The single, batch, pipeline and preview endpoints (operation_routes.py) and
+# the edit history replay are all driven by it, so they can't drift apart.
+from __future__ import annotations
+from datetime import datetime
+
+from lazy_imports import lazy_module
+import codec
+
+from models import (
+    QuickAdjustParams, HSVAdjustParams, RGBChannelParams, ColorSpaceParams, DrawingParams,
+    TransformParams, ResizeParams, ScaleParams, CropParams
+)
+from image_ops import (
+    OperationError, apply_grayscale, apply_quick_adjust, apply_hsv_adjust, apply_rgb_channel,
+    apply_draw, validate_quick_adjust, validate_hsv_adjust, validate_shape, rasterize_shapes
+)
+from geometry import GeometryPlan
+from admission import WORK_COPIES, WORK_COPIES_FLOAT, Ticket, estimate_cost
+
+cv2 = lazy_module("cv2")
+
+RGB_CHANNELS = ('red', 'green', 'blue')
+COLOR_SPACES = ('HSV', 'LAB', 'YUV', 'GRAY')
+
+class Operation:
+    """One registered operation.
+
+    Pixel operations have a kernel(image, params) -> image. Geometric operations instead add
+    themselves to a GeometryPlan with geometry(plan, params), so their output size is known before
+    decoding and previews can run the same plan on a downsized copy.
+    """
+
+    def __init__(self, name: str, path: str, describe, params_model=None, kernel=None, geometry=None,
+                 validate=None, preview_kernel=None, query=None, variants=None, work_copies: int = WORK_COPIES,
+                 supports_roi: bool = True, saves_to_gallery: bool = False, output_space=None, luma_only=None):
+        self.name = name
+        self.path = path  # URL segment of the single-image endpoint
+        self.describe = describe  # params -> (filename part, message)
+        self.params_model = params_model
+        self.kernel = kernel
+        self.geometry = geometry
+        self.validate = validate
+        # preview_kernel(image, params, scale) for pixel operations whose parameters are in pixels
+        self.preview_kernel = preview_kernel
+        # FastAPI dependency building the params from query parameters; defaults to the model's fields
+        self.query = query if query is not None else params_model
+        # params -> list of params, for requests that produce one output per variant (e.g. all channels)
+        self.variants = variants
+        self.work_copies = work_copies
+        self.supports_roi = supports_roi
+        # The single endpoint adds the result to the gallery (or replaces the image) instead of a processed file
+        self.saves_to_gallery = saves_to_gallery
+        # params -> color space of the result, for operations whose output isn't BGR; such results
+        # are stored as lossless intermediates (intermediates.py) instead of JPEG
+        self.output_space = output_space
+        # params -> whether the result is the image's luma alone, so decoding the gray channel is enough
+        self.luma_only = luma_only
+
+    def parse(self, parameters: dict):
+        if self.params_model is None:
+            return None
+        try:
+            return self.params_model(**parameters)
+        except Exception as e:
+            raise OperationError(f"Invalid parameters for {self.name}: {str(e)}")
+
+    def expand(self, params):
+        return self.variants(params) if self.variants is not None else [params]
+
+    def plan(self, params, width: int, height: int) -> GeometryPlan:
+        plan = GeometryPlan(width, height)
+        self.geometry(plan, params)
+        return plan
+
+    def output_size(self, params, width: int, height: int):
+        """Validate params against the input size without touching pixels; returns the output (width, height)."""
+        if self.geometry is not None:
+            plan = self.plan(params, width, height)
+            plan.interpolation_flag(_interpolation(params))
+            return plan.width, plan.height
+        if self.validate is not None:
+            self.validate(params)
+        return width, height
+
+    def apply(self, image, params):
+        if self.geometry is not None:
+            return self.plan(params, image.shape[1], image.shape[0]).execute(image, _interpolation(params))
+        return self.kernel(image, params)
+
+    def decode_options(self, params, width: int, height: int):
+        """What a whole-image application needs decoded: (luma only, decoder reduction 1/2/4/8)."""
+        if self.luma_only is not None and self.luma_only(params):
+            return True, 1
+        if self.geometry is not None:
+            return False, codec.reduction_for(*self.plan(params, width, height).scale_factors())
+        return False, 1
+
+    def _proxy_plan(self, image, params, width: int, height: int) -> GeometryPlan:
+        # Scale the downsized copy up to full-size coordinates before the operation, composed into one warp
+        plan = GeometryPlan(image.shape[1], image.shape[0]).resize(width, height)
+        self.geometry(plan, params)
+        return plan
+
+    def apply_decoded(self, image, params, width: int, height: int):
+        """Apply to an image decoded as decode_options() asked, from a file of width x height.
+
+        The result has the same size and layout as apply() on the full decode: gray decodes are the
+        luma result itself, stored as gray BGR like the kernels' output, and reduced decodes go
+        through a plan that starts at the full size.
+        """
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if self.geometry is not None and image.shape[:2] != (height, width):
+            return self._proxy_plan(image, params, width, height).execute(image, _interpolation(params))
+        return self.apply(image, params)
+
+    def preview(self, image, params, width: int, height: int):
+        """Apply to a downsized copy of an image whose full size is width x height."""
+        proxy_height, proxy_width = image.shape[:2]
+        if self.geometry is not None:
+            # Apply at full-size coordinates and scale back down, all in a single warp of the proxy
+            plan = self._proxy_plan(image, params, width, height)
+            factor = proxy_width / width
+            plan.resize(max(1, round(plan.width * factor)), max(1, round(plan.height * factor)))
+            return plan.execute(image, _interpolation(params))
+        if self.preview_kernel is not None:
+            return self.preview_kernel(image, params, proxy_width / width)
+        return self.kernel(image, params)
+
+def _interpolation(params):
+    return getattr(params, "interpolation", "linear")
+
+OPERATIONS = {}
+
+def register(operation: Operation):
+    OPERATIONS[operation.name] = operation
+    return operation
+
+def get_operation(name: str) -> Operation:
+    if name not in OPERATIONS:
+        raise OperationError(f"Operation must be one of: {list(OPERATIONS.keys())}")
+    return OPERATIONS[name]
+
+def parse_operation(name: str, parameters: dict):
+    """Validate an operation name and its parameters; returns (Operation, params model instance)."""
+    operation = get_operation(name)
+    return operation, operation.parse(parameters or {})
+
+def parse_steps(steps):
+    """Parse pipeline steps (EditRequest-like) into (Operation, params) pairs, one output image each."""
+    if not steps:
+        raise OperationError("No operations provided")
+    parsed = []
+    for step in steps:
+        operation, params = parse_operation(step.operation, step.parameters)
+        if len(operation.expand(params)) > 1:
+            raise OperationError(f"{operation.name} with these parameters produces several images")
+        parsed.append((operation, params))
+    return parsed
+
+def plan_steps(steps, width: int, height: int):
+    """Validate (operation, params) steps against the input size without decoding.
+
+    Returns the final output size, the cost of the most expensive step and the largest size reached.
+    """
+    peak_pixels = peak_memory = 0
+    largest = (width, height)
+    for operation, params in steps:
+        output_width, output_height = operation.output_size(params, width, height)
+        pixels, memory = estimate_cost(width, height, output_width, output_height, work_copies=operation.work_copies)
+        peak_pixels, peak_memory = max(peak_pixels, pixels), max(peak_memory, memory)
+        largest = max(largest, (output_width, output_height), key=max)
+        width, height = output_width, output_height
+    return (width, height), (peak_pixels, peak_memory), largest
+
+def admit_steps(ticket: Ticket, steps, width: int, height: int):
+    """Validate the steps and reserve their cost before decoding; returns the final output size."""
+    output_size, cost, largest = plan_steps(steps, width, height)
+    ticket.reserve(cost, largest if largest != (width, height) else None)
+    return output_size
+
+# Kernels and validation not covered by image_ops
+
+def _validate_rgb_channel(params: RGBChannelParams):
+    if params.channel not in RGB_CHANNELS:
+        raise OperationError("Channel must be 'red', 'green' or 'blue'")
+
+def _rgb_variants(params: RGBChannelParams):
+    if params.channel == 'all':
+        return [RGBChannelParams(channel=channel) for channel in RGB_CHANNELS]
+    return [params]
+
+def _validate_colorspace(params: ColorSpaceParams):
+    if params.target_space not in COLOR_SPACES:
+        raise OperationError(f"Target space must be one of: {list(COLOR_SPACES)}")
+
+def _apply_colorspace(image, params: ColorSpaceParams):
+    _validate_colorspace(params)
+    converted = cv2.cvtColor(image, getattr(cv2, f"COLOR_BGR2{params.target_space}"))
+    # Kernels keep the 3-channel layout, so grayscale results are stored as gray BGR
+    return cv2.cvtColor(converted, cv2.COLOR_GRAY2BGR) if converted.ndim == 2 else converted
+
+def _transform(plan: GeometryPlan, params: TransformParams):
+    if params.operation == "translate":
+        plan.translate(params.tx or 0, params.ty or 0)
+    elif params.operation == "rotate":
+        plan.rotate(params.angle or 0, params.center_x, params.center_y, params.expand)
+    else:
+        raise OperationError("Operation must be 'translate' or 'rotate'")
+
+def draw_query(
+    shape_type: str,
+    start_x: int,
+    start_y: int,
+    end_x: int = None,
+    end_y: int = None,
+    radius: int = None,
+    color_r: int = 255,
+    color_g: int = 255,
+    color_b: int = 255,
+    thickness: int = 2,
+    text: str = None,
+    font_size: float = 1.0,
+    font_style: str = "HERSHEY_SIMPLEX"
+) -> DrawingParams:
+    """Query parameters of the draw endpoint (flat coordinates, RGB color) as DrawingParams."""
+    return DrawingParams(
+        shape_type=shape_type,
+        start_point=(start_x, start_y),
+        end_point=(end_x, end_y) if end_x is not None and end_y is not None else None,
+        radius=radius,
+        color=(color_b, color_g, color_r),  # OpenCV uses BGR format
+        thickness=thickness,
+        text=text,
+        font_size=font_size,
+        font_style=font_style
+    )
+
+register(Operation(
+    "grayscale", "grayscale",
+    lambda p: ("grayscale", "Image converted to grayscale successfully"),
+    kernel=apply_grayscale, luma_only=lambda p: True
+))
+register(Operation(
+    "quick_adjust", "quick-adjust",
+    lambda p: (f"adjusted_b{p.brightness:.1f}_c{p.contrast:.1f}_s{p.saturation:.1f}_h{p.hue_shift}",
+               "Quick adjustments applied successfully"),
+    params_model=QuickAdjustParams, kernel=apply_quick_adjust, validate=validate_quick_adjust,
+    work_copies=WORK_COPIES_FLOAT
+))
+register(Operation(
+    "hsv_adjust", "hsv-adjust",
+    lambda p: (f"hsv_h{p.hue_shift}_s{p.saturation_scale:.1f}_v{p.value_scale:.1f}",
+               "HSV adjustment applied successfully"),
+    params_model=HSVAdjustParams, kernel=apply_hsv_adjust, validate=validate_hsv_adjust,
+    work_copies=WORK_COPIES_FLOAT
+))
+register(Operation(
+    "rgb_channel", "rgb-channel",
+    lambda p: ("all_channels", "All RGB channels extracted successfully") if p.channel == 'all'
+    else (f"{p.channel}_channel", f"{p.channel.capitalize()} channel extracted successfully"),
+    params_model=RGBChannelParams, kernel=apply_rgb_channel, validate=_validate_rgb_channel,
+    variants=_rgb_variants
+))
+register(Operation(
+    "colorspace", "colorspace",
+    lambda p: (p.target_space.lower(), f"Image converted to {p.target_space} color space successfully"),
+    params_model=ColorSpaceParams, kernel=_apply_colorspace, validate=_validate_colorspace,
+    output_space=lambda p: p.target_space, luma_only=lambda p: p.target_space == "GRAY"
+))
+register(Operation(
+    "draw", "draw",
+    lambda p: (f"draw_{p.shape_type}_{datetime.now().strftime('%H%M%S')}", f"{p.shape_type.capitalize()} drawn successfully"),
+    params_model=DrawingParams, kernel=apply_draw, validate=validate_shape, query=draw_query,
+    preview_kernel=lambda image, p, scale: rasterize_shapes(image, [p], scale),
+    supports_roi=False, saves_to_gallery=True
+))
+register(Operation(
+    "transform", "transform",
+    lambda p: (f"{p.operation}_{p.tx}_{p.ty}_{p.angle}" + ("_expand" if p.expand else ""),
+               f"Image {p.operation} applied successfully"),
+    params_model=TransformParams, geometry=_transform
+))
+register(Operation(
+    "resize", "resize",
+    lambda p: (f"resized_{p.width}x{p.height}_{p.interpolation}",
+               f"Image resized to {p.width}x{p.height} with {p.interpolation} interpolation"),
+    params_model=ResizeParams, geometry=lambda plan, p: plan.resize(p.width, p.height), supports_roi=False
+))
+register(Operation(
+    "scale", "scale",
+    lambda p: (f"scaled_{p.scale_x}x{p.scale_y}_{p.interpolation}",
+               f"Image scaled by {p.scale_x}x{p.scale_y} with {p.interpolation} interpolation"),
+    params_model=ScaleParams, geometry=lambda plan, p: plan.scale(p.scale_x, p.scale_y), supports_roi=False
+))
+register(Operation(
+    "crop", "crop",
+    lambda p: (f"cropped_{p.x}_{p.y}_{p.width}x{p.height}", f"Image cropped to {p.width}x{p.height} at position ({p.x}, {p.y})"),
+    params_model=CropParams, geometry=lambda plan, p: plan.crop(p.x, p.y, p.width, p.height), supports_roi=False
+))
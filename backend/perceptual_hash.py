@@ -0,0 +1,231 @@
+# Perceptual hashes (pHash, dHash) and a multi-index hash table for near-duplicate search
+from __future__ import annotations
+from functools import lru_cache
+from itertools import combinations
+
+from lazy_imports import lazy_module
+import codec
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+HASH_BITS = 64
+# Chunks of the multi-index: 16-bit chunk values keep the tables' buckets small for 100k+ hashes
+HASH_CHUNKS = 4
+CHUNK_BITS = HASH_BITS // HASH_CHUNKS
+MAX_PAIRS_PER_BATCH = 1 << 22
+
+def _to_signed(value: int) -> int:
+    # Hashes are stored in BIGINT columns
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return _to_signed(int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big"))
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(_to_unsigned(a) ^ _to_unsigned(b)).count("1")
+
+def _grayscale(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def dhash(gray: np.ndarray) -> int:
+    """Difference hash: sign of horizontal gradients on a 9x8 proxy."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+def phash(gray: np.ndarray) -> int:
+    """DCT hash: low 8x8 frequencies of a 32x32 proxy compared to their median."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    # Exclude the DC term from the median, it only carries the mean brightness
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+def compute_image_hashes(image: np.ndarray) -> dict:
+    gray = _grayscale(image)
+    return {"phash": phash(gray), "dhash": dhash(gray)}
+
+def decode_proxy(data: bytes, width: int = None, height: int = None, grayscale: bool = False):
+    """Decode a small proxy of the image bytes for hashing and features; returns None if undecodable."""
+    # Let the JPEG decoder downscale while keeping the proxy's smallest side at 64px or more
+    reduction = 1
+    if width and height:
+        reduction = codec.reduction_for(64 / min(width, height), 64 / min(width, height))
+    return codec.decode_bytes(data, grayscale, reduction)
+
+class MultiIndex:
+    """Multi-index hashing of 64-bit hashes for Hamming radius queries.
+
+    Each hash is split into HASH_CHUNKS chunks, each with its own table of chunk value -> items.
+    Two hashes within distance r differ by at most r // HASH_CHUNKS bits in one of their chunks
+    (pigeonhole), so a query only looks up the chunk values within that distance of its own chunks:
+    exact lookups up to r = HASH_CHUNKS - 1, a few hundred for the default threshold of 8. Only the
+    items found that way are compared in full, instead of a scan of the gallery.
+    """
+
+    def __init__(self):
+        self.values = {}  # item -> hash
+        self.tables = [{} for _ in range(HASH_CHUNKS)]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, item):
+        return item in self.values
+
+    def add(self, value: int, item):
+        self.remove(item)
+        self.values[item] = value
+        for table, chunk in zip(self.tables, _chunks(value)):
+            table.setdefault(chunk, set()).add(item)
+
+    def remove(self, item):
+        value = self.values.pop(item, None)
+        if value is None:
+            return
+        for table, chunk in zip(self.tables, _chunks(value)):
+            bucket = table[chunk]
+            bucket.discard(item)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value: int, radius: int):
+        """Return [(distance, item)] for all items within radius of value."""
+        masks = _flip_masks(radius // HASH_CHUNKS)
+        candidates = set()
+        for table, chunk in zip(self.tables, _chunks(value)):
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        results = []
+        for item in candidates:
+            distance = hamming_distance(value, self.values[item])
+            if distance <= radius:
+                results.append((distance, item))
+        return results
+
+def _chunks(value: int):
+    value = _to_unsigned(value)
+    mask = (1 << CHUNK_BITS) - 1
+    return [(value >> (index * CHUNK_BITS)) & mask for index in range(HASH_CHUNKS)]
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits: int):
+    """Every chunk-sized mask with at most the given number of bits set."""
+    return tuple(sum(1 << position for position in positions)
+                 for count in range(bits + 1) for positions in combinations(range(CHUNK_BITS), count))
+
+def _bit_counts(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+        return np.bitwise_count(values)
+    return np.unpackbits(np.ascontiguousarray(values).view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+def _pairs_within(hashes: np.ndarray, radius: int):
+    """Yield index arrays (sources, others), source < other, of the pairs of hashes within radius.
+
+    The multi-index lookup of MultiIndex.search done for all hashes at once: per chunk and flip
+    mask, every hash is matched against the bucket of its flipped chunk value.
+    """
+    masks = _flip_masks(radius // HASH_CHUNKS)
+    positions = np.arange(len(hashes))
+    for chunk_index in range(HASH_CHUNKS):
+        chunks = ((hashes >> np.uint64(chunk_index * CHUNK_BITS)) & np.uint64((1 << CHUNK_BITS) - 1)).astype(np.int64)
+        order = np.argsort(chunks, kind="stable")
+        bucket_sizes = np.bincount(chunks, minlength=1 << CHUNK_BITS)
+        bucket_starts = np.cumsum(bucket_sizes) - bucket_sizes
+        for mask in masks:
+            targets = chunks ^ mask
+            counts = bucket_sizes[targets]
+            cumulative = np.cumsum(counts)
+            if not len(cumulative) or cumulative[-1] == 0:
+                continue
+            # Bound the candidate arrays when buckets are large (many look-alike images)
+            splits = np.searchsorted(cumulative, np.arange(MAX_PAIRS_PER_BATCH, cumulative[-1], MAX_PAIRS_PER_BATCH))
+            for batch in np.split(positions, splits):
+                batch_counts = counts[batch]
+                sources = np.repeat(batch, batch_counts)
+                offsets = np.arange(len(sources)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+                others = order[np.repeat(bucket_starts[targets[batch]], batch_counts) + offsets]
+                keep = sources < others
+                sources, others = sources[keep], others[keep]
+                keep = _bit_counts(hashes[sources] ^ hashes[others]) <= radius
+                yield sources[keep], others[keep]
+
+class DuplicateClusters:
+    """Near-duplicate clusters of a MultiIndex: connected components of items within threshold.
+
+    Kept up to date as items are added to or removed from the index, so listing the clusters
+    doesn't search the whole gallery again. Call added() after adding an item to the index and
+    removed() after removing one.
+    """
+
+    def __init__(self, index: MultiIndex, threshold: int):
+        self.index = index
+        self.threshold = threshold
+        self._component = {}  # item -> component key
+        self._members = {}  # component key -> set of items
+        # The whole index is grouped at once with a vectorized join rather than a query per item
+        items = list(index.values)
+        hashes = np.array([_to_unsigned(index.values[item]) for item in items], dtype=np.uint64)
+        parent = list(range(len(items)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for sources, others in _pairs_within(hashes, threshold):
+            for a, b in zip(sources.tolist(), others.tolist()):
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+        for position, item in enumerate(items):
+            key = items[find(position)]
+            self._component[item] = key
+            self._members.setdefault(key, set()).add(item)
+
+    def _neighbors(self, item):
+        return [other for _, other in self.index.search(self.index.values[item], self.threshold) if other != item]
+
+    def added(self, item):
+        members = {item}
+        for other in self._neighbors(item):
+            key = self._component.get(other)
+            if key in self._members:
+                members |= self._members.pop(key)
+        for member in members:
+            self._component[member] = item
+        self._members[item] = members
+
+    def removed(self, item):
+        key = self._component.pop(item, None)
+        if key is None:
+            return
+        remaining = self._members.pop(key)
+        remaining.discard(item)
+        # The component may fall apart without the item: regroup its other members, whose
+        # neighbors are all within the same component
+        while remaining:
+            start = remaining.pop()
+            members, stack = {start}, [start]
+            while stack:
+                for other in self._neighbors(stack.pop()):
+                    if other in remaining:
+                        remaining.discard(other)
+                        members.add(other)
+                        stack.append(other)
+            for member in members:
+                self._component[member] = start
+            self._members[start] = members
+
+    def clusters(self):
+        """Clusters of more than one item, as sorted lists."""
+        return [sorted(members) for members in self._members.values() if len(members) > 1]
@@ -0,0 +1,291 @@
+# Opt-in request profiling: capture a profile for selected requests and keep it for download
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")  # Profiling by header is disabled when unset
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0.0 - 1.0
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")  # 'cprofile' or 'sample'
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # seconds
+PROFILE_HEADER = "x-profile-token"
+
+# Metadata of the request currently being profiled, filled in by the handlers
+_current_metadata: ContextVar[Optional[dict]] = ContextVar("profile_metadata", default=None)
+# Profiler of the request currently being profiled, which its threadpool calls report to
+_current_profiler: ContextVar = ContextVar("profiler", default=None)
+# cProfile can only profile one request at a time on the event loop thread
+_profile_in_progress = False
+
+def annotate_profile(**fields):
+    """Attach extra metadata (image size, parameters...) to the running profile, if any."""
+    metadata = _current_metadata.get()
+    if metadata is not None:
+        metadata.update(fields)
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """starlette.concurrency.run_in_threadpool that also profiles func when the request is profiled.
+
+    Handlers use this one, so decoding, processing and database calls moved off the event loop
+    still show up in their request's profile.
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+    return await _run_in_threadpool(profiler.run_worker, func, *args, **kwargs)
+
+def _header(scope, name: str):
+    for key, value in scope.get("headers", []):
+        if key.decode("latin-1").lower() == name:
+            return value.decode("latin-1")
+    return None
+
+def _should_profile(scope):
+    if PROFILE_ADMIN_TOKEN and _header(scope, PROFILE_HEADER) == PROFILE_ADMIN_TOKEN:
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+class _StackSampler:
+    """Statistical profiler: samples the stacks of the request's threads and counts folded stacks.
+
+    The event loop thread is sampled throughout, worker threads while they run the request's calls.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_ids = {thread_id}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def run_worker(self, func, *args, **kwargs):
+        thread_id = threading.get_ident()
+        with self._threads_lock:
+            self._thread_ids.add(thread_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._threads_lock:
+                self._thread_ids.discard(thread_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                thread_ids = list(self._thread_ids)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path: str):
+        # Folded stack format, readable by flamegraph.pl and speedscope
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class _ThreadProfiler:
+    """cProfile of the event loop thread plus one per threadpool call, merged when saved."""
+
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+
+    def enable(self):
+        self.main.enable()
+
+    def disable(self):
+        self.main.disable()
+
+    def run_worker(self, func, *args, **kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread from one profiler, so the main one already sees this call
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._workers_lock:
+                self._workers.append(profile)
+
+    def dump_stats(self, path: str):
+        stats = pstats.Stats(self.main)
+        with self._workers_lock:
+            workers = list(self._workers)
+        for profile in workers:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+def _with_header(send, name: bytes, value: bytes):
+    async def send_with_header(message):
+        if message["type"] == "http.response.start":
+            message["headers"] = list(message.get("headers", [])) + [(name, value)]
+        await send(message)
+    return send_with_header
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests selected by admin header or sampling.
+
+    Work on the event loop thread is captured throughout the request, and work the handlers
+    move to the threadpool through profiling.run_in_threadpool while it runs. The event loop
+    is shared, so its part of a profile also holds whatever other requests ran on it at their
+    await points; profile a quiet worker for a clean picture.
+
+    One request is profiled at a time. A request that asks for a profile by header while
+    another is being profiled is served unprofiled, with an X-Profile-Status: busy header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _profile_in_progress
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = _should_profile(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        if _profile_in_progress:
+            # Sampled requests are skipped silently; an admin asking explicitly is told why there is no profile
+            if trigger == "header":
+                send = _with_header(send, b"x-profile-status", b"busy")
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        metadata = {
+            "id": profile_id,
+            "trigger": trigger,
+            "mode": PROFILE_MODE,
+            "method": scope["method"],
+            "path": scope["path"],
+            "parameters": scope.get("query_string", b"").decode("latin-1"),
+            "request_size": _header(scope, "content-length"),
+            "started_at": datetime.now().isoformat(),
+        }
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                metadata["status_code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        if PROFILE_MODE == "sample":
+            profiler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        else:
+            profiler = _ThreadProfiler()
+        token = _current_metadata.set(metadata)
+        profiler_token = _current_profiler.set(profiler)
+        _profile_in_progress = True
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            _profile_in_progress = False
+            _current_metadata.reset(token)
+            _current_profiler.reset(profiler_token)
+            metadata["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            route = scope.get("route")
+            metadata["endpoint"] = getattr(route, "path", scope["path"])
+            metadata["path_params"] = scope.get("path_params", {})
+            # Serializing a profile takes long enough to stall other requests on the event loop
+            await _run_in_threadpool(_save_profile, profiler, metadata)
+
+def _profile_path(profile_id: str, extension: str):
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+
+def _save_profile(profiler, metadata: dict):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        extension = "folded" if isinstance(profiler, _StackSampler) else "prof"
+        metadata["file"] = os.path.basename(_profile_path(metadata["id"], extension))
+        profiler.dump_stats(_profile_path(metadata["id"], extension))
+        with open(_profile_path(metadata["id"], "json"), "w") as f:
+            json.dump(metadata, f, default=str)
+    except Exception:
+        logger.exception("Error saving profile %s", metadata["id"])
+
+# Download endpoints, protected by the same admin token
+router = APIRouter(prefix="/admin/profiles")
+
+def _require_admin(token: Optional[str]):
+    if not PROFILE_ADMIN_TOKEN or token != PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling access denied")
+
+def _load_metadata(profile_id: str):
+    # Profile ids are generated hex strings; reject anything else to avoid path traversal
+    if not profile_id.isalnum():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = _profile_path(profile_id, "json")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path) as f:
+        return json.load(f)
+
+@router.get("")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    _require_admin(x_profile_token)
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
+
+@router.get("/{profile_id}")
+async def download_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """Download the raw profile (.prof for snakeviz/flameprof, .folded for flamegraph.pl/speedscope)."""
+    _require_admin(x_profile_token)
+    metadata = _load_metadata(profile_id)
+    path = os.path.join(PROFILE_DIR, metadata["file"])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=metadata["file"], media_type="application/octet-stream")
+
+@router.get("/{profile_id}/metadata")
+async def get_profile_metadata(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    _require_admin(x_profile_token)
+    return _load_metadata(profile_id)
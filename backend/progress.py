@@ -0,0 +1,72 @@
+# In-process progress registry for long-running requests (archive export/import).
+# Clients poll GET /jobs/{job_id}; entries are kept for JOB_RETENTION_SECONDS after they finish.
+import re
+import threading
+import time
+import uuid
+
+JOB_RETENTION_SECONDS = 3600
+_JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+_jobs = {}
+_lock = threading.Lock()
+
+class JobConflictError(ValueError):
+    pass
+
+def _prune(now: float):
+    expired = [job_id for job_id, job in _jobs.items()
+               if job["finished_at"] is not None and now - job["finished_at"] > JOB_RETENTION_SECONDS]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def start_job(user_id: int, kind: str, total: int = None, job_id: str = None):
+    """Register a job and return its id; clients may choose the id to poll before the response arrives."""
+    if job_id is not None and not _JOB_ID_PATTERN.match(job_id):
+        raise JobConflictError("Job id must be 8-64 letters, digits, '-' or '_'")
+    job_id = job_id or uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        _prune(now)
+        if job_id in _jobs:
+            raise JobConflictError("Job id already in use")
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "user_id": user_id,
+            "kind": kind,
+            "status": "running",
+            "total": total,
+            "processed": 0,
+            "failed": 0,
+            "error": None,
+            "started_at": now,
+            "finished_at": None
+        }
+    return job_id
+
+def update_job(job_id: str, processed: int = 0, failed: int = 0, total: int = None):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["processed"] += processed
+        job["failed"] += failed
+        if total is not None:
+            job["total"] = total
+
+def finish_job(job_id: str, error: str = None, status: str = None):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["finished_at"] is not None:
+            return
+        job["status"] = status or ("failed" if error else "completed")
+        job["error"] = error
+        job["finished_at"] = time.time()
+
+def get_job(job_id: str, user_id: int):
+    """Return a snapshot of the job, or None if it is unknown or belongs to another user."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            return None
+        return {key: value for key, value in job.items() if key != "user_id"}
@@ -0,0 +1,56 @@
+# Region-of-interest support for processing endpoints: the operation runs on a NumPy view of the
+# region and the result is written back into the decoded image, without copying the full frame.
+#
+# OpenCV has no partial JPEG/PNG decode, so the image itself is still decoded in full; the
+# processing and compositing cost is proportional to the region's area.
+from __future__ import annotations
+from typing import Optional
+
+from lazy_imports import lazy_module
+from fastapi import HTTPException, Query
+
+from models import RegionOfInterest
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+def roi_query(
+    roi_x: Optional[int] = Query(None, description="Region of interest top-left x"),
+    roi_y: Optional[int] = Query(None, description="Region of interest top-left y"),
+    roi_width: Optional[int] = Query(None, description="Region of interest width"),
+    roi_height: Optional[int] = Query(None, description="Region of interest height")
+) -> Optional[RegionOfInterest]:
+    """FastAPI dependency reading an optional region of interest from the query string."""
+    values = (roi_x, roi_y, roi_width, roi_height)
+    if all(value is None for value in values):
+        return None
+    if any(value is None for value in values):
+        raise HTTPException(status_code=400, detail="roi_x, roi_y, roi_width and roi_height must be given together")
+    if roi_width <= 0 or roi_height <= 0:
+        raise HTTPException(status_code=400, detail="Region of interest width and height must be positive")
+    if roi_x < 0 or roi_y < 0:
+        raise HTTPException(status_code=400, detail="Region of interest coordinates must be non-negative")
+    return RegionOfInterest(x=roi_x, y=roi_y, width=roi_width, height=roi_height)
+
+def validate_roi(roi: Optional[RegionOfInterest], width: int, height: int):
+    if roi is not None and (roi.x + roi.width > width or roi.y + roi.height > height):
+        raise HTTPException(status_code=400, detail="Region of interest exceeds image boundaries")
+
+def roi_suffix(roi: Optional[RegionOfInterest]) -> str:
+    """Filename suffix keeping region edits apart from whole-image results."""
+    return "" if roi is None else f"_roi{roi.x}_{roi.y}_{roi.width}x{roi.height}"
+
+def apply_in_roi(image: np.ndarray, roi: Optional[RegionOfInterest], kernel) -> np.ndarray:
+    """Run kernel on the whole image, or only on the region and composite the result in place.
+
+    The image must be owned by the caller (e.g. freshly decoded), since it is modified.
+    """
+    if roi is None:
+        return kernel(image)
+    validate_roi(roi, image.shape[1], image.shape[0])
+    region = image[roi.y:roi.y + roi.height, roi.x:roi.x + roi.width]
+    result = kernel(region)
+    if result.ndim == 2 and image.ndim == 3:
+        result = cv2.cvtColor(result, cv2.COLOR_GRAY2BGR)
+    region[...] = result
+    return image
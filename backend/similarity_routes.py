@@ -0,0 +1,71 @@
+# Near-duplicate and visual similarity search endpoints
+from fastapi import APIRouter, Depends, HTTPException, Query
+from auth_routes import get_current_user
+from async_database import get_user_image
+from models import DuplicateClustersResponse, NearDuplicate, SimilarImage
+from perceptual_hash import HASH_BITS
+from duplicate_index import HASH_TYPES, find_duplicate_clusters, find_near_duplicates
+from image_features import unpack_features
+from feature_index import search_similar
+from profiling import run_in_threadpool
+
+router = APIRouter()
+
+def _validate(hash_type: str, threshold: int):
+	if hash_type not in HASH_TYPES:
+		raise HTTPException(status_code=400, detail=f"Hash type must be one of: {list(HASH_TYPES)}")
+	if not (0 <= threshold <= HASH_BITS // 4):
+		raise HTTPException(status_code=400, detail=f"Threshold must be between 0 and {HASH_BITS // 4}")
+
+@router.get("/images/duplicates", response_model=DuplicateClustersResponse)
+async def get_duplicate_clusters(
+	threshold: int = Query(8, description="Maximum Hamming distance between near-duplicates"),
+	hash_type: str = "phash",
+	current_user = Depends(get_current_user)
+):
+	"""Group the user's images into clusters of near-duplicates."""
+	_validate(hash_type, threshold)
+	clusters = await run_in_threadpool(find_duplicate_clusters, current_user["id"], hash_type, threshold)
+	return {
+		"hash_type": hash_type,
+		"threshold": threshold,
+		"clusters": clusters
+	}
+
+@router.get("/image/{image_id}/near-duplicates", response_model=list[NearDuplicate])
+async def get_near_duplicates(
+	image_id: int,
+	threshold: int = 8,
+	hash_type: str = "phash",
+	current_user = Depends(get_current_user)
+):
+	"""Find images in the user's gallery within threshold of the given image, closest first."""
+	_validate(hash_type, threshold)
+	image_info = await get_user_image(image_id, current_user["id"])
+	if not image_info:
+		raise HTTPException(status_code=404, detail="Image not found")
+	if image_info[hash_type] is None:
+		raise HTTPException(status_code=409, detail="Image has no perceptual hash yet, run backfill_metadata.py")
+	matches = await run_in_threadpool(find_near_duplicates, current_user["id"], hash_type, image_info[hash_type], threshold)
+	return [
+		{"id": other_id, "distance": distance}
+		for distance, other_id in sorted(matches)
+		if other_id != image_id
+	]
+
+@router.get("/image/{image_id}/similar", response_model=list[SimilarImage])
+async def get_similar_images(
+	image_id: int,
+	k: int = Query(10, ge=1, le=100, description="Number of similar images to return"),
+	current_user = Depends(get_current_user)
+):
+	"""Find the k images in the user's gallery with the most similar colors and texture."""
+	image_info = await get_user_image(image_id, current_user["id"])
+	if not image_info:
+		raise HTTPException(status_code=404, detail="Image not found")
+	if image_info["features"] is None:
+		raise HTTPException(status_code=409, detail="Image has no feature vector yet, run backfill_metadata.py")
+	matches = await run_in_threadpool(
+		search_similar, current_user["id"], unpack_features(image_info["features"]), k, exclude_id=image_id
+	)
+	return [{"id": other_id, "score": score} for other_id, score in matches]
@@ -0,0 +1,83 @@
+# Upload storage: files are stored once per distinct content and shared between images rows
+import os
+import uuid
+
+from database import create_image
+from image_blobs import add_blob_reference, register_blob, release_blob_reference
+from image_metadata import extract_metadata
+from perceptual_hash import decode_proxy
+from image_features import compute_descriptors
+
+UPLOAD_DIR = "uploads"
+
+class InvalidImageError(ValueError):
+    pass
+
+def backup_path(image_id: int):
+    """Where an image's original is kept before an in-place edit overwrites it."""
+    return os.path.join(UPLOAD_DIR, f"backup_{image_id}.jpg")
+
+def remove_file(file_path):
+    """Remove a file from disk if it exists; returns True when a file was removed."""
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+        return True
+    return False
+
+def write_file(contents: bytes, original_filename: str):
+    """Write the bytes under a new unique name in the upload directory; returns (filename, file_path)."""
+    file_extension = original_filename.split('.')[-1]
+    unique_filename = f"{uuid.uuid4()}.{file_extension}"
+    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    with open(file_path, "wb") as f:
+        f.write(contents)
+    return unique_filename, file_path
+
+def store_blob(contents: bytes, original_filename: str, content_hash: str):
+    """Store the bytes unless identical content is already stored; returns the blob's (filename, file_path)."""
+    blob = add_blob_reference(content_hash)
+    if blob is not None:
+        return blob["filename"], blob["file_path"]
+
+    unique_filename, file_path = write_file(contents, original_filename)
+    blob = register_blob(content_hash, unique_filename, file_path, len(contents))
+    if blob["file_path"] != file_path:
+        # A concurrent upload stored the same content first
+        remove_file(file_path)
+    return blob["filename"], blob["file_path"]
+
+def prepare_upload(contents: bytes):
+    """Validate image bytes and compute the metadata, hashes and features stored with the image."""
+    metadata = extract_metadata(contents)
+    if metadata is None:
+        raise InvalidImageError("Invalid image format")
+    proxy = decode_proxy(contents, metadata["width"], metadata["height"])
+    if proxy is not None:
+        metadata.update(compute_descriptors(proxy))
+    return metadata
+
+def store_upload(user_id: int, original_filename: str, contents: bytes, mime_type: str):
+    """Validate, deduplicate and record an uploaded image; returns the new image row values."""
+    metadata = prepare_upload(contents)
+    filename, file_path = store_blob(contents, original_filename, metadata["content_hash"])
+    try:
+        image_id = create_image(
+            user_id=user_id,
+            filename=filename,
+            original_filename=original_filename,
+            file_path=file_path,
+            file_size=len(contents),
+            mime_type=mime_type,
+            metadata=metadata
+        )
+    except Exception:
+        remove_file(release_blob_reference(metadata["content_hash"], file_path))
+        raise
+    return {
+        "id": image_id,
+        "filename": filename,
+        "original_filename": original_filename,
+        "file_size": len(contents),
+        "mime_type": mime_type,
+        **metadata
+    }
@@ -0,0 +1,95 @@
+import pytest
+from fastapi import HTTPException
+
+import admission
+from admission import Ticket, admit, estimate_cost
+
+USER = 1
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(admission, "USER_RATE_PER_SECOND", 5.0)
+    monkeypatch.setattr(admission, "USER_RATE_BURST", 3)
+    monkeypatch.setattr(admission, "USER_MAX_CONCURRENT", 2)
+    monkeypatch.setattr(admission, "PROCESSING_MEMORY_BUDGET", 1000)
+    monkeypatch.setattr(admission, "_user_buckets", {})
+    monkeypatch.setattr(admission, "_user_active", {})
+    monkeypatch.setattr(admission, "_memory_in_use", 0)
+
+def test_bucket_allows_a_burst_then_refills():
+    assert [admission._take_token(USER, 10.0) for _ in range(3)] == [0, 0, 0]
+    # Empty: the next token arrives after 1 / rate seconds
+    assert admission._take_token(USER, 10.0) == pytest.approx(0.2)
+    assert admission._take_token(USER, 10.1) == pytest.approx(0.1)
+    assert admission._take_token(USER, 10.3) == 0
+    # Idle time refills up to the burst, not beyond
+    assert [admission._take_token(USER, 100.0) for _ in range(3)] == [0, 0, 0]
+    assert admission._take_token(USER, 100.0) > 0
+
+def test_buckets_are_per_user():
+    for _ in range(3):
+        admission._take_token(USER, 0.0)
+    assert admission._take_token(USER, 0.0) > 0
+    assert admission._take_token(USER + 1, 0.0) == 0
+
+def test_admit_rejects_over_the_rate_with_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "USER_MAX_CONCURRENT", 10)
+    for _ in range(3):
+        admit(USER).release()
+    with pytest.raises(HTTPException) as error:
+        admit(USER)
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+def test_admit_limits_concurrent_requests():
+    first, second = admit(USER), admit(USER)
+    with pytest.raises(HTTPException) as error:
+        admit(USER)
+    assert error.value.status_code == 429
+    first.release()
+    admit(USER).release()
+    second.release()
+    assert admission._user_active == {}
+
+def test_reservations_share_the_memory_budget():
+    first, second = Ticket(USER), Ticket(USER + 1)
+    first.reserve((10, 600))
+    with pytest.raises(HTTPException) as error:
+        second.reserve((10, 600))
+    assert error.value.status_code == 429
+    assert admission.processing_load() == pytest.approx(0.6)
+    first.release_memory()
+    second.reserve((10, 600))
+    second.release_memory()
+    assert admission.processing_load() == 0
+
+def test_oversized_requests_are_rejected_outright():
+    with pytest.raises(HTTPException) as error:
+        Ticket(USER).reserve((10, 2000))
+    assert error.value.status_code == 413
+    with pytest.raises(HTTPException) as error:
+        Ticket(USER).reserve((10, 10), (admission.MAX_IMAGE_DIMENSION + 1, 10))
+    assert error.value.status_code == 413
+
+def test_take_over_moves_the_reservation():
+    session, loading = Ticket(USER), Ticket(USER)
+    session.reserve((10, 300))
+    loading.reserve((10, 500))
+    session.take_over(loading)
+    assert (session.reserved, loading.reserved) == (500, 0)
+    assert admission.processing_load() == pytest.approx(0.5)
+    session.release_memory()
+
+def test_estimate_cost():
+    assert estimate_cost(100, 50) == (5000, 100 * 50 * 3 + 5000 * 3 * 3)
+    assert estimate_cost(100, 50, 10, 10, work_copies=5) == (100, 100 * 50 * 3 + 100 * 3 * 7)
+
+def test_unlimited_rate_admission_still_takes_a_slot():
+    for _ in range(3):
+        admit(USER).release()
+    # The bucket is empty, but previews of an edit session only need a free slot
+    first, second = admit(USER, rate_limited=False), admit(USER, rate_limited=False)
+    with pytest.raises(HTTPException):
+        admit(USER, rate_limited=False)
+    first.release()
+    second.release()
@@ -0,0 +1,142 @@
+import os
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import pytest
+
+import codec
+import edit_history
+from admission import estimate_cost
+from edit_history import render_edits, rendered_size
+from operations import parse_operation
+
+STEPS = [
+    ("grayscale", {}),
+    ("crop", {"x": 10, "y": 5, "width": 40, "height": 30}),
+    ("quick_adjust", {"brightness": 1.2}),
+    ("resize", {"width": 20, "height": 16}),
+]
+
+class _Database:
+    """image_edits and edit_checkpoints rows of one image, answering the queries of edit_history."""
+
+    def __init__(self, edits):
+        self.edits = edits
+        self.checkpoints = {}
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.params = params
+        if "INSERT INTO edit_checkpoints" in sql:
+            self.checkpoints.setdefault(params[0], params[1])
+
+    def fetchall(self):
+        head = self.params[1]
+        return [{**edit, "checkpoint": self.checkpoints.get(edit["id"])} for edit in self.edits if edit["seq"] <= head]
+
+    def fetchone(self):
+        return next(edit for edit in self.edits if edit["seq"] == self.params[1])
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+def _edits(steps, width: int, height: int):
+    edits = []
+    for seq, (name, parameters) in enumerate(steps, start=1):
+        operation, params = parse_operation(name, parameters)
+        width, height = operation.output_size(params, width, height)
+        edits.append({"id": 100 + seq, "seq": seq, "operation": name,
+                      "params": params.dict() if params is not None else {},
+                      "output_width": width, "output_height": height})
+    return edits
+
+def _expected(image, steps):
+    for name, parameters in steps:
+        operation, params = parse_operation(name, parameters)
+        image = operation.apply(image, params)
+    return image
+
+class _Ticket:
+    def __init__(self):
+        self.reserved = []
+
+    def reserve(self, cost, output_size=None):
+        self.reserved.append(cost)
+
+@pytest.fixture
+def history(monkeypatch, tmp_path):
+    """An 80x60 upload with the edits of STEPS; written images are recorded as (path, pixels)."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    original = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    cv2.imwrite(os.path.join("uploads", "photo.png"), original)
+    database = _Database(_edits(STEPS, 80, 60))
+
+    @contextmanager
+    def get_db_connection():
+        yield database
+
+    written = []
+    write_image_atomic = edit_history._write_image_atomic
+
+    def record(path, image):
+        written.append((path, image.copy()))
+        write_image_atomic(path, image)
+
+    monkeypatch.setattr(edit_history, "get_db_connection", get_db_connection)
+    monkeypatch.setattr(edit_history, "_write_image_atomic", record)
+    monkeypatch.setattr(edit_history, "RENDER_DIR", str(tmp_path / "renders"))
+    monkeypatch.setattr(edit_history, "CHECKPOINT_INTERVAL", 10)
+    return original, database, written
+
+def _image_info(head: int):
+    return {"id": 7, "filename": "photo.png", "width": 80, "height": 60, "edit_head": head}
+
+def test_unedited_images_are_served_as_uploaded(history):
+    assert render_edits(_image_info(0)) == os.path.join("uploads", "photo.png")
+    assert rendered_size(_image_info(0)) == (80, 60)
+
+def test_replay_applies_the_edits_up_to_the_head(history, monkeypatch):
+    original, _, written = history
+    path = render_edits(_image_info(3))
+    assert path == os.path.join(edit_history.RENDER_DIR, "7_e103.jpg") and os.path.exists(path)
+    assert [written_path for written_path, _ in written] == [path]
+    assert np.array_equal(written[0][1], _expected(original, STEPS[:3]))
+    assert rendered_size(_image_info(3)) == (40, 30)
+
+    # The render is cached per head, so nothing is decoded or reserved again
+    monkeypatch.setattr(codec, "decode", lambda *args, **kwargs: pytest.fail("replayed again"))
+    ticket = _Ticket()
+    assert render_edits(_image_info(3), ticket) == path
+    assert ticket.reserved == []
+
+def test_replays_start_from_the_latest_checkpoint(history, monkeypatch):
+    original, database, written = history
+    monkeypatch.setattr(edit_history, "CHECKPOINT_INTERVAL", 2)
+    render_edits(_image_info(3))
+    assert list(database.checkpoints) == [102]
+    checkpoint = database.checkpoints[102]
+    # Checkpoints are lossless
+    assert np.array_equal(codec.decode_unchanged(checkpoint), _expected(original, STEPS[:2]))
+
+    # Later heads replay from the checkpoint, without the original
+    os.remove(os.path.join("uploads", "photo.png"))
+    written.clear()
+    path = render_edits(_image_info(4))
+    assert path.endswith("7_e104.jpg")
+    assert len(written) == 2
+    assert np.array_equal(written[-1][1], _expected(original, STEPS))
+    # Edit 4 is itself a checkpoint
+    assert list(database.checkpoints) == [102, 104]
+
+def test_replay_reserves_its_most_expensive_edit(history):
+    ticket = _Ticket()
+    render_edits(_image_info(4), ticket)
+    # The full-size edits cost more than the crop and resize
+    assert ticket.reserved == [estimate_cost(80, 60)]
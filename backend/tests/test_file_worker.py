@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+
+import pytest
+
+import file_worker
+from file_jobs import UNLINK, REMOVE_DERIVED_FILES
+from file_worker import process_file_jobs
+
+class _Cursor:
+    """Records the statements of a transaction; the claim query returns the given jobs."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((" ".join(sql.split()), params))
+
+    def fetchall(self):
+        return self.jobs
+
+    def close(self):
+        pass
+
+    def matching(self, prefix: str):
+        return [params for sql, params in self.statements if sql.startswith(prefix)]
+
+class _Connection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+@pytest.fixture
+def queue(monkeypatch):
+    """Run process_file_jobs against a fake database holding the jobs appended to the returned list."""
+    jobs = []
+    cursor = _Cursor(jobs)
+    connection = _Connection(cursor)
+
+    @contextmanager
+    def get_db_connection():
+        yield connection
+
+    monkeypatch.setattr(file_worker, "get_db_connection", get_db_connection)
+    monkeypatch.setattr(file_worker, "remove_thumbnails", lambda filename: None)
+    monkeypatch.setattr(file_worker, "FILE_JOB_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(file_worker, "FILE_JOB_RETRY_SECONDS", 5.0)
+    return jobs, cursor, connection
+
+def _job(job_id: int, kind: str, payload, attempts: int = 0):
+    return {"id": job_id, "kind": kind, "payload": payload, "attempts": attempts}
+
+def test_done_jobs_are_deleted(queue, tmp_path):
+    jobs, cursor, connection = queue
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"jpeg")
+    # A file already removed by an interrupted attempt doesn't fail the job
+    jobs.append(_job(1, UNLINK, {"paths": [str(path), str(tmp_path / "gone.jpg")]}))
+    assert process_file_jobs() == 1
+    assert not path.exists()
+    assert cursor.matching("DELETE FROM file_jobs WHERE id = ANY") == [([1],)]
+    assert cursor.matching("UPDATE file_jobs") == []
+    assert connection.committed
+
+def test_failed_jobs_are_retried_with_backoff(queue, monkeypatch):
+    jobs, cursor, _ = queue
+
+    def fail(payload):
+        raise OSError("disk busy")
+
+    monkeypatch.setitem(file_worker.FILE_JOB_HANDLERS, REMOVE_DERIVED_FILES, fail)
+    jobs.extend([_job(1, REMOVE_DERIVED_FILES, {"image_ids": [7]}),
+                 _job(2, REMOVE_DERIVED_FILES, {"image_ids": [8]}, attempts=1)])
+    assert process_file_jobs() == 2
+    # attempts, last error, delay in seconds (doubling per attempt), id
+    assert cursor.matching("UPDATE file_jobs") == [(1, "disk busy", 5.0, 1), (2, "disk busy", 10.0, 2)]
+    assert cursor.matching("DELETE FROM file_jobs WHERE id = ANY") == []
+
+def test_jobs_are_dead_lettered_after_the_last_attempt(queue):
+    jobs, cursor, _ = queue
+    jobs.extend([_job(1, "resize_everything", {"paths": ["a"]}, attempts=2),
+                 _job(2, UNLINK, {"paths": []})])
+    assert process_file_jobs() == 2
+    dead = cursor.matching("WITH dead AS")
+    assert len(dead) == 1
+    job_id, attempts, error = dead[0]
+    assert (job_id, attempts) == (1, 3)
+    assert "Unknown file job kind" in error
+    # The other job of the batch still completes
+    assert cursor.matching("DELETE FROM file_jobs WHERE id = ANY") == [([2],)]
+
+def test_empty_queue(queue):
+    _, cursor, connection = queue
+    assert process_file_jobs() == 0
+    assert cursor.matching("DELETE") == []
+    assert connection.committed
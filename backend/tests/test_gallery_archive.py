@@ -0,0 +1,117 @@
+import hashlib
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+import gallery_archive
+from gallery_archive import import_archive, stream_archive
+from progress import get_job, start_job
+from storage import InvalidImageError
+
+USER = 1
+
+@pytest.fixture
+def uploads(monkeypatch, tmp_path):
+    """Work in a temporary directory; images are any bytes starting with IMG, stored batches are recorded."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    batches = []
+
+    def prepare_upload(contents: bytes):
+        if not contents.startswith(b"IMG"):
+            raise InvalidImageError("Invalid image format")
+        return {"content_hash": hashlib.sha256(contents).hexdigest()}
+
+    def insert_batch(user_id: int, batch):
+        batches.append([dict(item) for item in batch])
+        first_id = sum(len(stored) for stored in batches[:-1]) + 1
+        return list(range(first_id, first_id + len(batch)))
+
+    monkeypatch.setattr(gallery_archive, "prepare_upload", prepare_upload)
+    monkeypatch.setattr(gallery_archive, "_insert_batch", insert_batch)
+    return batches
+
+def _image(tmp_path, image_id: int, name: str, contents: bytes):
+    path = tmp_path / f"stored_{image_id}"
+    path.write_bytes(contents)
+    return {"id": image_id, "original_filename": name, "file_path": str(path), "uploaded_at": datetime(2024, 5, 1, 12, 30)}
+
+def _zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, contents in entries:
+            archive.writestr(name, contents)
+    buffer.seek(0)
+    return buffer
+
+def test_export_then_import(uploads, tmp_path):
+    images = [
+        _image(tmp_path, 1, "beach.jpg", b"IMG beach" * 1000),
+        _image(tmp_path, 2, "beach.jpg", b"IMG other beach"),
+        _image(tmp_path, 3, "scan.bmp", b"IMG scan" * 1000),
+        {**_image(tmp_path, 4, "gone.jpg", b"IMG"), "file_path": str(tmp_path / "missing")},
+    ]
+    job_id = start_job(USER, "export", len(images))
+    exported = b"".join(stream_archive(images, job_id))
+    assert get_job(job_id, USER)["status"] == "completed"
+    assert (get_job(job_id, USER)["processed"], get_job(job_id, USER)["failed"]) == (3, 1)
+
+    with zipfile.ZipFile(io.BytesIO(exported)) as archive:
+        assert archive.namelist() == ["beach.jpg", "beach (1).jpg", "scan.bmp"]
+        # JPEGs are already compressed, other formats are deflated
+        assert [info.compress_type for info in archive.infolist()] == [zipfile.ZIP_STORED, zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]
+        assert archive.infolist()[0].date_time == (2024, 5, 1, 12, 30, 0)
+
+    job_id = start_job(USER, "import")
+    image_ids, errors = import_archive(USER, io.BytesIO(exported), job_id)
+    assert image_ids == [1, 2, 3] and errors == []
+    imported = uploads[0]
+    assert [item["original_filename"] for item in imported] == ["beach.jpg", "beach (1).jpg", "scan.bmp"]
+    for item, image in zip(imported, images):
+        assert Path(item["file_path"]).read_bytes() == Path(image["file_path"]).read_bytes()
+    assert imported[2]["mime_type"] == "image/bmp"
+    assert get_job(job_id, USER)["processed"] == 3
+
+def test_duplicates_within_a_batch_share_one_file(uploads):
+    image_ids, errors = import_archive(USER, _zip([("a.jpg", b"IMG same"), ("b.jpg", b"IMG same")]), start_job(USER, "import"))
+    assert len(image_ids) == 2
+    first, second = uploads[0]
+    assert first["file_path"] is not None
+    assert second["file_path"] is None
+    assert first["metadata"]["content_hash"] == second["metadata"]["content_hash"]
+
+def test_invalid_oversized_and_hidden_entries(uploads, monkeypatch):
+    monkeypatch.setattr(gallery_archive, "MAX_ENTRY_BYTES", 20)
+    archive = _zip([
+        ("photos/ok.jpg", b"IMG ok"),
+        ("photos/huge.jpg", b"IMG" + b"x" * 100),
+        ("notes.txt", b"not an image"),
+        ("__MACOSX/photos/._ok.jpg", b"IMG resource fork"),
+        ("photos/.hidden.jpg", b"IMG hidden"),
+    ])
+    job_id = start_job(USER, "import")
+    image_ids, errors = import_archive(USER, archive, job_id)
+    assert image_ids == [1]
+    assert uploads[0][0]["original_filename"] == "ok.jpg"
+    assert errors == [
+        {"filename": "photos/huge.jpg", "error": "Entry exceeds the maximum image size"},
+        {"filename": "notes.txt", "error": "Invalid image format"},
+    ]
+    job = get_job(job_id, USER)
+    assert (job["total"], job["processed"], job["failed"]) == (3, 1, 2)
+
+def test_imports_are_inserted_in_batches(uploads, monkeypatch):
+    monkeypatch.setattr(gallery_archive, "IMPORT_BATCH_SIZE", 2)
+    archive = _zip([(f"{index}.png", f"IMG {index}".encode()) for index in range(5)])
+    image_ids, _ = import_archive(USER, archive, start_job(USER, "import"))
+    assert image_ids == [1, 2, 3, 4, 5]
+    assert [len(batch) for batch in uploads] == [2, 2, 1]
+
+def test_corrupt_archive_fails_the_job(uploads):
+    job_id = start_job(USER, "import")
+    with pytest.raises(zipfile.BadZipFile):
+        import_archive(USER, io.BytesIO(b"not a zip"), job_id)
+    assert get_job(job_id, USER)["status"] == "failed"
@@ -0,0 +1,103 @@
+import base64
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+import gallery_search
+from gallery_search import (InvalidCursorError, build_search_query, decode_cursor, encode_cursor,
+                            search_user_images)
+
+USER = 1
+UPLOADED = datetime(2024, 5, 1, 12, 30)
+
+def _row(image_id: int, **values):
+    return {"id": image_id, "uploaded_at": UPLOADED, "file_size": 1000, "original_filename": "photo.jpg", **values}
+
+@pytest.mark.parametrize("sort, value", [
+    ("uploaded_at", UPLOADED),
+    ("file_size", 123456),
+    ("original_filename", "holiday 2024.jpg"),
+])
+@pytest.mark.parametrize("descending", [True, False])
+def test_cursor_round_trip(sort, value, descending):
+    cursor = encode_cursor(_row(42, **{sort: value}), sort, descending)
+    assert decode_cursor(cursor, sort, descending) == (value, 42)
+
+def test_cursor_of_another_order_is_rejected():
+    cursor = encode_cursor(_row(42), "uploaded_at", True)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "uploaded_at", False)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "file_size", True)
+
+def _encoded(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    _encoded(["uploaded_at", True, "2024-05-01"]),
+    _encoded(["uploaded_at", True, "yesterday", 42]),
+    _encoded(["uploaded_at", True, "2024-05-01T12:30:00", "forty-two"]),
+    _encoded({"sort": "uploaded_at"}),
+])
+def test_invalid_cursors(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "uploaded_at", True)
+
+def test_filename_wildcards_are_escaped():
+    sql, params = build_search_query(USER, {"q": "50%_off\\"})
+    assert "original_filename ILIKE %s" in sql
+    assert params == [USER, "%50\\%\\_off\\\\%", 50]
+
+def test_filters_and_keyset_condition():
+    filters = {"mime_types": ["image/png"], "min_size": 0, "max_width": 800, "uploaded_before": None}
+    sql, params = build_search_query(USER, filters, "file_size", False, after=(1000, 42), limit=10)
+    assert "mime_type = ANY(%s)" in sql and "file_size >= %s" in sql and "width <= %s" in sql
+    # Unset filters add no condition, a zero minimum does
+    assert "uploaded_at <" not in sql
+    assert "(file_size, id) > (%s, %s)" in sql
+    assert sql.endswith("ORDER BY file_size ASC, id ASC LIMIT %s")
+    assert params == [USER, ["image/png"], 0, 800, 1000, 42, 10]
+    with pytest.raises(ValueError):
+        build_search_query(USER, {}, "width")
+
+def test_pages_follow_each_other(monkeypatch):
+    gallery = [(image_id, f"{image_id}.jpg", f"photo {image_id}.jpg", 1000, "image/jpeg",
+                UPLOADED - timedelta(minutes=image_id), 640, 480) for image_id in range(1, 6)]
+    queries = []
+
+    class Cursor:
+        def execute(self, sql, params):
+            queries.append(params)
+            self.params = params
+
+        def fetchall(self):
+            # Newest first; the keyset condition continues after (uploaded_at, id)
+            after, limit = self.params[1:-1], self.params[-1]
+            rows = [row for row in gallery if not after or (row[5], row[0]) < tuple(after)]
+            return rows[:limit]
+
+        def close(self):
+            pass
+
+    class Connection:
+        def cursor(self, cursor_factory=None):
+            return Cursor()
+
+    @contextmanager
+    def get_db_connection():
+        yield Connection()
+
+    monkeypatch.setattr(gallery_search, "get_db_connection", get_db_connection)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = search_user_images(USER, {}, cursor=cursor, limit=2)
+        seen.extend(row["id"] for row in rows)
+        if cursor is None:
+            break
+    assert seen == [1, 2, 3, 4, 5]
+    # Each page asks for one row more than it returns
+    assert [params[-1] for params in queries] == [3, 3, 3]
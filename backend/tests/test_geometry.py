@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+import pytest
+
+from geometry import GeometryPlan, build_plan
+from image_ops import OperationError
+from models import GeometryOperation
+
+def _image(width: int = 64, height: int = 48):
+    return np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+def test_crop_is_a_view():
+    image = _image()
+    result = GeometryPlan(64, 48).crop(8, 4, 32, 24).execute(image)
+    assert np.array_equal(result, image[4:28, 8:40])
+    assert np.shares_memory(result, image)
+
+def test_crop_then_downscale_is_one_area_resize():
+    image = _image()
+    plan = GeometryPlan(64, 48).crop(8, 4, 32, 24).scale(0.5, 0.5)
+    assert (plan.width, plan.height) == (16, 12)
+    assert plan.scale_factors() == pytest.approx((0.5, 0.5))
+    expected = cv2.resize(image[4:28, 8:40], (16, 12), interpolation=cv2.INTER_AREA)
+    assert np.array_equal(plan.execute(image), expected)
+
+def test_translate_fills_with_black():
+    image = _image()
+    result = GeometryPlan(64, 48).translate(10, 5).execute(image)
+    assert result.shape == image.shape
+    assert np.array_equal(result[5:, 10:], image[:-5, :-10])
+    assert not result[:5].any() and not result[:, :10].any()
+
+def test_rotate_expand_quarter_turn():
+    image = _image()
+    plan = GeometryPlan(64, 48).rotate(90, expand=True)
+    assert (plan.width, plan.height) == (48, 64)
+    assert np.array_equal(plan.execute(image, "nearest"), np.rot90(image))
+
+def test_build_plan_composes_operations():
+    operations = [
+        GeometryOperation(type="crop", x=10, y=10, width=200, height=100),
+        GeometryOperation(type="scale", scale_x=0.5, scale_y=0.5),
+        GeometryOperation(type="rotate", angle=30, expand=True),
+        GeometryOperation(type="translate", tx=3, ty=-2),
+    ]
+    plan = build_plan(400, 300, operations)
+    assert plan.execute(np.zeros((300, 400, 3), np.uint8)).shape == (plan.height, plan.width, 3)
+    assert plan.scale_factors() == pytest.approx((0.5, 0.5))
+
+def test_build_plan_from_a_reduced_decode():
+    operations = [GeometryOperation(type="resize", width=100, height=75)]
+    full = build_plan(800, 600, operations)
+    reduced = build_plan(800, 600, operations, (200, 150))
+    assert (reduced.width, reduced.height) == (full.width, full.height)
+    # The reduced decode is only shrunk by the remaining factor
+    assert reduced.scale_factors() == pytest.approx((0.5, 0.5))
+    assert reduced.execute(np.zeros((150, 200, 3), np.uint8)).shape == (75, 100, 3)
+
+@pytest.mark.parametrize("operation", [
+    GeometryOperation(type="crop", x=50, y=0, width=20, height=10),
+    GeometryOperation(type="crop", x=-1, y=0, width=10, height=10),
+    GeometryOperation(type="resize", width=10),
+    GeometryOperation(type="scale", scale_x=0, scale_y=1),
+    GeometryOperation(type="shear"),
+])
+def test_invalid_operations(operation):
+    with pytest.raises(OperationError):
+        build_plan(64, 48, [operation])
+
+def test_interpolation_flags():
+    assert GeometryPlan(64, 48).scale(0.5, 0.5).interpolation_flag("auto") == cv2.INTER_AREA
+    assert GeometryPlan(64, 48).scale(2, 2).interpolation_flag("auto") == cv2.INTER_LINEAR
+    assert GeometryPlan(64, 48).interpolation_flag("lanczos") == cv2.INTER_LANCZOS4
+    with pytest.raises(OperationError):
+        GeometryPlan(64, 48).interpolation_flag("bicubic")
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import health
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    """A healthy worker on the sync database pool; the returned dict counts pings and can make them fail."""
+    state = {"pings": 0, "error": None, "delay": 0}
+
+    def ping():
+        state["pings"] += 1
+        time.sleep(state["delay"])
+        if state["error"]:
+            raise state["error"]
+
+    async def no_pool():
+        return None
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    monkeypatch.setattr(health, "get_pool", no_pool)
+    monkeypatch.setattr(health, "_ping_sync", ping)
+    monkeypatch.setattr(health, "processing_load", lambda: 0.0)
+    monkeypatch.setattr(health, "READINESS_MIN_FREE_DISK_MB", 0)
+    monkeypatch.setattr(health, "READINESS_CACHE_SECONDS", 60.0)
+    monkeypatch.setattr(health, "_cached", None)
+    return state
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(health.router)
+    with TestClient(app) as client:
+        yield client
+
+def test_liveness_touches_nothing(client, database):
+    database["error"] = RuntimeError("database down")
+    assert client.get("/health/live").status_code == 200
+    assert database["pings"] == 0
+
+def test_ready(client, database):
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert all(check["ok"] for check in body["checks"].values())
+    assert set(body["checks"]) == {"database", "disk", "threadpool", "processing"}
+
+def test_database_failure_is_not_ready(client, database):
+    database["error"] = RuntimeError("connection refused")
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["database"] == {"ok": False, "error": "connection refused"}
+
+def test_slow_database_times_out(client, database, monkeypatch):
+    monkeypatch.setattr(health, "READINESS_DB_TIMEOUT", 0.05)
+    database["delay"] = 0.3
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["database"]["error"].startswith("No answer within")
+
+def test_processing_saturation_is_not_ready(client, database, monkeypatch):
+    monkeypatch.setattr(health, "processing_load", lambda: 0.95)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["processing"]["ok"] is False
+    assert response.json()["checks"]["database"]["ok"] is True
+
+def test_results_are_cached(client, database, monkeypatch):
+    assert client.get("/health/ready").status_code == 200
+    database["error"] = RuntimeError("database down")
+    # Within the cache interval the previous result is served without a new ping
+    assert client.get("/health/ready").status_code == 200
+    assert database["pings"] == 1
+    monkeypatch.setattr(health, "_cached", (time.monotonic() - 1, health._cached[1]))
+    assert client.get("/health/ready").status_code == 503
+    assert database["pings"] == 2
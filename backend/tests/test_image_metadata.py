@@ -0,0 +1,66 @@
+import hashlib
+import struct
+
+from image_metadata import extract_metadata, probe_header, read_file_metadata
+
+def _jpeg(width, height, components=3, orientation=None):
+    data = b"\xff\xd8"
+    if orientation is not None:
+        # Little-endian TIFF header with a one-entry IFD holding the orientation tag
+        tiff = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 1)
+        tiff += struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack("<I", 0)
+        exif = b"Exif\x00\x00" + tiff
+        data += b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+    frame = struct.pack(">BHHB", 8, height, width, components) + b"\x01\x11\x00" * components
+    data += b"\xff\xc0" + struct.pack(">H", len(frame) + 2) + frame
+    return data + b"\xff\xda\x00\x02" + b"\x00" * 16 + b"\xff\xd9"
+
+def _png(width, height, color_type=2):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + b"\x00" * 4
+
+def test_jpeg_frame_header():
+    assert probe_header(_jpeg(640, 480)) == (640, 480, 3, 1)
+    assert probe_header(_jpeg(640, 480, components=1)) == (640, 480, 1, 1)
+
+def test_jpeg_exif_rotation_swaps_displayed_size():
+    assert probe_header(_jpeg(640, 480, orientation=6)) == (640, 480, 3, 6)
+    metadata = extract_metadata(_jpeg(640, 480, orientation=6), header_only=True)
+    assert (metadata["width"], metadata["height"], metadata["orientation"]) == (480, 640, 6)
+    metadata = extract_metadata(_jpeg(640, 480, orientation=3), header_only=True)
+    assert (metadata["width"], metadata["height"]) == (640, 480)
+
+def test_truncated_jpeg():
+    assert probe_header(_jpeg(640, 480)[:8]) is None
+    assert probe_header(b"\xff\xd8\xff\xda\x00\x02") is None
+
+def test_png():
+    assert probe_header(_png(800, 600)) == (800, 600, 3, 1)
+    assert probe_header(_png(800, 600, color_type=6)) == (800, 600, 4, 1)
+    assert probe_header(_png(800, 600, color_type=0)) == (800, 600, 1, 1)
+
+def test_gif():
+    assert probe_header(b"GIF89a" + struct.pack("<HH", 320, 200) + b"\x00" * 4) == (320, 200, 3, 1)
+
+def test_bmp():
+    header = b"BM" + b"\x00" * 12 + struct.pack("<IiiHH", 40, 100, -50, 1, 32)
+    assert probe_header(header) == (100, 50, 4, 1)
+
+def test_webp_extended():
+    chunk = b"VP8X" + struct.pack("<I", 10) + bytes([0x10, 0, 0, 0])
+    chunk += (1919).to_bytes(3, "little") + (1079).to_bytes(3, "little")
+    data = b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+    assert probe_header(data) == (1920, 1080, 4, 1)
+
+def test_unknown_format():
+    assert probe_header(b"not an image at all") is None
+    assert extract_metadata(b"not an image at all", header_only=True) is None
+
+def test_read_file_metadata(tmp_path):
+    data = _png(32, 16)
+    path = tmp_path / "image.png"
+    path.write_bytes(data)
+    assert read_file_metadata(str(path), include_hash=False) == {
+        "width": 32, "height": 16, "channels": 3, "orientation": 1, "content_hash": None
+    }
+    assert read_file_metadata(str(path))["content_hash"] == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+import pytest
+
+import intermediates
+from edit_history import append_edit
+from image_ops import OperationError
+from intermediates import as_working_image, load_intermediate, remove_intermediates, save_intermediate
+from models import RegionOfInterest
+
+IMAGE_ID = 7
+
+@pytest.fixture(autouse=True)
+def intermediate_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(intermediates, "INTERMEDIATE_DIR", str(tmp_path))
+    return tmp_path
+
+def _image():
+    return np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+
+def test_round_trip_is_lossless_and_read_only():
+    hsv = cv2.cvtColor(_image(), cv2.COLOR_BGR2HSV)
+    name = save_intermediate(IMAGE_ID, "hsv", hsv, "HSV")
+    assert name == f"{IMAGE_ID}_hsv"
+    array, metadata = load_intermediate(IMAGE_ID, name)
+    assert np.array_equal(array, hsv)
+    assert not array.flags.writeable
+    assert metadata == {"image_id": IMAGE_ID, "color_space": "HSV", "channels": ["H", "S", "V"],
+                        "shape": [60, 80, 3], "dtype": "uint8", "roi": None}
+
+def test_whole_gray_images_keep_one_channel():
+    gray = cv2.cvtColor(cv2.cvtColor(_image(), cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+    array, metadata = load_intermediate(IMAGE_ID, save_intermediate(IMAGE_ID, "gray", gray, "GRAY"))
+    assert array.shape == (60, 80) and metadata["channels"] == ["Y"]
+    assert np.array_equal(as_working_image(array), gray)
+    # Only the region is gray, so the other pixels keep their three channels
+    roi = RegionOfInterest(x=0, y=0, width=10, height=10)
+    array, metadata = load_intermediate(IMAGE_ID, save_intermediate(IMAGE_ID, "gray_roi", gray, "GRAY", roi))
+    assert array.shape == (60, 80, 3)
+    assert metadata["roi"] == roi.dict()
+
+@pytest.mark.parametrize("name", [f"{IMAGE_ID + 1}_hsv", "../7_hsv", f"{IMAGE_ID}_../hsv", f"{IMAGE_ID}_missing"])
+def test_other_images_and_unknown_names_are_not_loaded(name):
+    save_intermediate(IMAGE_ID + 1, "hsv", _image(), "HSV")
+    save_intermediate(IMAGE_ID, "hsv", _image(), "HSV")
+    assert load_intermediate(IMAGE_ID, name) is None
+
+def test_remove_intermediates_of_one_image(intermediate_dir):
+    save_intermediate(IMAGE_ID, "lab", _image(), "LAB")
+    save_intermediate(IMAGE_ID + 10, "lab", _image(), "LAB")
+    remove_intermediates(IMAGE_ID)
+    assert sorted(path.name for path in intermediate_dir.iterdir()) == [f"{IMAGE_ID + 10}_lab.json", f"{IMAGE_ID + 10}_lab.npy"]
+
+@pytest.mark.parametrize("target_space", ["HSV", "LAB", "YUV"])
+def test_non_bgr_results_cannot_be_recorded_as_edits(target_space):
+    # Rejected before the database is touched: later edits would read the channels as BGR
+    image_info = {"id": IMAGE_ID, "filename": "photo.jpg", "width": 80, "height": 60, "edit_head": 0}
+    with pytest.raises(OperationError, match="can't be recorded as an edit"):
+        append_edit(image_info, "colorspace", {"target_space": target_space})
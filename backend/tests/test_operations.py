@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+import pytest
+
+from image_ops import OperationError
+from models import EditRequest
+from operations import OPERATIONS, get_operation, parse_operation, parse_steps, plan_steps
+
+def _image(width: int = 80, height: int = 60):
+    return np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+def test_every_operation_is_registered():
+    assert set(OPERATIONS) == {
+        "grayscale", "quick_adjust", "hsv_adjust", "rgb_channel", "colorspace", "draw",
+        "transform", "resize", "scale", "crop"
+    }
+    for name, operation in OPERATIONS.items():
+        assert operation.name == name
+        assert (operation.kernel is None) != (operation.geometry is None)
+
+def test_unknown_operation_and_invalid_parameters():
+    with pytest.raises(OperationError):
+        get_operation("sharpen")
+    with pytest.raises(OperationError):
+        parse_operation("resize", {"width": 10})
+
+@pytest.mark.parametrize("name, parameters", [
+    ("quick_adjust", {"brightness": 5.0}),
+    ("rgb_channel", {"channel": "alpha"}),
+    ("colorspace", {"target_space": "CMYK"}),
+    ("crop", {"x": 50, "y": 0, "width": 40, "height": 10}),
+    ("scale", {"scale_x": 0}),
+])
+def test_validation_without_pixels(name, parameters):
+    operation, params = parse_operation(name, parameters)
+    with pytest.raises(OperationError):
+        operation.output_size(params, 80, 60)
+
+def test_output_sizes():
+    operation, params = parse_operation("resize", {"width": 40, "height": 20})
+    assert operation.output_size(params, 80, 60) == (40, 20)
+    operation, params = parse_operation("quick_adjust", {"brightness": 1.2})
+    assert operation.output_size(params, 80, 60) == (80, 60)
+    operation, params = parse_operation("transform", {"operation": "rotate", "angle": 90, "expand": True})
+    assert operation.output_size(params, 80, 60) == (60, 80)
+
+def test_variants_and_pipeline_steps():
+    operation, params = parse_operation("rgb_channel", {"channel": "all"})
+    assert [variant.channel for variant in operation.expand(params)] == ["red", "green", "blue"]
+    with pytest.raises(OperationError):
+        parse_steps([EditRequest(operation="rgb_channel", parameters={"channel": "all"})])
+    with pytest.raises(OperationError):
+        parse_steps([])
+
+def test_plan_steps():
+    steps = parse_steps([
+        EditRequest(operation="crop", parameters={"x": 0, "y": 0, "width": 200, "height": 100}),
+        EditRequest(operation="resize", parameters={"width": 600, "height": 300}),
+        EditRequest(operation="grayscale"),
+    ])
+    output_size, (pixels, _), largest = plan_steps(steps, 400, 300)
+    assert output_size == (600, 300)
+    assert pixels == 600 * 300
+    assert largest == (600, 300)
+
+def test_decode_options():
+    assert get_operation("grayscale").decode_options(None, 4000, 3000) == (True, 1)
+    operation, params = parse_operation("colorspace", {"target_space": "GRAY"})
+    assert operation.decode_options(params, 4000, 3000) == (True, 1)
+    operation, params = parse_operation("colorspace", {"target_space": "HSV"})
+    assert operation.decode_options(params, 4000, 3000) == (False, 1)
+    operation, params = parse_operation("resize", {"width": 500, "height": 375})
+    assert operation.decode_options(params, 4000, 3000) == (False, 8)
+
+@pytest.mark.parametrize("name, parameters", [
+    ("grayscale", {}),
+    ("colorspace", {"target_space": "GRAY"}),
+])
+def test_gray_decodes_match_full_decodes(name, parameters):
+    operation, params = parse_operation(name, parameters)
+    image = _image()
+    result = operation.apply_decoded(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), params, 80, 60)
+    assert result.shape == (60, 80, 3)
+    assert np.array_equal(result, operation.apply(image, params))
+
+def test_reduced_decodes_keep_the_full_size_output():
+    operation, params = parse_operation("crop", {"x": 8, "y": 4, "width": 40, "height": 30})
+    reduced = cv2.resize(_image(), (40, 30), interpolation=cv2.INTER_AREA)
+    assert operation.apply_decoded(reduced, params, 80, 60).shape == (30, 40, 3)
+
+def test_preview_scales_the_result():
+    operation, params = parse_operation("crop", {"x": 8, "y": 4, "width": 40, "height": 30})
+    proxy = cv2.resize(_image(), (40, 30), interpolation=cv2.INTER_AREA)
+    assert operation.preview(proxy, params, 80, 60).shape == (15, 20, 3)
+    operation, params = parse_operation("quick_adjust", {"brightness": 1.2})
+    assert operation.preview(proxy, params, 80, 60).shape == proxy.shape
@@ -0,0 +1,128 @@
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+from perceptual_hash import DuplicateClusters, MultiIndex, compute_image_hashes, hamming_distance
+
+def _random_hash(rng):
+    # Signed, like the BIGINT columns the hashes are stored in
+    value = rng.getrandbits(64)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _gallery(rng, count: int = 300):
+    """Random hashes plus near-duplicates of some of them, a few bits apart."""
+    values = [_random_hash(rng) for _ in range(count)]
+    for value in values[:60]:
+        for _ in range(rng.randrange(1, 4)):
+            for _ in range(rng.randrange(1, 8)):
+                value ^= 1 << rng.randrange(63)
+            values.append(value)
+    return values
+
+def _brute_force_clusters(values, threshold):
+    parent = list(range(len(values)))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for a in range(len(values)):
+        for b in range(a + 1, len(values)):
+            if hamming_distance(values[a], values[b]) <= threshold:
+                parent[find(b)] = find(a)
+    clusters = {}
+    for item in range(len(values)):
+        clusters.setdefault(find(item), []).append(item)
+    return sorted(sorted(items) for items in clusters.values() if len(items) > 1)
+
+def _index(values):
+    index = MultiIndex()
+    for item, value in enumerate(values):
+        index.add(value, item)
+    return index
+
+def _photo(seed: int, size: int = 256):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(cv2.resize(small, (size, size), interpolation=cv2.INTER_CUBIC), (0, 0), 3)
+
+def test_hamming_distance_of_signed_hashes():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(-1, 0) == 64
+    assert hamming_distance(-(1 << 63), 0) == 1
+    assert hamming_distance(0b1011, 0b0001) == 2
+
+def test_multi_index_matches_brute_force():
+    rng = random.Random(0)
+    values = _gallery(rng)
+    index = _index(values)
+    assert len(index) == len(values)
+    for query in values[:20] + [_random_hash(rng) for _ in range(20)]:
+        for radius in (0, 3, 4, 8, 13, 16):
+            expected = sorted((hamming_distance(query, value), item) for item, value in enumerate(values)
+                              if hamming_distance(query, value) <= radius)
+            assert sorted(index.search(query, radius)) == expected
+
+def test_multi_index_keeps_equal_hashes_and_removes():
+    index = MultiIndex()
+    index.add(42, "a")
+    index.add(42, "b")
+    assert sorted(index.search(42, 0)) == [(0, "a"), (0, "b")]
+    index.remove("a")
+    index.remove("missing")
+    assert index.search(42, 0) == [(0, "b")]
+    # Adding an item again replaces its hash
+    index.add(-1, "b")
+    assert index.search(42, 0) == []
+    assert MultiIndex().search(42, 10) == []
+
+def test_clusters_are_transitive():
+    index = MultiIndex()
+    for item, value in {1: 0b0000, 2: 0b0011, 3: 0b1111, 4: -1}.items():
+        index.add(value, item)
+    # 3 is 2 bits from 2 and 4 bits from 1
+    assert DuplicateClusters(index, 2).clusters() == [[1, 2, 3]]
+    assert DuplicateClusters(index, 1).clusters() == []
+    assert DuplicateClusters(MultiIndex(), 8).clusters() == []
+
+@pytest.mark.parametrize("threshold", [0, 5, 8, 12])
+def test_clusters_match_brute_force(threshold):
+    values = _gallery(random.Random(threshold))
+    assert sorted(DuplicateClusters(_index(values), threshold).clusters()) == _brute_force_clusters(values, threshold)
+
+def test_clusters_follow_additions_and_removals():
+    rng = random.Random(1)
+    values = _gallery(rng)
+    index = _index(values[:200])
+    clusters = DuplicateClusters(index, 8)
+    for item, value in enumerate(values[200:], start=200):
+        index.add(value, item)
+        clusters.added(item)
+    removed = set(rng.sample(range(len(values)), 120))
+    for item in removed:
+        index.remove(item)
+        clusters.removed(item)
+    remaining = [item for item in range(len(values)) if item not in removed]
+    expected = [[remaining[position] for position in cluster]
+                for cluster in _brute_force_clusters([values[item] for item in remaining], 8)]
+    assert sorted(clusters.clusters()) == sorted(expected)
+
+def test_hashes_survive_resizing_and_brightness():
+    image = _photo(1)
+    hashes = compute_image_hashes(image)
+    resized = compute_image_hashes(cv2.resize(image, (100, 100), interpolation=cv2.INTER_AREA))
+    brighter = compute_image_hashes(cv2.convertScaleAbs(image, alpha=1.0, beta=20))
+    other = compute_image_hashes(_photo(2))
+    for hash_type in ("phash", "dhash"):
+        assert hamming_distance(hashes[hash_type], resized[hash_type]) <= 6
+        assert hamming_distance(hashes[hash_type], brighter[hash_type]) <= 6
+        assert hamming_distance(hashes[hash_type], other[hash_type]) > 10
+
+def test_hashes_of_gray_and_bgra_images():
+    image = _photo(3)
+    hashes = compute_image_hashes(image)
+    assert compute_image_hashes(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)) == hashes
+    assert compute_image_hashes(cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)) == hashes
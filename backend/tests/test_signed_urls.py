@@ -0,0 +1,86 @@
+import os
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from signed_urls import SIGNED_URL_TTL, SignedStaticFiles, cache_headers, sign_url, upload_url, verify_signature
+
+def _query(url: str):
+    return dict(parse_qsl(urlsplit(url).query))
+
+def test_signed_url_verifies():
+    url = sign_url("/uploads/photo.jpg", 7)
+    assert urlsplit(url).path == "/uploads/photo.jpg"
+    remaining = verify_signature("/uploads/photo.jpg", _query(url))
+    assert SIGNED_URL_TTL < remaining <= 2 * SIGNED_URL_TTL
+
+def test_signature_is_bound_to_path_and_user():
+    query = _query(sign_url("/uploads/photo.jpg", 7))
+    assert verify_signature("/uploads/other.jpg", query) is None
+    assert verify_signature("/uploads/photo.jpg", {**query, "uid": "8"}) is None
+    assert verify_signature("/uploads/photo.jpg", {**query, "sig": "0" * 32}) is None
+    # Extending the expiry invalidates the signature
+    assert verify_signature("/uploads/photo.jpg", {**query, "exp": str(int(query["exp"]) + SIGNED_URL_TTL)}) is None
+
+def test_missing_or_malformed_parameters():
+    query = _query(sign_url("/uploads/photo.jpg", 7))
+    assert verify_signature("/uploads/photo.jpg", {}) is None
+    assert verify_signature("/uploads/photo.jpg", {k: v for k, v in query.items() if k != "sig"}) is None
+    assert verify_signature("/uploads/photo.jpg", {**query, "exp": "soon"}) is None
+
+def test_expired_url():
+    url = sign_url("/uploads/photo.jpg", 7, now=time.time() - 3 * SIGNED_URL_TTL)
+    assert verify_signature("/uploads/photo.jpg", _query(url)) is None
+
+def test_urls_are_stable_within_a_period():
+    start = (int(time.time()) // SIGNED_URL_TTL) * SIGNED_URL_TTL
+    assert sign_url("/uploads/photo.jpg", 7, now=start) == sign_url("/uploads/photo.jpg", 7, now=start + SIGNED_URL_TTL - 1)
+    assert sign_url("/uploads/photo.jpg", 7, now=start) != sign_url("/uploads/photo.jpg", 7, now=start + SIGNED_URL_TTL)
+
+def test_paths_are_quoted():
+    url = sign_url("/uploads/my photo.jpg", 7)
+    assert urlsplit(url).path == "/uploads/my%20photo.jpg"
+    assert verify_signature("/uploads/my photo.jpg", _query(url)) is not None
+
+def test_version_is_signed():
+    query = _query(sign_url("/uploads/photo.jpg", 7, version="1a"))
+    assert query["v"] == "1a"
+    assert verify_signature("/uploads/photo.jpg", query) is not None
+    assert verify_signature("/uploads/photo.jpg", {**query, "v": "1b"}) is None
+    assert verify_signature("/uploads/photo.jpg", {k: v for k, v in query.items() if k != "v"}) is None
+
+def test_rewritten_files_get_new_urls(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("uploads")
+    path = os.path.join("uploads", "photo.jpg")
+    with open(path, "wb") as f:
+        f.write(b"before")
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    before = upload_url("photo.jpg", 7)
+    assert upload_url("photo.jpg", 7) == before
+    with open(path, "wb") as f:
+        f.write(b"after")
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    after = upload_url("photo.jpg", 7)
+    assert after != before
+    assert verify_signature("/uploads/photo.jpg", _query(after)) is not None
+    # Missing files are signed without a version
+    assert "v" not in _query(upload_url("missing.jpg", 7))
+
+def test_cache_headers():
+    assert cache_headers(None) == {}
+    assert cache_headers(120) == {"Cache-Control": "private, max-age=120"}
+
+def test_static_files_require_a_signature(tmp_path):
+    (tmp_path / "photo.jpg").write_bytes(b"jpeg bytes")
+    app = FastAPI()
+    app.mount("/uploads", SignedStaticFiles(directory=str(tmp_path), url_prefix="/uploads"), name="uploads")
+    client = TestClient(app)
+    response = client.get(sign_url("/uploads/photo.jpg", 7))
+    assert response.status_code == 200
+    assert response.content == b"jpeg bytes"
+    assert response.headers["Cache-Control"].startswith("private, max-age=")
+    assert client.get("/uploads/photo.jpg").status_code == 403
+    assert client.get(sign_url("/uploads/other.jpg", 7).replace("other", "photo", 1)).status_code == 403
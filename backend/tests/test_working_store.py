@@ -0,0 +1,80 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import codec
+import working_store
+from working_store import discard_working_image, evict, load_working_image
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    monkeypatch.setattr(working_store, "WORKING_STORE_DIR", str(tmp_path / "working"))
+    monkeypatch.setattr(working_store, "WORKING_STORE_MIN_PIXELS", 0)
+    monkeypatch.setattr(working_store, "WORKING_STORE_BUDGET", 1 << 30)
+    return tmp_path / "working"
+
+def _upload(name: str, seed: int = 0, content_hash: str = None):
+    image = np.random.default_rng(seed).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    cv2.imwrite(os.path.join("uploads", name), image)
+    return {"id": seed, "filename": name, "content_hash": content_hash}, image
+
+def test_miss_decodes_and_stores(store):
+    image_info, image = _upload("photo.png", content_hash="abc")
+    loaded = load_working_image(image_info)
+    assert np.array_equal(loaded, image)
+    assert os.listdir(store) == ["abc.npy"]
+
+def test_hit_maps_without_decoding(store, monkeypatch):
+    image_info, image = _upload("photo.png", content_hash="abc")
+    load_working_image(image_info)
+    monkeypatch.setattr(codec, "decode", lambda *args, **kwargs: pytest.fail("decoded again"))
+    mapped = load_working_image(image_info)
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, image)
+    # Writes stay private to the caller
+    mapped[:] = 0
+    assert np.array_equal(load_working_image(image_info), image)
+
+def test_small_images_and_unreadable_files_are_not_stored(store, monkeypatch):
+    monkeypatch.setattr(working_store, "WORKING_STORE_MIN_PIXELS", 1_000_000)
+    image_info, image = _upload("photo.png", content_hash="abc")
+    assert np.array_equal(load_working_image(image_info), image)
+    assert not store.exists()
+    assert load_working_image({"id": 1, "filename": "missing.png", "content_hash": None}) is None
+
+def test_files_without_a_hash_are_versioned_by_modification_time(store):
+    image_info, _ = _upload("photo.png", seed=1)
+    load_working_image(image_info)
+    _, rewritten = _upload("photo.png", seed=2)
+    os.utime(os.path.join("uploads", "photo.png"), ns=(1, 1))
+    assert np.array_equal(load_working_image(image_info), rewritten)
+    assert len(os.listdir(store)) == 2
+
+def test_eviction_removes_least_recently_used(store):
+    entries = []
+    for seed in range(3):
+        image_info, _ = _upload(f"{seed}.png", seed=seed, content_hash=f"hash{seed}")
+        load_working_image(image_info)
+        path = store / f"hash{seed}.npy"
+        os.utime(path, (1000 + seed, 1000 + seed))
+        entries.append((image_info, path))
+    # A hit marks the oldest entry as recently used
+    load_working_image(entries[0][0])
+    entry_size = entries[0][1].stat().st_size
+    freed = evict(budget=2 * entry_size)
+    assert freed == entry_size
+    assert sorted(path.name for path in store.iterdir()) == ["hash0.npy", "hash2.npy"]
+    assert evict(budget=0) == 2 * entry_size
+    assert list(store.iterdir()) == []
+
+def test_discard(store):
+    image_info, _ = _upload("photo.png", content_hash="abc")
+    load_working_image(image_info)
+    discard_working_image(image_info)
+    assert os.listdir(store) == []
+    # Already gone
+    discard_working_image(image_info)
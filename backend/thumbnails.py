@@ -0,0 +1,51 @@
+# Gallery thumbnails: JPEGs of uploads downsized to a few fixed sizes, generated on first request
+# (mostly by the JPEG decoder, see codec.decode_fit) and cached in THUMBNAIL_DIR. A thumbnail older
+# than its upload is regenerated, and thumbnail URLs carry the upload's version (signed_urls.py), so
+# neither this cache nor the browser's serves a thumbnail of a file's previous content.
+import glob
+import os
+import uuid
+
+import codec
+from image_metadata import read_file_metadata
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "thumbnails")
+THUMBNAIL_SIZES = (256, 1024)  # longest side in pixels: gallery grid, full-screen preview
+THUMBNAIL_JPEG_QUALITY = 80
+
+def _thumbnail_path(filename: str, size: int):
+    return os.path.join(THUMBNAIL_DIR, str(size), f"{filename}.jpg")
+
+def get_thumbnail(filename: str, size: int):
+    """Path of the upload's thumbnail with the given longest side, created if needed; None if unreadable."""
+    source_path = os.path.join("uploads", filename)
+    path = _thumbnail_path(filename, size)
+    try:
+        source_mtime = os.stat(source_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    try:
+        if os.stat(path).st_mtime_ns >= source_mtime:
+            return path
+    except FileNotFoundError:
+        pass
+    metadata = read_file_metadata(source_path, include_hash=False)
+    if metadata is None:
+        return None
+    image = codec.decode_fit(source_path, size, metadata["width"], metadata["height"])
+    if image is None:
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written through a temporary file so concurrent requests never serve a partial thumbnail
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp.jpg"
+    if not codec.write(temp_path, image, THUMBNAIL_JPEG_QUALITY):
+        return None
+    os.replace(temp_path, path)
+    return path
+
+def remove_thumbnails(filename: str):
+    for path in glob.glob(os.path.join(THUMBNAIL_DIR, "*", f"{glob.escape(filename)}.jpg")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,103 @@
+# Working store of decoded pixels for images being edited: the first request decodes the image and
+# writes the raw array to a .npy file; later requests (in any worker process) map that file
+# copy-on-write instead of decoding the JPEG/PNG again.
+#
+# Entries are keyed by content hash, so an image whose file changes maps a new entry and never stale
+# pixels; identical uploads share one entry. Least recently used entries (by file mtime, touched on
+# every hit) are evicted once the store exceeds its disk budget.
+import glob
+import os
+import uuid
+
+from lazy_imports import lazy_module
+import codec
+
+np = lazy_module("numpy")
+
+WORKING_STORE_DIR = os.getenv("WORKING_STORE_DIR", "working")
+WORKING_STORE_BUDGET = int(os.getenv("WORKING_STORE_BUDGET_MB", "2048")) * 1024 * 1024
+# Smaller images decode quickly enough that a raw copy (several times the encoded size) isn't worth it
+WORKING_STORE_MIN_PIXELS = int(os.getenv("WORKING_STORE_MIN_PIXELS", str(1_000_000)))
+
+def _entry_path(image_info, source_path: str):
+    if image_info.get("content_hash"):
+        key = image_info["content_hash"]
+    else:
+        # Images without a stored hash are versioned by their file's size and modification time
+        stat = os.stat(source_path)
+        key = f"{image_info['id']}-{stat.st_size}-{stat.st_mtime_ns}"
+    return os.path.join(WORKING_STORE_DIR, f"{key}.npy")
+
+def _map(path: str):
+    """Map an entry copy-on-write: writes stay private to the caller and never reach the file."""
+    image = np.load(path, mmap_mode="c")
+    try:
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return image
+
+def evict(budget: int = WORKING_STORE_BUDGET):
+    """Remove least recently used entries until the store fits in the budget; returns bytes freed."""
+    entries = []
+    for path in glob.glob(os.path.join(WORKING_STORE_DIR, "*.npy")):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= budget:
+            break
+        try:
+            # Processes that already mapped the entry keep their mapping
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+def _store(path: str, image):
+    os.makedirs(WORKING_STORE_DIR, exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, image)
+    os.replace(temp_path, path)
+    evict()
+
+def load_working_image(image_info):
+    """The decoded BGR pixels of an image, mapped from the working store when possible; None if unreadable.
+
+    The returned array may be modified freely by the caller.
+    """
+    source_path = os.path.join("uploads", image_info["filename"])
+    try:
+        path = _entry_path(image_info, source_path)
+    except FileNotFoundError:
+        return None
+    if os.path.exists(path):
+        try:
+            return _map(path)
+        except (FileNotFoundError, ValueError):
+            # Evicted or replaced between the check and the map
+            pass
+    image = codec.decode(source_path)
+    if image is None:
+        return None
+    if image.shape[0] * image.shape[1] >= WORKING_STORE_MIN_PIXELS:
+        _store(path, image)
+    return image
+
+def discard_working_image(image_info):
+    """Drop an image's entry, e.g. after its file was replaced in place."""
+    try:
+        path = _entry_path(image_info, os.path.join("uploads", image_info["filename"]))
+    except FileNotFoundError:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1220,7 +1220,7 @@ export default function DrawingTools({ image, onProcessed, onClose }) {
       <div className="drawing-canvas border border-gray-600 rounded-lg overflow-hidden bg-black">
         <img
           ref={imageRef}
-          src={`http://localhost:8000/uploads/${image.filename}`}
+          src={`http://localhost:8000${image.url}`}
           alt={image.original_filename}
           onLoad={() => {
             const canvas = canvasRef.current;
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import axios from "axios";
 import DrawingToolsWrapper from "./DrawingToolsWrapper";
 import TransformTools from "./TransformTools";
@@ -24,6 +24,13 @@ export default function ImageEditor({ image, onClose, onProcessed }) {
   // Filter preview
   const [activeFilter, setActiveFilter] = useState(null);
 
+  // Server-rendered preview of the adjustments, streamed over the edit session WebSocket
+  const [adjustPreview, setAdjustPreview] = useState(null);
+  const sessionRef = useRef(null);
+  const seqRef = useRef(0);
+  // Previews requested before the sliders were last reset are dropped
+  const resetSeqRef = useRef(0);
+
   // Image details
   const [dimensions, setDimensions] = useState(null);
   const [loadingDimensions, setLoadingDimensions] = useState(false);
@@ -224,6 +231,63 @@ export default function ImageEditor({ image, onClose, onProcessed }) {
     }
   };
 
+  // Convert percentage values to backend scale with proper clamping
+  const adjustmentParams = () => ({
+    brightness: Math.max(0.1, Math.min(3.0, 1.0 + brightness / 100)), // 0.1 to 3.0
+    contrast: Math.max(0.1, Math.min(3.0, 1.0 + contrast / 100)), // 0.1 to 3.0
+    saturation: Math.max(0.0, Math.min(3.0, 1.0 + saturation / 100)), // 0.0 to 3.0
+    hue_shift: hue,
+  });
+
+  // One edit session per opened image; the server decodes it once and renders each slider change
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    const socket = new WebSocket(
+      `ws://localhost:8000/ws/image/${image.id}/adjust?token=${encodeURIComponent(token)}`
+    );
+    let previewUrl = null;
+    let previewSeq = 0;
+    socket.onmessage = (event) => {
+      if (typeof event.data === "string") {
+        const message = JSON.parse(event.data);
+        if (message.type === "preview") {
+          previewSeq = message.seq;
+        } else if (message.type === "error") {
+          console.error("Edit session error:", message.detail);
+        }
+        return;
+      }
+      // The JPEG of a preview follows its JSON header
+      if (previewSeq <= resetSeqRef.current) return;
+      if (previewUrl) URL.revokeObjectURL(previewUrl);
+      previewUrl = URL.createObjectURL(event.data);
+      setAdjustPreview(previewUrl);
+    };
+    socket.onclose = () => {
+      if (sessionRef.current === socket) sessionRef.current = null;
+    };
+    sessionRef.current = socket;
+    return () => {
+      socket.close();
+      if (previewUrl) URL.revokeObjectURL(previewUrl);
+      setAdjustPreview(null);
+    };
+  }, [image.id]);
+
+  useEffect(() => {
+    if (brightness === 0 && contrast === 0 && saturation === 0 && hue === 0) {
+      resetSeqRef.current = seqRef.current;
+      setAdjustPreview(null);
+      return;
+    }
+    const socket = sessionRef.current;
+    // Until the session is open the CSS filter approximates the adjustments
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      seqRef.current += 1;
+      socket.send(JSON.stringify({ seq: seqRef.current, ...adjustmentParams() }));
+    }
+  }, [brightness, contrast, saturation, hue]);
+
   const applyAdjustments = async () => {
     if (brightness === 0 && contrast === 0 && saturation === 0 && hue === 0) {
       return; // No changes to apply
@@ -232,19 +296,10 @@ export default function ImageEditor({ image, onClose, onProcessed }) {
     setProcessing(true);
     try {
       const token = localStorage.getItem("token");
-
-      // Convert percentage values to backend scale with proper clamping
-      const brightnessScale = Math.max(
-        0.1,
-        Math.min(3.0, 1.0 + brightness / 100)
-      ); // 0.1 to 3.0
-      const contrastScale = Math.max(0.1, Math.min(3.0, 1.0 + contrast / 100)); // 0.1 to 3.0
-      const saturationScale = Math.max(
-        0.0,
-        Math.min(3.0, 1.0 + saturation / 100)
-      ); // 0.0 to 3.0      // Use the new quick-adjust endpoint
+      const params = adjustmentParams();
+      // Use the new quick-adjust endpoint
       const response = await axios.post(
-        `http://localhost:8000/image/${image.id}/quick-adjust?brightness=${brightnessScale}&contrast=${contrastScale}&saturation=${saturationScale}&hue_shift=${hue}`,
+        `http://localhost:8000/image/${image.id}/quick-adjust?brightness=${params.brightness}&contrast=${params.contrast}&saturation=${params.saturation}&hue_shift=${params.hue_shift}`,
         {},
         {
           headers: { Authorization: `Bearer ${token}` },
@@ -395,14 +450,22 @@ export default function ImageEditor({ image, onClose, onProcessed }) {
 
       {/* Image Preview */}
       <div className="flex-1 flex items-center justify-center bg-black p-4">
-        <img
-          src={`http://localhost:8000/uploads/${image.filename}`}
-          alt={image.original_filename}
-          className="max-w-full max-h-full object-contain rounded-lg"
-          style={{
-            filter: getCurrentFilter(),
-          }}
-        />
+        {adjustPreview && !activeFilter ? (
+          <img
+            src={adjustPreview}
+            alt={image.original_filename}
+            className="max-w-full max-h-full object-contain rounded-lg"
+          />
+        ) : (
+          <img
+            src={`http://localhost:8000${image.url}`}
+            alt={image.original_filename}
+            className="max-w-full max-h-full object-contain rounded-lg"
+            style={{
+              filter: getCurrentFilter(),
+            }}
+          />
+        )}
       </div>
 
       {/* Controls */}
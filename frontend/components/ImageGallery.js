@@ -333,7 +333,7 @@ export default function ImageGallery({ refreshTrigger }) {
 
             <div className="w-full h-44 bg-gray-50 relative overflow-hidden">
               <img
-                src={`http://localhost:8000/uploads/${image.filename}`}
+                src={`http://localhost:8000${image.thumbnail_url}`}
                 alt={image.original_filename}
                 className="w-full h-full object-cover transition-transform duration-200 hover:scale-105"
                 onError={(e) => {
@@ -507,7 +507,7 @@ export default function ImageGallery({ refreshTrigger }) {
             {/* center image area */}
             <div className="flex-1 flex items-center justify-center">
               <img
-                src={`http://localhost:8000/uploads/${previewImage.filename}`}
+                src={`http://localhost:8000${previewImage.url}`}
                 alt={previewImage.original_filename}
                 style={{
                   transform: `scale(${zoom})`,
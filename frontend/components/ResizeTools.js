@@ -13,7 +13,7 @@ export default function ResizeTools({
   const [resizeParams, setResizeParams] = useState({
     width: dimensions?.width || 400,
     height: dimensions?.height || 300,
-    interpolation: "linear",
+    interpolation: "auto",
   });
 
   const applyResize = async () => {
@@ -108,6 +108,8 @@ export default function ResizeTools({
             onChange={(e) => updateResizeParam("interpolation", e.target.value)}
             className="w-full px-2 py-1 bg-gray-800 border border-gray-600 rounded text-white text-sm focus:border-blue-400 focus:outline-none"
           >
+            <option value="auto">Auto</option>
+            <option value="area">Area</option>
             <option value="nearest">Nearest</option>
             <option value="linear">Linear</option>
             <option value="cubic">Cubic</option>
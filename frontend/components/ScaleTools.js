@@ -18,7 +18,7 @@ export default function ScaleTools({ image, onProcessed, onClose }) {
       const params = new URLSearchParams({
         scale_x: scaleParams.scaleX.toString(),
         scale_y: scaleParams.scaleY.toString(),
-        interpolation: "linear", // Default interpolation
+        interpolation: "auto", // Area when shrinking, linear when enlarging
       });
 
       const response = await axios.post(